@@ -2,15 +2,16 @@
 Analyze and visualize the generated 100 zebra puzzles.
 """
 
-import json
 import os
 from collections import Counter
 
+from clue_records import clue_kind
+import puzzle_io
+
 
 def load_puzzles(filepath="zebra_puzzles_100_simple.json"):
-    """Load puzzles from JSON file."""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Load puzzles from a JSON or compact binary (.zpz) file."""
+    return puzzle_io.load_puzzles(filepath)
 
 
 def print_statistics(puzzles):
@@ -84,8 +85,8 @@ def analyze_clue_types(puzzles, sample_size=5):
     positional_count = 0
 
     for p in puzzles:
-        for clue in p.get('clues_data', []):
-            clue_type = clue.get('type', 'unknown')
+        for record in p.get('clues_data', []):
+            clue_type = clue_kind(record)
             if clue_type == 'positive':
                 positive_count += 1
             elif clue_type == 'negative':
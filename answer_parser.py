@@ -0,0 +1,329 @@
+"""
+Single-pass answer parser over a puzzle's entity vocabulary.
+
+The dimension names and entity values of a puzzle are compiled once (and cached
+per vocabulary) into one regular expression, an alternation of every entry
+with the longest first, so a single scan of the response finds the leftmost
+longest vocabulary entries. Entries match whole words with case folded and
+quote characters ignored, so "'safari hat'" matches "Safari Hat". Values are
+recognized as whole vocabulary entries rather than split on commas, so values
+that contain commas or colons ("University of California, Berkeley",
+"Animal Crossing: New Horizons") are read as one value.
+
+An answer section starts at a dimension name followed by ':' (markdown '**' is
+allowed in between) and collects the values of that dimension until the next
+section, a ']' or the end of the line holding its values.
+
+Structured answers (a JSON object keyed by dimension) are parsed with a single
+json.loads and checked against a schema generated from the puzzle
+(answer_schema); callers fall back to the token parser when that fails.
+"""
+
+import re
+import json
+from functools import lru_cache
+
+# Words, line breaks and single punctuation characters; quote characters are
+# not tokens, so quoting a value does not change its tokens
+TOKEN_PATTERN = re.compile(r"\w+|\n|[^\w\s\"'`‘’“”]")
+
+# What may separate two tokens of an entry: spaces (not line breaks) and quotes
+TOKEN_GAP = r"(?:[^\S\n]|[\"'`‘’“”])*"
+
+# A dimension name opens a section when a ':' follows (markdown '*' allowed in
+# between); the ':' is part of the match, which tells headers and values apart
+HEADER_END = r"(?:[^\S\n]|[*\"'`‘’“”])*:"
+
+# Matches that end a list of values
+VALUES_END = frozenset(["\n", "]"])
+
+WORD_START = re.compile(r"\w")
+
+
+def tokenize(text):
+    """Case-folded word and punctuation tokens of a text."""
+    return TOKEN_PATTERN.findall(str(text).casefold())
+
+
+def _token_regex(token):
+    # A word must not be continued by another word character
+    return re.escape(token) + (r"\b" if WORD_START.match(token) else "")
+
+
+def _trie_regex(node):
+    """Regex of a character trie node: {char: child node, '': [tails in order]}."""
+    alternatives = [re.escape(char) + _trie_regex(child) for char, child in node.items() if char]
+    alternatives += node.get('', [])
+    return alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+
+
+def _entries_regex(entries):
+    """
+    Regex matching any of some entries, the first one listed where several match.
+
+    The first tokens of the entries are merged into a character trie, so the
+    regex engine follows one branch per character instead of trying every
+    entry at every position. The check that a word does not start inside
+    another word is done once per first character.
+
+    :param entries: List of (token tuple, regex suffix) pairs.
+    """
+    trie = {}
+    for tokens, suffix in entries:
+        node = trie
+        for char in tokens[0]:
+            node = node.setdefault(char, {})
+        tail = "".join(TOKEN_GAP + _token_regex(token) for token in tokens[1:]) + suffix
+        node.setdefault('', []).append((r"\b" if WORD_START.match(tokens[0]) else "") + tail)
+    return "|".join(
+        re.escape(first) + (r"(?<!\w\w)" if WORD_START.match(first) else "") + _trie_regex(node)
+        for first, node in trie.items()) or r"(?!)"
+
+
+class CompiledVocabulary:
+    """
+    Compiled form of a puzzle's dimension names and entity values.
+
+    'pattern' finds every header, value and end of a list of values in one scan,
+    'header_pattern' only the headers. 'spelled' maps the text of a match, as
+    spelled in the puzzle, to its entry: a dimension index for a header, a dict
+    mapping dimension index to entity indices for a value, or VALUES_END;
+    lookup() covers other spellings. entities[d][i] is the string of entity i
+    of dimension d.
+    """
+
+    def __init__(self, dimensions, entities):
+        self.entities = [[str(entity) for entity in values] for values in entities]
+        self.headers = {}
+        self.values = {}
+        self.spelled = {end: VALUES_END for end in VALUES_END}
+        for dim_index, dim_name in enumerate(dimensions):
+            self.headers.setdefault(tuple(tokenize(dim_name)), dim_index)
+            self.spelled.setdefault(str(dim_name).casefold() + ":", dim_index)
+        for dim_index, values in enumerate(self.entities):
+            for entity_index, entity in enumerate(values):
+                entry = self.values.setdefault(tuple(tokenize(entity)), {})
+                entry.setdefault(dim_index, []).append(entity_index)
+                self.spelled.setdefault(entity.casefold(), entry)
+
+        # Longest first; a header also matches its ':' and so comes before a
+        # value with the same tokens
+        entries = sorted(
+            [(len(tokens) + 1, tokens, HEADER_END) for tokens in self.headers if tokens]
+            + [(len(tokens), tokens, "") for tokens in self.values if tokens],
+            key=lambda entry: entry[0], reverse=True)
+        self.pattern = re.compile(_entries_regex([(tokens, suffix) for _, tokens, suffix in entries]) + r"|[\n\]]")
+        self.header_pattern = re.compile(_entries_regex([(tokens, HEADER_END) for tokens in self.headers if tokens]))
+
+    def lookup(self, text):
+        """Entry of a match that is not spelled as in the puzzle."""
+        tokens = tokenize(text)
+        if tokens[-1] != ':':
+            return self.values[tuple(tokens)]
+        # A header: drop the ':' and the markdown '*' before it
+        tokens.pop()
+        while tokens[-1] == '*':
+            tokens.pop()
+        return self.headers[tuple(tokens)]
+
+    def parse(self, response):
+        """Map a response to entity indices (see parse_answer)."""
+        spelled = self.spelled
+        answer = {}
+        section = None
+        values = []
+        ended = False
+        text = str(response).casefold()
+        # Nothing before the first header counts, so the (slower) scan for all
+        # entries starts at its line; no match spans a line break, so the
+        # matches from there on are the same as those of a full scan
+        header = self.header_pattern.search(text)
+        if header is None:
+            return answer
+        for match in self.pattern.findall(text, text.rfind('\n', 0, header.start()) + 1):
+            entry = spelled.get(match)
+            if entry is None:
+                entry = self.lookup(match)
+            if entry is VALUES_END:
+                ended = bool(values)
+            elif isinstance(entry, int):
+                if values and section not in answer:
+                    answer[section] = values
+                section, values, ended = entry, [], False
+            elif section is not None:
+                if ended:
+                    # A value after the end of the list closes the section
+                    if section not in answer:
+                        answer[section] = values
+                    section, values, ended = None, [], False
+                else:
+                    values.extend(entry.get(section, ()))
+        if values and section not in answer:
+            answer[section] = values
+        return answer
+
+
+@lru_cache(maxsize=256)
+def _compile_vocabulary(dimensions, entities):
+    return CompiledVocabulary(dimensions, entities)
+
+
+def compile_vocabulary(dimensions, entities):
+    """
+    Compiled vocabulary of a puzzle's dimension names and entity values.
+
+    Cached per vocabulary, keyed on the values themselves (so 1 and 1.0 share
+    an entry), which keeps a cache hit cheaper than the parse.
+    """
+    return _compile_vocabulary(tuple(dimensions), tuple(map(tuple, entities)))
+
+
+def parse_answer(response, dimensions, entities):
+    """
+    Map a response to entity indices.
+
+    :param dimensions: Dimension names of the puzzle.
+    :param entities: Entity values of each dimension.
+    :return: Dict mapping dimension index to the list of entity indices of its
+             first non-empty answer section.
+    """
+    return compile_vocabulary(dimensions, entities).parse(response)
+
+
+def answer_schema(dimensions, entities, num_persons):
+    """
+    JSON schema of a structured answer to a puzzle.
+
+    The answer is an object with one key per dimension, holding that dimension's
+    values for each person in order. Values must be written exactly as in the
+    puzzle (numbers as numbers); extra keys are allowed.
+    """
+    return {
+        "type": "object",
+        "required": list(dimensions),
+        "properties": {
+            dim_name: {
+                "type": "array",
+                "minItems": num_persons,
+                "maxItems": num_persons,
+                "uniqueItems": True,
+                "items": {"enum": list(values)},
+            }
+            for dim_name, values in zip(dimensions, entities)
+        },
+    }
+
+
+def validate_answer(answer, schema, path="answer"):
+    """
+    Validate a decoded answer against the subset of JSON schema used by answer_schema.
+
+    :return: List of error messages (empty if the answer is valid).
+    """
+    errors = []
+    expected_type = schema.get("type")
+    if expected_type == "object" and not isinstance(answer, dict):
+        return [f"{path}: expected an object"]
+    if expected_type == "array" and not isinstance(answer, list):
+        return [f"{path}: expected an array"]
+
+    if "enum" in schema:
+        # Compare with types, so True does not pass for 1 nor "135" for 135
+        if not any(type(answer) is type(value) and answer == value for value in schema["enum"]):
+            errors.append(f"{path}: {answer!r} is not one of the allowed values")
+
+    if isinstance(answer, dict):
+        for key in schema.get("required", []):
+            if key not in answer:
+                errors.append(f"{path}: missing key {key!r}")
+        for key, subschema in schema.get("properties", {}).items():
+            if key in answer:
+                errors.extend(validate_answer(answer[key], subschema, f"{path}.{key}"))
+
+    if isinstance(answer, list):
+        if len(answer) < schema.get("minItems", 0):
+            errors.append(f"{path}: expected at least {schema['minItems']} items")
+        if "maxItems" in schema and len(answer) > schema["maxItems"]:
+            errors.append(f"{path}: expected at most {schema['maxItems']} items")
+        if schema.get("uniqueItems") and len({json.dumps(item, sort_keys=True) for item in answer}) < len(answer):
+            errors.append(f"{path}: items are not unique")
+        if "items" in schema:
+            for i, item in enumerate(answer):
+                errors.extend(validate_answer(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+def extract_json_object(response):
+    """Return the text from the first '{' to the last '}' (skips code fences and prose), or None."""
+    start = response.find('{')
+    end = response.rfind('}')
+    if start == -1 or end < start:
+        return None
+    return response[start:end + 1]
+
+
+def parse_json_answer(response, dimensions, entities, num_persons):
+    """
+    Parse a structured JSON answer.
+
+    :return: (answer, errors): answer maps dimension index to entity indices and
+             is None when the response holds no JSON object or fails the schema.
+    """
+    text = extract_json_object(response)
+    if text is None:
+        return None, ["no JSON object in response"]
+    try:
+        decoded = json.loads(text)
+    except ValueError as e:
+        return None, [f"invalid JSON: {e}"]
+
+    errors = validate_answer(decoded, answer_schema(dimensions, entities, num_persons))
+    if errors:
+        return None, errors
+    return {dim_index: [list(entities[dim_index]).index(value) for value in decoded[dim_name]]
+            for dim_index, dim_name in enumerate(dimensions)}, []
+
+
+class IncrementalAnswerParser:
+    """
+    Answer parser fed with a streamed response chunk by chunk.
+
+    feed() returns True once the answer is complete: in 'text' format when every
+    dimension has a value list of num_persons values that has been closed by a
+    ']' or a line break (so a value is never cut short, e.g. "University of
+    California" before ", Berkeley" arrives); in 'json' format when the JSON
+    object passes the answer schema. The response is only re-parsed when a chunk
+    can close a list, line or object.
+    """
+
+    def __init__(self, dimensions, entities, num_persons, answer_format='text'):
+        self.dimensions = dimensions
+        self.entities = entities
+        self.num_persons = num_persons
+        self.answer_format = answer_format
+        self.closers = '}' if answer_format == 'json' else ']\n'
+        self.chunks = []
+        self.complete = False
+
+    @property
+    def text(self):
+        """Response received so far."""
+        return "".join(self.chunks)
+
+    def feed(self, chunk):
+        """Add a chunk; return True once the answer is complete."""
+        self.chunks.append(chunk)
+        if self.complete or not any(closer in chunk for closer in self.closers):
+            return self.complete
+
+        text = self.text
+        if self.answer_format == 'json':
+            answer, _ = parse_json_answer(text, self.dimensions, self.entities, self.num_persons)
+            self.complete = answer is not None
+        else:
+            # Only the text up to the last closer, so the last section has ended
+            cut = max(text.rfind(']'), text.rfind('\n')) + 1
+            answer = parse_answer(text[:cut], self.dimensions, self.entities)
+            self.complete = (len(answer) == len(self.dimensions)
+                             and all(len(values) == self.num_persons for values in answer.values()))
+        return self.complete
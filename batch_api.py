@@ -0,0 +1,233 @@
+"""
+Offline evaluation through provider batch endpoints.
+
+Splits an evaluation run into three stages that can be scaled separately:
+
+  1. export: render every puzzle's prompt into a batch request file (JSON
+     Lines in the OpenAI-compatible batch format: custom_id, method, url,
+     body),
+  2. submit the file to the provider's batch endpoint and download its output
+     (outside this script),
+  3. ingest: grade the output file offline with the same parsing and
+     evaluation as test_llm_on_puzzles and write the usual results summary.
+
+Custom IDs have the form "zebra-<puzzle_id>-<answer_format>-<prompt hash>", so
+they are stable across exports of the same corpus and ingestion can detect
+outputs whose prompt no longer matches the puzzle.
+
+Usage:
+    python batch_api.py export --input data/generated/zebra_puzzles_gurobi_100.json
+    python batch_api.py ingest results/batch_output.jsonl --input data/generated/zebra_puzzles_gurobi_100.json
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime
+from itertools import islice
+
+from llm_client import client_config
+from puzzle_io import iter_puzzles, open_stream, save_json
+from prompt_encodings import PROMPT_ENCODINGS
+from test_llm_on_puzzles import (ANSWER_FORMATS, PROMPT_LAYOUTS, format_puzzle_as_prompt, grade_response, print_summary,
+                                 summarize_results)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+DEFAULT_REQUESTS_FILE = "results/batch_requests.jsonl"
+
+
+def prompt_digest(prompt):
+    """Short content hash of a prompt."""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+
+
+def make_custom_id(puzzle_id, answer_format, prompt):
+    """Stable custom ID of a puzzle's batch request."""
+    return f"zebra-{puzzle_id}-{answer_format}-{prompt_digest(prompt)}"
+
+
+def parse_custom_id(custom_id):
+    """Return (puzzle_id, answer_format, prompt digest) of a custom ID."""
+    _, puzzle_id, answer_format, digest = custom_id.rsplit('-', 3)
+    return int(puzzle_id), answer_format, digest
+
+
+def batch_request(puzzle, model, answer_format='text', max_tokens=None, prompt_layout='inline',
+                  prompt_encoding='sentence'):
+    """Batch request record of one puzzle."""
+    prompt = format_puzzle_as_prompt(puzzle, answer_format=answer_format, prompt_layout=prompt_layout,
+                                     prompt_encoding=prompt_encoding)
+    body = {"model": model, "messages": [{"role": "user", "content": prompt}]}
+    if max_tokens is not None:
+        body["max_tokens"] = max_tokens
+    return {
+        "custom_id": make_custom_id(puzzle['puzzle_id'], answer_format, prompt),
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": body,
+    }
+
+
+def export_requests(puzzles_file, output_file, model=None, answer_format='text', num_puzzles=None,
+                    max_tokens=None, prompt_layout='inline', prompt_encoding='sentence'):
+    """
+    Write one batch request per puzzle.
+
+    :param model: Model name (default: LLM_MODEL, see llm_client.client_config).
+    :return: Number of requests written.
+    """
+    model = client_config(model=model)["model"]
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    count = 0
+    with open_stream(output_file, 'w') as f:
+        for puzzle in islice(iter_puzzles(puzzles_file), num_puzzles):
+            if not puzzle.get('generation_success', True):
+                continue
+            request = batch_request(puzzle, model, answer_format, max_tokens, prompt_layout, prompt_encoding)
+            f.write(json.dumps(request, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def response_text(record):
+    """
+    Return (text, error) of one batch output record.
+
+    Handles the OpenAI batch output layout ({"response": {"status_code", "body"},
+    "error"}).
+    """
+    if record.get('error'):
+        return None, f"Batch request failed: {record['error']}"
+    response = record.get('response') or {}
+    if response.get('status_code', 200) != 200:
+        return None, f"Batch request failed with status {response['status_code']}"
+    try:
+        return response['body']['choices'][0]['message']['content'], None
+    except (KeyError, IndexError, TypeError):
+        return None, "Batch output has no message content"
+
+
+def ingest_results(output_file, puzzles_file, results_file=None, verbose=False):
+    """
+    Grade a batch output file and save the results summary.
+
+    Outputs are matched to puzzles by custom ID, and the prompt layout and
+    encoding are found from the prompt hash; outputs for unknown puzzles or with a prompt hash that
+    no longer matches the puzzle are skipped with a warning, and puzzles without
+    an output are reported.
+
+    :return: The results summary (see test_llm_on_puzzles.summarize_results).
+    """
+    puzzles = {p['puzzle_id']: p for p in iter_puzzles(puzzles_file)}
+
+    results = {}
+    with open_stream(output_file) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            puzzle_id, answer_format, digest = parse_custom_id(record['custom_id'])
+            puzzle = puzzles.get(puzzle_id)
+            if puzzle is None:
+                print(f"[WARNING] {record['custom_id']}: puzzle #{puzzle_id} is not in {puzzles_file}")
+                continue
+            prompts = (format_puzzle_as_prompt(puzzle, answer_format=answer_format, prompt_layout=layout,
+                                               prompt_encoding=encoding)
+                       for layout in PROMPT_LAYOUTS for encoding in PROMPT_ENCODINGS)
+            prompt = next((p for p in prompts if prompt_digest(p) == digest), None)
+            if prompt is None:
+                print(f"[WARNING] {record['custom_id']}: prompt does not match puzzle #{puzzle_id}; skipped")
+                continue
+
+            text, error = response_text(record)
+            if text is None:
+                results[puzzle_id] = {'puzzle_id': puzzle_id, 'success': False, 'error': error}
+                continue
+            if verbose:
+                print(f"\n--- Puzzle #{puzzle_id} ---")
+            parsed_solution, parser_used, evaluation = grade_response(puzzle, text, answer_format, verbose)
+            results[puzzle_id] = {
+                'puzzle_id': puzzle_id,
+                'prompt': prompt,
+                'response': text,
+                'answer_format': answer_format,
+                'parser': parser_used,
+                'parsed_solution': parsed_solution,
+                'evaluation': evaluation,
+                'success': True
+            }
+
+    exported = [pid for pid, p in puzzles.items() if p.get('generation_success', True)]
+    missing = [pid for pid in exported if pid not in results]
+    if missing:
+        print(f"[WARNING] {len(missing)} puzzles have no batch output (e.g. #{missing[0]})")
+
+    summary = summarize_results([results[pid] for pid in sorted(results)], puzzles_file=puzzles_file)
+    summary['batch_output'] = output_file
+
+    print(f"\n{'='*70}")
+    print(f"BATCH RESULTS ({output_file})")
+    print(f"{'='*70}")
+    print_summary(summary)
+
+    if results_file is None:
+        results_file = f"results/llm_test_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}_batch.json"
+    results_dir = os.path.dirname(results_file)
+    if results_dir:
+        os.makedirs(results_dir, exist_ok=True)
+    save_json(summary, results_file)
+    print(f"\nResults saved to: {results_file}")
+
+    return summary
+
+
+def main():
+    """Export batch requests or ingest batch outputs."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Evaluate LLMs on zebra puzzles through batch endpoints')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Write one batch request per puzzle')
+    export_parser.add_argument('--input', default='data/generated/zebra_puzzles_gurobi_100.json',
+                               help='Input puzzle file or shard directory')
+    export_parser.add_argument('--output', default=DEFAULT_REQUESTS_FILE,
+                               help=f'Batch request file (default: {DEFAULT_REQUESTS_FILE})')
+    export_parser.add_argument('--model', default=None, help='Model name (default: $LLM_MODEL or deepseek-chat)')
+    export_parser.add_argument('--answer-format', choices=ANSWER_FORMATS, default='text',
+                               help='Answer format requested in the prompts')
+    export_parser.add_argument('--num', type=int, default=None, help='Number of puzzles to export (default: all)')
+    export_parser.add_argument('--max-tokens', type=int, default=None, help='max_tokens of each request')
+    export_parser.add_argument('--prompt-layout', choices=PROMPT_LAYOUTS, default='inline',
+                               help="'prefix' puts all static instructions first so requests share a cacheable prefix")
+    export_parser.add_argument('--prompt-encoding', choices=PROMPT_ENCODINGS, default='sentence',
+                               help='Encoding of the setup and clues (see prompt_encodings.py)')
+    export_parser.add_argument('--force', action='store_true', help='Overwrite an existing output file')
+
+    ingest_parser = subparsers.add_parser('ingest', help='Grade a batch output file')
+    ingest_parser.add_argument('batch_output', help='Output JSONL downloaded from the batch endpoint')
+    ingest_parser.add_argument('--input', default='data/generated/zebra_puzzles_gurobi_100.json',
+                               help='Puzzle file or shard directory the requests were exported from')
+    ingest_parser.add_argument('--output', default=None, help='Results JSON file (default: auto-generated in results/)')
+    ingest_parser.add_argument('--verbose', action='store_true', help='Print the evaluation of every puzzle')
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        # Never clobber an existing file (e.g. an unrelated requests.jsonl) by accident
+        if os.path.exists(args.output) and not args.force:
+            parser.error(f"{args.output} already exists; pass --force to overwrite it")
+        count = export_requests(args.input, args.output, model=args.model, answer_format=args.answer_format,
+                                num_puzzles=args.num, max_tokens=args.max_tokens, prompt_layout=args.prompt_layout,
+                                prompt_encoding=args.prompt_encoding)
+        print(f"Wrote {count} batch requests to: {args.output}")
+    else:
+        ingest_results(args.batch_output, args.input, results_file=args.output, verbose=args.verbose)
+
+
+if __name__ == '__main__':
+    main()
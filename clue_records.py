@@ -0,0 +1,145 @@
+"""
+Structured clue records.
+
+A clue record is a compact 6-tuple of integers and short tags:
+
+    ("NonPositional", r, c, r1, c1, sign)      sign in {"positive", "negative"}
+    ("PositionalTwo", r1, c1, r2, c2, relation) relation in POSITIONAL_RELATIONS
+
+r/r1/r2 are dimension indices and c/c1/c2 value indices into the puzzle's
+'entities'. Positional clues are stated over the numbered dimension
+(POSITION_DIMENSION). Generated puzzles store records in 'clues_data' (as JSON
+lists) and the English text in 'clues' is rendered from them with format_clue.
+"""
+
+POSITION_DIMENSION = 1
+POSITIONAL_RELATIONS = ["immediately_left", "left", "next_to"]
+
+
+def format_clue(ctype, r_name, c_name, r1_name, c1_name, sign=None, relation="immediately_left"):
+    """
+    Render a human-readable clue string.
+
+    :param ctype: "PositionalTwo" or "NonPositional"
+    :param r_name: Name of the first attribute group
+    :param c_name: Attribute value in the first group
+    :param r1_name: Name of the second attribute group
+    :param c1_name: Attribute value in the second group
+    :param sign: "positive" or "negative" for NonPositional
+    :param relation: "immediately_left", "left" or "next_to" for PositionalTwo
+    """
+    if ctype == "PositionalTwo":
+        if relation == "immediately_left":
+            return (
+                f"From left to right, the person with {r_name} {c_name} is immediately left "
+                f"of the person with {r1_name} {c1_name}."
+            )
+        if relation == "left":
+            return (
+                f"From left to right, the person with {r_name} {c_name} is somewhere left "
+                f"of the person with {r1_name} {c1_name}."
+            )
+        if relation == "next_to":
+            return f"The person with {r_name} {c_name} is next to the person with {r1_name} {c1_name}."
+        raise ValueError(f"Unsupported positional relation: {relation}")
+    if ctype == "NonPositional":
+        if sign == "positive":
+            return f"The person with {r_name} {c_name} also has {r1_name} {c1_name}."
+        return f"The person with {r_name} {c_name} does not have {r1_name} {c1_name}."
+    raise ValueError(f"Unsupported clue type: {ctype}")
+
+
+def render_clue(record, dim_names, var_name_lst):
+    """Render one clue record as text using the puzzle's dimension and entity names."""
+    ctype, r, c, r1, c1, qualifier = record
+    if ctype == "PositionalTwo":
+        return format_clue(ctype, dim_names[r], var_name_lst[r][c], dim_names[r1], var_name_lst[r1][c1],
+                           relation=qualifier)
+    return format_clue(ctype, dim_names[r], var_name_lst[r][c], dim_names[r1], var_name_lst[r1][c1],
+                       sign=qualifier)
+
+
+def render_clues(puzzle):
+    """Render all of a puzzle's 'clues_data' records as text."""
+    return [render_clue(record, puzzle['dimensions'], puzzle['entities'])
+            for record in puzzle['clues_data']]
+
+
+def clue_kind(record):
+    """Return "positive", "negative" or "positional" for a clue record."""
+    if record[0] == "PositionalTwo":
+        return "positional"
+    return record[5]
+
+
+# (clue type, qualifier, prefix, middle, suffix): format_clue's text around the
+# "<dimension> <value>" of the two attributes
+CLUE_PATTERNS = [
+    ("PositionalTwo", "immediately_left",
+     "From left to right, the person with ", " is immediately left of the person with ", "."),
+    ("PositionalTwo", "left",
+     "From left to right, the person with ", " is somewhere left of the person with ", "."),
+    ("PositionalTwo", "next_to", "The person with ", " is next to the person with ", "."),
+    ("NonPositional", "positive", "The person with ", " also has ", "."),
+    ("NonPositional", "negative", "The person with ", " does not have ", "."),
+]
+
+
+def parse_clue_text(text, dim_names, var_name_lst):
+    """
+    Recover the clue record from clue text rendered by format_clue.
+
+    Used for puzzles generated before 'clues_data' was stored. Dimension and
+    entity names may contain spaces, so each side of the clue is resolved against
+    the puzzle's own "<dimension> <value>" strings rather than split on whitespace.
+
+    :return: The clue record, or None if the text does not match a known phrasing
+             or names an attribute that occurs in more than one dimension.
+    """
+    attributes = {}
+    for r, (dim_name, values) in enumerate(zip(dim_names, var_name_lst)):
+        for c, value in enumerate(values):
+            key = f"{dim_name} {value}"
+            # A repeated dimension can make "<dimension> <value>" ambiguous
+            attributes[key] = None if key in attributes else (r, c)
+
+    for ctype, qualifier, prefix, middle, suffix in CLUE_PATTERNS:
+        if not (text.startswith(prefix) and text.endswith(suffix)):
+            continue
+        body = text[len(prefix):len(text) - len(suffix)]
+        # The separator may also occur inside names, so try every split point
+        start = body.find(middle)
+        while start != -1:
+            left = attributes.get(body[:start])
+            right = attributes.get(body[start + len(middle):])
+            if left is not None and right is not None:
+                return (ctype, left[0], left[1], right[0], right[1], qualifier)
+            start = body.find(middle, start + 1)
+    return None
+
+
+def clue_holds(record, assignment, var_name_lst):
+    """
+    Check a clue record against a full assignment.
+
+    :param assignment: assignment[r][p] = value index held by person p in dimension r.
+    :param var_name_lst: The puzzle's entities; the values of POSITION_DIMENSION give
+                         the left-to-right order of the persons.
+    """
+    ctype, r, c, r1, c1, qualifier = record
+    holder = assignment[r].index(c)
+    if ctype == "NonPositional":
+        return (assignment[r1][holder] == c1) == (qualifier == "positive")
+
+    other = assignment[r1].index(c1)
+    positions = var_name_lst[POSITION_DIMENSION]
+    rank = sorted(range(len(positions)), key=lambda att: int(positions[att]))
+    pos_holder = rank.index(assignment[POSITION_DIMENSION][holder])
+    pos_other = rank.index(assignment[POSITION_DIMENSION][other])
+    if qualifier == "immediately_left":
+        return pos_other - pos_holder == 1
+    if qualifier == "left":
+        return pos_holder < pos_other
+    if qualifier == "next_to":
+        return abs(pos_holder - pos_other) == 1
+    raise ValueError(f"Unsupported positional relation: {qualifier}")
@@ -0,0 +1,352 @@
+"""
+Distributed puzzle generation with a SQLite work queue.
+
+A coordinator splits a seed range into tasks and stores them in a SQLite file.
+Workers, on this machine or on others that share the queue and output directory,
+lease one task at a time, generate its seeds with
+generate_100_with_gurobi.generate_single_puzzle_FIXED and write the puzzles as one
+shard of a sharded dataset (see puzzle_io). While a task runs its worker renews
+the lease in the background; the lease of a crashed worker expires and the task
+is handed out again, and workers keep polling the queue until every task is done
+so they can take it. Once every task is done, 'finalize' writes the dataset
+manifest and a run report with the seeds that timed out.
+
+SQLite locking over network file systems is only as reliable as the file system;
+put the queue on storage that supports POSIX locks.
+
+Usage:
+    python distributed_generation.py init --queue queue.db --output data/generated/run1 --num 1000
+    python distributed_generation.py worker --queue queue.db        (on every node)
+    python distributed_generation.py status --queue queue.db
+    python distributed_generation.py finalize --queue queue.db
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+
+from puzzle_io import file_sha256, load_json, save_json, write_manifest, write_shard
+
+DEFAULT_CHUNK_SIZE = 25
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_POLL_SECONDS = 30
+SHARD_EXTENSION = ".jsonl.gz"
+
+
+def connect(queue_file):
+    """Open the queue database; waits on locks held by other workers instead of failing."""
+    conn = sqlite3.connect(queue_file, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 60000")
+    return conn
+
+
+def create_queue(queue_file, output_dir, seeds, chunk_size=DEFAULT_CHUNK_SIZE, config=None):
+    """
+    Create a work queue for 'seeds'.
+
+    :param output_dir: Directory the workers write their shards to.
+    :param chunk_size: Seeds per task (and per shard).
+    :param config: Keyword arguments for generate_single_puzzle_FIXED, shared by all workers.
+    :return: Number of tasks created.
+    """
+    seeds = sorted(seeds)
+    conn = connect(queue_file)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("""
+            CREATE TABLE tasks (
+                task_id INTEGER PRIMARY KEY,
+                seeds TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                shard TEXT,
+                deferred_seeds TEXT
+            )""")
+        conn.executemany("INSERT INTO settings VALUES (?, ?)", [
+            ("output_dir", json.dumps(output_dir)),
+            ("config", json.dumps(config or {}))
+        ])
+        conn.executemany("INSERT INTO tasks (seeds) VALUES (?)", [
+            (json.dumps(seeds[i:i + chunk_size]),) for i in range(0, len(seeds), chunk_size)
+        ])
+    num_tasks = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+    conn.close()
+    return num_tasks
+
+
+def read_settings(conn):
+    """Return (output_dir, generator config) stored in the queue."""
+    settings = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM settings")}
+    return settings["output_dir"], settings["config"]
+
+
+def lease_task(conn, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Lease the next pending task, or one whose lease has expired.
+
+    :return: (task_id, seeds), or None when no task is available.
+    """
+    now = time.time()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("""
+            SELECT task_id, seeds FROM tasks
+            WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+            ORDER BY task_id LIMIT 1""", (now,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("""
+            UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1
+            WHERE task_id = ?""", (worker, now + lease_seconds, row[0]))
+    return row[0], json.loads(row[1])
+
+
+def heartbeat(conn, task_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Extend the lease on a task.
+
+    :return: False if the worker no longer holds the lease (it expired and was reclaimed).
+    """
+    cursor = conn.execute("""
+        UPDATE tasks SET lease_expires = ?
+        WHERE task_id = ? AND worker = ? AND status = 'leased'""",
+                          (time.time() + lease_seconds, task_id, worker))
+    return cursor.rowcount == 1
+
+
+def complete_task(conn, task_id, worker, shard, deferred_seeds):
+    """
+    Mark a task done with its shard's manifest entry.
+
+    :return: False if the lease was lost; the shard is then left to the new holder.
+    """
+    cursor = conn.execute("""
+        UPDATE tasks SET status = 'done', shard = ?, deferred_seeds = ?, lease_expires = NULL
+        WHERE task_id = ? AND worker = ? AND status = 'leased'""",
+                          (json.dumps(shard), json.dumps(deferred_seeds), task_id, worker))
+    return cursor.rowcount == 1
+
+
+def queue_status(conn):
+    """Return a dict of task counts by status, with expired leases counted as 'expired'."""
+    counts = {"pending": 0, "leased": 0, "expired": 0, "done": 0}
+    now = time.time()
+    for status, lease_expires in conn.execute("SELECT status, lease_expires FROM tasks"):
+        if status == "leased" and lease_expires < now:
+            status = "expired"
+        counts[status] += 1
+    return counts
+
+
+class _LeaseKeeper(threading.Thread):
+    """Renews a task lease from the background while the worker is solving."""
+
+    def __init__(self, queue_file, task_id, worker, lease_seconds):
+        super().__init__(daemon=True)
+        self.queue_file = queue_file
+        self.task_id = task_id
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        conn = connect(self.queue_file)
+        while not self.stopped.wait(self.lease_seconds / 3):
+            if not heartbeat(conn, self.task_id, self.worker, self.lease_seconds):
+                self.lost = True
+                break
+        conn.close()
+
+
+def default_worker_id():
+    """Worker ID unique across machines: host name and process ID."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_worker(queue_file, worker=None, lease_seconds=DEFAULT_LEASE_SECONDS, max_tasks=None, generate=None,
+               poll_seconds=DEFAULT_POLL_SECONDS):
+    """
+    Process tasks from the queue until every task is done.
+
+    While the remaining tasks are leased by other workers, the worker polls the
+    queue, so it picks up the task of a worker that crashed once its lease expires.
+
+    :param worker: Worker ID (default: host name and process ID).
+    :param max_tasks: Stop after this many tasks (None = until every task is done).
+    :param generate: Puzzle function called as generate(seed=..., **config);
+                     defaults to generate_single_puzzle_FIXED.
+    :param poll_seconds: Wait between polls while all remaining tasks are leased.
+    :return: Number of tasks completed by this worker.
+    """
+    if generate is None:
+        from generate_100_with_gurobi import generate_single_puzzle_FIXED as generate
+    worker = worker or default_worker_id()
+
+    conn = connect(queue_file)
+    output_dir, config = read_settings(conn)
+    os.makedirs(output_dir, exist_ok=True)
+    completed = 0
+
+    while max_tasks is None or completed < max_tasks:
+        task = lease_task(conn, worker, lease_seconds)
+        if task is None:
+            counts = queue_status(conn)
+            if counts["done"] == sum(counts.values()):
+                break
+            time.sleep(poll_seconds)
+            continue
+        task_id, seeds = task
+        print(f"[{worker}] Task {task_id}: seeds {seeds[0]}-{seeds[-1]}")
+        task_start = time.monotonic()
+
+        keeper = _LeaseKeeper(queue_file, task_id, worker, lease_seconds)
+        keeper.start()
+        puzzles = []
+        deferred = []
+        try:
+            for seed in seeds:
+                puzzle = generate(seed=seed, **config)
+                if puzzle and puzzle.get("generation_success", False):
+                    puzzles.append(puzzle)
+                elif puzzle and puzzle.get("timed_out", False):
+                    deferred.append(seed)
+                if keeper.lost:
+                    break
+        finally:
+            keeper.stopped.set()
+            keeper.join()
+
+        if keeper.lost:
+            print(f"[{worker}] Task {task_id}: lease lost, abandoning")
+            continue
+
+        # Named by seed range, so a re-run of a reclaimed task overwrites the same shard
+        shard_name = f"shard-seeds-{seeds[0]:08d}-{seeds[-1]:08d}{SHARD_EXTENSION}"
+        # Renewing the lease right before the rename keeps a worker that lost it
+        # from replacing the new holder's shard, and keeps the lease valid until
+        # complete_task records the shard's hash
+        shard = write_shard(puzzles, output_dir, shard_name,
+                            before_replace=lambda: heartbeat(conn, task_id, worker, lease_seconds))
+        if shard is None:
+            print(f"[{worker}] Task {task_id}: lease lost before writing the shard, abandoning")
+            continue
+        if complete_task(conn, task_id, worker, shard, deferred):
+            completed += 1
+            print(f"[{worker}] Task {task_id}: {len(puzzles)}/{len(seeds)} puzzles, "
+                  f"{len(deferred)} deferred, {time.monotonic() - task_start:.1f}s -> {shard_name}")
+        else:
+            print(f"[{worker}] Task {task_id}: lease lost before completion")
+
+    conn.close()
+    return completed
+
+
+def finalize(queue_file):
+    """
+    Write the dataset manifest and run report once every task is done.
+
+    :return: The manifest.
+    """
+    conn = connect(queue_file)
+    output_dir, config = read_settings(conn)
+    counts = queue_status(conn)
+    if counts["done"] != sum(counts.values()):
+        conn.close()
+        raise RuntimeError(f"Queue is not finished: {counts}")
+
+    rows = conn.execute("SELECT seeds, shard, deferred_seeds FROM tasks ORDER BY task_id").fetchall()
+    conn.close()
+
+    shards = [json.loads(shard) for _, shard, _ in rows]
+    for shard in shards:
+        if file_sha256(os.path.join(output_dir, shard["file"])) != shard["sha256"]:
+            raise RuntimeError(f"Shard {shard['file']} does not match the hash recorded by its task")
+    deferred = [seed for _, _, deferred_seeds in rows for seed in json.loads(deferred_seeds)]
+    all_seeds = [seed for seeds, _, _ in rows for seed in json.loads(seeds)]
+    manifest = write_manifest(output_dir, shards, dict(config, seeds=[min(all_seeds), max(all_seeds)]))
+
+    # Same place and layout as the run report of generate_100_with_gurobi, so
+    # its --retry-from can pick up the deferred seeds
+    save_json({
+        "output_file": output_dir,
+        "queue_file": queue_file,
+        "deferred_seeds": deferred
+    }, os.path.normpath(output_dir) + "_run_report.json")
+    return manifest
+
+
+def main():
+    """Command-line entry point for the coordinator and workers."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Distributed zebra puzzle generation over a SQLite work queue')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    init = subparsers.add_parser('init', help='Create the work queue')
+    init.add_argument('--queue', required=True, help='SQLite queue file')
+    init.add_argument('--output', required=True, help='Shard directory of the generated dataset')
+    init.add_argument('--num', type=int, default=100, help='Number of seeds (default: 100)')
+    init.add_argument('--start-seed', type=int, default=3000, help='First seed (default: 3000)')
+    init.add_argument('--retry-from', default=None, help='Run report whose deferred seeds to generate instead')
+    init.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                      help=f'Seeds per task and shard (default: {DEFAULT_CHUNK_SIZE})')
+    init.add_argument('--clue-mode', default='random', help='Clue mode (see generate_100_with_gurobi.py)')
+    init.add_argument('--formulation', default='weighted', help="Positional relations drawn: 'weighted' or 'ranked'")
+    init.add_argument('--num-candidates', type=int, default=8, help='Candidates per solve in scenario mode')
+    init.add_argument('--solve-time-limit', type=float, default=None, help='Seconds allowed per solver call')
+    init.add_argument('--puzzle-time-limit', type=float, default=None, help='Seconds allowed per puzzle')
+
+    worker = subparsers.add_parser('worker', help='Process tasks until every task is done')
+    worker.add_argument('--queue', required=True, help='SQLite queue file')
+    worker.add_argument('--worker-id', default=None, help='Worker ID (default: host-pid)')
+    worker.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help=f'Lease length; renewed every third of it (default: {DEFAULT_LEASE_SECONDS})')
+    worker.add_argument('--max-tasks', type=int, default=None, help='Stop after this many tasks')
+    worker.add_argument('--poll-seconds', type=float, default=DEFAULT_POLL_SECONDS,
+                        help=f'Wait between polls while other workers hold the remaining tasks '
+                             f'(default: {DEFAULT_POLL_SECONDS})')
+
+    status = subparsers.add_parser('status', help='Show task counts')
+    status.add_argument('--queue', required=True, help='SQLite queue file')
+
+    final = subparsers.add_parser('finalize', help='Write the manifest once all tasks are done')
+    final.add_argument('--queue', required=True, help='SQLite queue file')
+
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        if args.retry_from:
+            seeds = load_json(args.retry_from)["deferred_seeds"]
+        else:
+            seeds = range(args.start_seed, args.start_seed + args.num)
+        config = {
+            "clue_mode": args.clue_mode,
+            "formulation": args.formulation,
+            "num_candidates": args.num_candidates,
+            "solve_time_limit": args.solve_time_limit,
+            "puzzle_time_limit": args.puzzle_time_limit
+        }
+        num_tasks = create_queue(args.queue, args.output, seeds, chunk_size=args.chunk_size, config=config)
+        print(f"Created {num_tasks} tasks for {len(seeds)} seeds in {args.queue}")
+    elif args.command == 'worker':
+        completed = run_worker(args.queue, worker=args.worker_id, lease_seconds=args.lease_seconds,
+                               max_tasks=args.max_tasks, poll_seconds=args.poll_seconds)
+        print(f"Worker finished after {completed} tasks")
+    elif args.command == 'status':
+        conn = connect(args.queue)
+        print(queue_status(conn))
+        conn.close()
+    else:
+        manifest = finalize(args.queue)
+        print(f"Wrote manifest: {manifest['num_records']} puzzles in {manifest['num_shards']} shards")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,148 +9,422 @@ import sys
 import os
 import json
 import random
+import time
 import traceback
 from datetime import datetime
-from gurobipy import quicksum
+from gurobipy import GRB, quicksum
 
 # Setup paths - add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import zebra_abs_pro which will import from util
 import zebra_abs_pro
+from clue_records import POSITIONAL_RELATIONS, render_clue
+from puzzle_io import append_puzzles, iter_puzzles, load_json, save_puzzles, save_sharded, split_compression
+from puzzle_dedup import canonical_hash
+from generation_cache import NO_UNIQUE_SOLUTION, cache_get, cache_key, cache_put, entity_data_hash
 
+CLUE_MODES = ("random", "counterexample", "scenario")
+FORMULATIONS = ("weighted", "ranked")
 
-def format_clue(ctype, r_name, c_name, r1_name, c1_name, sign=None):
+# Bump whenever a change to the generator changes the puzzles it produces; this
+# invalidates every generation cache entry
+GENERATOR_VERSION = 2
+
+
+class PuzzleTimeout(Exception):
+    """Raised when a puzzle exhausts its per-solve or per-puzzle time budget."""
+
+
+def make_time_budget(solve_time_limit=None, puzzle_time_limit=None):
+    """
+    Create the time budget for one puzzle.
+
+    :param solve_time_limit: Seconds allowed for any single solve (None = unlimited).
+    :param puzzle_time_limit: Seconds allowed for the whole puzzle, starting now (None = unlimited).
+    """
+    deadline = None
+    if puzzle_time_limit is not None:
+        deadline = time.monotonic() + puzzle_time_limit
+    return {"solve_time_limit": solve_time_limit, "deadline": deadline}
+
+
+def remaining_solve_time(budget):
+    """
+    Return the time limit for the next solve under 'budget' (None = unlimited).
+
+    Raises PuzzleTimeout once the puzzle deadline has passed.
+    """
+    if budget is None:
+        return None
+
+    limit = budget["solve_time_limit"]
+    if budget["deadline"] is not None:
+        remaining = budget["deadline"] - time.monotonic()
+        if remaining <= 0:
+            raise PuzzleTimeout("Puzzle time budget exceeded")
+        limit = remaining if limit is None else min(limit, remaining)
+    return limit
+
+
+def check_solution_count_within_budget(m, budget):
+    """check_solution_count under a time budget; a cut-off solve raises PuzzleTimeout."""
+    sol_count, status = zebra_abs_pro.check_solution_count(m, time_limit=remaining_solve_time(budget))
+    if status == 'TIME_LIMIT':
+        raise PuzzleTimeout("Solve time budget exceeded")
+    return sol_count, status
+
+
+def format_clue(ctype, r_name, c_name, r1_name, c1_name, sign=None, relation="immediately_left"):
     """Proxy to zebra_abs_pro.format_clue for consistent clue phrasing."""
-    return zebra_abs_pro.format_clue(ctype, r_name, c_name, r1_name, c1_name, sign=sign)
+    return zebra_abs_pro.format_clue(ctype, r_name, c_name, r1_name, c1_name, sign=sign, relation=relation)
 
 
-def add_constraint_to_model_FIXED(m, var, matrix, dim_names, var_name_lst, constraint):
+def add_constraint_to_model_FIXED(m, var, matrix, dim_names, var_name_lst, constraint, rank_var=None):
     """
     FIXED VERSION: Correctly encode positional constraints.
 
     This is the corrected version of the constraint addition function.
+
+    :param rank_var: Person-at-rank indicators from zebra_abs_pro.add_rank_variables.
+                     PositionalTwo clues are encoded over them with the relation their
+                     record states, so the record always matches the model; they are
+                     required for PositionalTwo clues.
+    :return: A list with the clue record (see clue_records) of the added constraint,
+             with any random choice (the negative c1) resolved.
     """
     print(f"Adding constraint: {constraint}")
-    descriptions = []
+    records = []
     ctype = constraint[0]
 
     if ctype == "PositionalTwo":
-        # FIXED: Correctly encode positional constraints
-        _, c1, c2, r1, r2, rPos = constraint
+        # ("PositionalTwo", c1, c2, r1, r2, rPos[, relation]); rPos is the
+        # numbered dimension the rank indicators were built over
+        _, c1, c2, r1, r2, _ = constraint[:6]
+        relation = constraint[6] if len(constraint) > 6 else "immediately_left"
+
+        records.append(("PositionalTwo", r1, c1, r2, c2, relation))
+
+        if rank_var is None:
+            raise ValueError("PositionalTwo clues need rank variables (see zebra_abs_pro.add_rank_variables)")
+        zebra_abs_pro.add_positional_constraint_ranked(m, rank_var, c1, c2, r1, r2, relation)
+
+        print("added constraint:", render_clue(records[-1], dim_names, var_name_lst))
+
+    elif ctype == "NonPositional":
+        # ("NonPositional", c, r, r1, sign[, c1]); c1 defaults to c for positive
+        # clues and to a random other attribute for negative ones.
+        _, c, r, r1, sign = constraint[:5]
+        c1 = constraint[5] if len(constraint) > 5 else None
+        if sign == 'positive':
+            if c1 is None:
+                c1 = c
+            records.append(("NonPositional", r, c, r1, c1, "positive"))
+            for p in range(len(matrix[0])):
+                m.addConstr(var[p][r][c] == var[p][r1][c1])
+        else:
+            if c1 is None:
+                c1 = random.choice([i for i in range(len(matrix[0])) if i != c])
+            records.append(("NonPositional", r, c, r1, c1, "negative"))
+            for p in range(len(matrix[0])):
+                m.addConstr(var[p][r][c] + var[p][r1][c1] <= 1)
+
+        print("added constraint:", render_clue(records[-1], dim_names, var_name_lst))
 
-        c1_name = var_name_lst[r1][c1]
-        c2_name = var_name_lst[r2][c2]
+    return records
+
+
+def generate_counterexample_clues(m, var, matrix, dim_names, var_name_lst, max_clues, rank_var=None,
+                                  budget=None, sign_weights=zebra_abs_pro.SIGN_WEIGHTS):
+    """
+    Counterexample-guided clue generation.
+
+    Each iteration takes the competing solutions left in the pool by the last
+    uniqueness check and adds a clue that is true in the planted assignment but
+    false in at least one of them, so every solver call removes solutions.
+
+    :return: (clue_records, constraint_added_count, unique_solution_found)
+    """
+    clue_records = []
+    constraint_added_count = 0
 
-        r1_name = dim_names[r1]
-        r2_name = dim_names[r2]
+    sol_count, status = check_solution_count_within_budget(m, budget)
 
-        v = int(var_name_lst[rPos][c1]) - int(var_name_lst[rPos][c2])
-        descriptions.append(
-            format_clue("PositionalTwo", r1_name, c1_name, r2_name, c2_name)
+    while sol_count > 1 and constraint_added_count < max_clues:
+        witnesses = zebra_abs_pro.get_pool_array(m, var, matrix)
+        con = zebra_abs_pro.create_counterexample_constraint(matrix, witnesses, sign_weights=sign_weights)
+        if con is None:
+            break
+
+        clue_records += add_constraint_to_model_FIXED(
+            m, var, matrix, dim_names, var_name_lst, con, rank_var=rank_var
         )
+        constraint_added_count += 1
 
-        # FIXED CODE: Calculate actual positions
-        num_persons = len(matrix[0])
-        position_values = [int(var_name_lst[rPos][i]) for i in range(num_persons)]
+        sol_count, status = check_solution_count_within_budget(m, budget)
 
-        # Calculate actual position of person with attribute c1
-        pos_c1 = quicksum(position_values[p] * var[p][r1][c1] for p in range(num_persons))
+    return clue_records, constraint_added_count, sol_count == 1
 
-        # Calculate actual position of person with attribute c2
-        pos_c2 = quicksum(position_values[p] * var[p][r2][c2] for p in range(num_persons))
 
-        # Add constraint based on positional relationship
-        if v < 0:
-            if v == -1:
-                m.addConstr(pos_c2 - pos_c1 == 1, name=f"PosLeft_{c1}_{c2}")
-            else:
-                m.addConstr(pos_c1 + 1 <= pos_c2, name=f"PosLeft_{c1}_{c2}")
+def _add_relaxation_slacks(m, constrs, tag):
+    """
+    Make 'constrs' switchable by attaching bounded slack variables to each row.
+
+    With the slacks' upper bound at M a row is always satisfiable for binary
+    variables; fixing the upper bound to 0 (per scenario) enforces the row.
+    """
+    slacks = []
+    for i, constr in enumerate(constrs):
+        row = m.getRow(constr)
+        big_m = sum(abs(row.getCoeff(j)) for j in range(row.size())) + abs(constr.RHS)
+        if constr.Sense in ('<', '='):
+            slack = m.addVar(lb=0, ub=big_m, name=f"Relax_{tag}_{i}_dn")
+            m.chgCoeff(constr, slack, -1.0)
+            slacks.append(slack)
+        if constr.Sense in ('>', '='):
+            slack = m.addVar(lb=0, ub=big_m, name=f"Relax_{tag}_{i}_up")
+            m.chgCoeff(constr, slack, 1.0)
+            slacks.append(slack)
+    return slacks
+
+
+def evaluate_candidate_clues(matrix, dim_names, var_name_lst, accepted, candidates, time_limit=None):
+    """
+    Evaluate K candidate next clues in a single Gurobi multi-scenario solve.
+
+    The model holds two copies of the build_model baseline, both constrained by the
+    'accepted' clues, and minimizes how many (person, dimension) cells the copies
+    agree on. Each candidate's rows are added to both copies behind relaxation slacks;
+    scenario k fixes candidate k's slacks to 0. A scenario is infeasible if its
+    candidate contradicts the accepted clues, and has full agreement iff the solution
+    is unique.
+
+    Multi-scenario models do not keep a solution pool, so counts are reported as
+    0 (infeasible), 1 (unique) or 2 (at least two solutions).
+
+    :param accepted: Resolved constraint tuples already in the puzzle.
+    :param candidates: Resolved constraint tuples to evaluate (see zebra_abs_pro.resolve_constraint).
+    :param time_limit: Optional limit in seconds for the solve; PuzzleTimeout is raised if it is hit.
+    :return: One dict per candidate, in order, with keys 'constraint', 'sol_count' and
+             'agreement' (minimum agreement between two solutions, None if infeasible).
+    """
+    num_persons = len(matrix[0])
+    num_dimensions = len(matrix)
+
+    m, var_a = zebra_abs_pro.build_model(matrix)
+    m.setParam('PoolSearchMode', 0)
+    m.setParam('MIPGap', 0)
+    var_b = zebra_abs_pro.add_assignment_variables(m, matrix, prefix="xb")
+
+    copies = []
+    for prefix, var in (("a", var_a), ("b", var_b)):
+        rank_var = zebra_abs_pro.add_rank_variables(m, var, matrix, var_name_lst, prefix=f"y{prefix}")
+        copies.append((var, rank_var))
+
+    for con in accepted:
+        for var, rank_var in copies:
+            add_constraint_to_model_FIXED(m, var, matrix, dim_names, var_name_lst, con, rank_var=rank_var)
+
+    candidate_slacks = []
+    for k, con in enumerate(candidates):
+        m.update()
+        first = m.NumConstrs
+        for var, rank_var in copies:
+            add_constraint_to_model_FIXED(m, var, matrix, dim_names, var_name_lst, con, rank_var=rank_var)
+        m.update()
+        candidate_slacks.append(_add_relaxation_slacks(m, m.getConstrs()[first:], tag=k))
+
+    # agree[p][r][att] >= 1 exactly when both copies give person p attribute att in r
+    agreement = []
+    for p in range(num_persons):
+        for r in range(num_dimensions):
+            for att in range(num_persons):
+                agree = m.addVar(lb=0, ub=1, name=f"Agree_{p}_{r}_{att}")
+                m.addConstr(agree >= var_a[p][r][att] + var_b[p][r][att] - 1)
+                agreement.append(agree)
+    m.setObjective(quicksum(agreement), GRB.MINIMIZE)
+
+    m.NumScenarios = len(candidates)
+    for k, slacks in enumerate(candidate_slacks):
+        m.setParam('ScenarioNumber', k)
+        for slack in slacks:
+            slack.ScenNUB = 0
+
+    if time_limit is not None:
+        m.setParam('TimeLimit', time_limit)
+    m.optimize()
+    if m.status == GRB.TIME_LIMIT:
+        raise PuzzleTimeout("Scenario solve time budget exceeded")
+
+    total_cells = num_persons * num_dimensions
+    results = []
+    for k, con in enumerate(candidates):
+        m.setParam('ScenarioNumber', k)
+        obj_val = m.ScenNObjVal
+        obj_bound = m.ScenNObjBound
+        if obj_val >= GRB.INFINITY:
+            sol_count, agreement_val = 0, None
+        elif obj_val < total_cells - 0.5 or obj_bound < total_cells - 0.5:
+            sol_count, agreement_val = 2, obj_val
         else:
-            if v == 1:
-                m.addConstr(pos_c1 - pos_c2 == 1, name=f"PosRight_{c1}_{c2}")
-            else:
-                m.addConstr(pos_c1 >= pos_c2 + 1, name=f"PosRight_{c1}_{c2}")
+            sol_count, agreement_val = 1, obj_val
+        results.append({"constraint": con, "sol_count": sol_count, "agreement": agreement_val})
+    return results
 
-        print("added constraint:", descriptions[-1])
 
-    elif ctype == "NonPositional":
-        _, c, r, r1, sign = constraint
-        if sign == 'positive':
-            descriptions.append(
-                format_clue(
-                    "NonPositional",
-                    dim_names[r],
-                    var_name_lst[r][c],
-                    dim_names[r1],
-                    var_name_lst[r1][c],
-                    sign="positive",
-                )
-            )
-            for p in range(len(matrix[0])):
-                m.addConstr(var[p][r][c] == var[p][r1][c])
-        else:
-            c1 = random.choice([i for i in range(len(matrix[0])) if i != c])
-            descriptions.append(
-                format_clue(
-                    "NonPositional",
-                    dim_names[r],
-                    var_name_lst[r][c],
-                    dim_names[r1],
-                    var_name_lst[r1][c1],
-                    sign="negative",
-                )
-            )
-            for p in range(len(matrix[0])):
-                m.addConstr(var[p][r][c] + var[p][r1][c1] <= 1)
+def generate_scenario_clues(m, var, matrix, dim_names, var_name_lst, max_clues,
+                            rank_var=None, formulation="weighted", num_candidates=8, budget=None,
+                            clue_type_weights=zebra_abs_pro.CLUE_TYPE_WEIGHTS,
+                            sign_weights=zebra_abs_pro.SIGN_WEIGHTS):
+    """
+    Clue generation that scores several random candidates per solve.
+
+    Each round draws 'num_candidates' random clues, evaluates all of them with
+    evaluate_candidate_clues and keeps the best: a clue that makes the solution
+    unique if any, otherwise the feasible clue leaving the most agreement between
+    two competing solutions. Chosen clues are also added to 'm', which is solved
+    once at the end to confirm uniqueness and expose the solution.
 
-        print("added constraint:", descriptions[-1])
+    :return: (clue_records, constraint_added_count, unique_solution_found)
+    """
+    num_persons = len(matrix[0])
+    relations = POSITIONAL_RELATIONS if formulation == "ranked" else None
+
+    clue_records = []
+    accepted = []
+
+    while len(accepted) < max_clues:
+        candidates = []
+        for con in zebra_abs_pro.create_random_constraints(num_persons, matrix, relations=relations,
+                                                           count=num_candidates,
+                                                           clue_type_weights=clue_type_weights,
+                                                           sign_weights=sign_weights):
+            con = zebra_abs_pro.resolve_constraint(con, num_persons)
+            if con not in accepted and con not in candidates:
+                candidates.append(con)
+
+        results = evaluate_candidate_clues(
+            matrix, dim_names, var_name_lst, accepted, candidates, time_limit=remaining_solve_time(budget)
+        )
+        feasible = [res for res in results if res["sol_count"] > 0]
+        if not feasible:
+            break
+
+        best = max(feasible, key=lambda res: (res["sol_count"] == 1, res["agreement"]))
+        accepted.append(best["constraint"])
+        clue_records += add_constraint_to_model_FIXED(
+            m, var, matrix, dim_names, var_name_lst, best["constraint"], rank_var=rank_var
+        )
 
-    return descriptions
+        if best["sol_count"] == 1:
+            break
 
+    sol_count, status = check_solution_count_within_budget(m, budget)
+    return clue_records, len(accepted), sol_count == 1
+
+
+def generate_single_puzzle_FIXED(seed=None, clue_mode="random", formulation="weighted", num_candidates=8,
+                                 solve_time_limit=None, puzzle_time_limit=None, num_persons_choices=(3, 4),
+                                 clue_type_weights=zebra_abs_pro.CLUE_TYPE_WEIGHTS,
+                                 sign_weights=zebra_abs_pro.SIGN_WEIGHTS):
+    """
+    Generate a single puzzle using FIXED constraints.
+
+    :param clue_mode: "random" adds clues from create_random_constraints until the
+                      solution is unique; "counterexample" synthesizes each clue from
+                      the competing solutions of the previous solve; "scenario" picks
+                      the best of 'num_candidates' random clues per multi-scenario solve.
+    :param formulation: Positional relations drawn: "weighted" only draws
+                        "immediately_left" clues (the original clue set), "ranked" draws
+                        from clue_records.POSITIONAL_RELATIONS. Both encode positional
+                        clues over person-at-rank indicators, so the stored clue records
+                        hold in the model that produced the solution.
+    :param solve_time_limit: Seconds allowed per solver call (None = unlimited).
+    :param puzzle_time_limit: Seconds allowed for the whole puzzle (None = unlimited).
+                              A puzzle that runs out of budget is returned as a failure
+                              with "timed_out": True.
+    :param num_persons_choices: Person counts the seed picks from.
+    :param clue_type_weights: (PositionalTwo, NonPositional) weights of random clues.
+    :param sign_weights: (positive, negative) weights of NonPositional clues.
+    """
+    if clue_mode not in CLUE_MODES:
+        raise ValueError(f"Unsupported clue mode: {clue_mode}")
+    if formulation not in FORMULATIONS:
+        raise ValueError(f"Unsupported formulation: {formulation}")
 
-def generate_single_puzzle_FIXED(seed=None):
-    """Generate a single puzzle using FIXED constraints."""
     if seed is not None:
         random.seed(seed)
 
+    budget = make_time_budget(solve_time_limit, puzzle_time_limit)
+
     try:
-        num_persons = random.choice([3, 4])
+        num_persons = random.choice(list(num_persons_choices))
         matrix = zebra_abs_pro.build_matrix(num_persons)
 
         m, var = zebra_abs_pro.build_model(matrix)
         dim_names, var_name_lst = zebra_abs_pro.build_name_structure(matrix)
 
-        constraints = zebra_abs_pro.create_random_constraints(num_persons, matrix)
-
-        descriptions = []
-        unique_solution_found = False
-        constraint_added_count = 0
-
-        for idx, con in enumerate(constraints):
-            try:
-                # Use FIXED version
-                descriptions += add_constraint_to_model_FIXED(
-                    m, var, matrix, dim_names, var_name_lst, con
+        # Positional clues are always encoded over ranks: the former weighted
+        # position sums constrained the values of the numbered dimension (e.g.
+        # 1, 5, 3) rather than the order of the persons
+        rank_var = zebra_abs_pro.add_rank_variables(m, var, matrix, var_name_lst)
+        relations = POSITIONAL_RELATIONS if formulation == "ranked" else None
+
+        if clue_mode == "counterexample":
+            clue_records, constraint_added_count, unique_solution_found = \
+                generate_counterexample_clues(
+                    m, var, matrix, dim_names, var_name_lst, max_clues=num_persons ** 3,
+                    rank_var=rank_var, budget=budget, sign_weights=sign_weights
                 )
-                constraint_added_count += 1
-
-                sol_count, status = zebra_abs_pro.check_solution_count(m)
-
-                if sol_count == 0:
-                    break
-                elif sol_count == 1:
-                    unique_solution_found = True
-                    break
-                else:
+        elif clue_mode == "scenario":
+            clue_records, constraint_added_count, unique_solution_found = \
+                generate_scenario_clues(
+                    m, var, matrix, dim_names, var_name_lst, max_clues=num_persons ** 3,
+                    rank_var=rank_var, formulation=formulation, num_candidates=num_candidates,
+                    budget=budget, clue_type_weights=clue_type_weights, sign_weights=sign_weights
+                )
+        else:
+            constraints = zebra_abs_pro.create_random_constraints(num_persons, matrix, relations=relations,
+                                                                  clue_type_weights=clue_type_weights,
+                                                                  sign_weights=sign_weights)
+
+            clue_records = []
+            unique_solution_found = False
+            constraint_added_count = 0
+
+            for idx, con in enumerate(constraints):
+                try:
+                    m.update()
+                    first = m.NumConstrs
+                    # Use FIXED version
+                    records = add_constraint_to_model_FIXED(
+                        m, var, matrix, dim_names, var_name_lst, con, rank_var=rank_var
+                    )
+
+                    sol_count, status = check_solution_count_within_budget(m, budget)
+
+                    if sol_count == 0:
+                        # The clue contradicts the earlier ones: remove its rows and go on
+                        print(f"Dropping constraint {con} because it caused infeasibility.")
+                        m.remove(m.getConstrs()[first:])
+                        continue
+
+                    clue_records += records
+                    constraint_added_count += 1
+                    if sol_count == 1:
+                        unique_solution_found = True
+                        break
+                    else:
+                        continue
+
+                except PuzzleTimeout:
+                    raise
+                except Exception as e:
+                    print(f"Warning: Failed to add constraint {con}: {e}")
                     continue
 
-            except Exception as e:
-                print(f"Warning: Failed to add constraint {con}: {e}")
-                continue
-
         if unique_solution_found:
-            solution_matrix = zebra_abs_pro.get_final_solution(matrix, var)
+            solution_matrix = zebra_abs_pro.get_final_solution(matrix, var, m)
 
             puzzle_data = {
                 "puzzle_id": seed,
@@ -158,7 +432,8 @@ def generate_single_puzzle_FIXED(seed=None):
                 "dimensions": dim_names,
                 "entities": var_name_lst,
                 "num_clues": constraint_added_count,
-                "clues": descriptions,
+                "clues": [render_clue(record, dim_names, var_name_lst) for record in clue_records],
+                "clues_data": [list(record) for record in clue_records],
                 "solution": solution_matrix,
                 "generation_success": True
             }
@@ -168,10 +443,18 @@ def generate_single_puzzle_FIXED(seed=None):
             return {
                 "puzzle_id": seed,
                 "generation_success": False,
-                "reason": "No unique solution found",
+                "reason": NO_UNIQUE_SOLUTION,
                 "constraints_added": constraint_added_count
             }
 
+    except PuzzleTimeout as e:
+        return {
+            "puzzle_id": seed,
+            "generation_success": False,
+            "reason": str(e),
+            "timed_out": True
+        }
+
     except Exception as e:
         return {
             "puzzle_id": seed,
@@ -181,41 +464,247 @@ def generate_single_puzzle_FIXED(seed=None):
         }
 
 
-def generate_100_puzzles_with_gurobi(num_puzzles=100, output_file="data/generated/zebra_puzzles_gurobi_100.json"):
-    """Generate puzzles using Gurobi with FIXED constraints."""
+def _scale_time_limit(limit, factor):
+    """Scale an optional time limit (None stays unlimited)."""
+    return None if limit is None else limit * factor
+
+
+def generation_settings(clue_mode="random", formulation="weighted", num_candidates=8, num_persons_choices=(3, 4),
+                        clue_type_weights=zebra_abs_pro.CLUE_TYPE_WEIGHTS,
+                        sign_weights=zebra_abs_pro.SIGN_WEIGHTS):
+    """
+    Everything besides the seed that determines a generated puzzle, used as the
+    generation cache key (see generation_cache).
+
+    Settings a clue mode does not use are left out, so changing them keeps that
+    mode's cache entries valid. Time limits are not included: they only decide
+    whether a puzzle times out, and timed-out results are not cached.
+    """
+    import gurobipy
+
+    settings = {
+        "generator_version": GENERATOR_VERSION,
+        "solver": ["gurobi", list(gurobipy.gurobi.version())],
+        "entity_data": entity_data_hash([zebra_abs_pro.ATTRIBUTE_ENTITY_FILE, zebra_abs_pro.NUMBERED_ENTITY_FILE]),
+        "clue_mode": clue_mode,
+        "formulation": formulation,
+        "num_persons_choices": list(num_persons_choices),
+        "sign_weights": list(sign_weights)
+    }
+    if clue_mode in ("random", "scenario"):
+        settings["clue_type_weights"] = list(clue_type_weights)
+    if clue_mode == "scenario":
+        settings["num_candidates"] = num_candidates
+    return settings
+
+
+def run_report_path(output_file):
+    """Path of the per-seed run report written next to 'output_file' (a file or shard directory)."""
+    return os.path.splitext(split_compression(os.path.normpath(output_file))[0])[0] + "_run_report.json"
+
+
+def generate_100_puzzles_with_gurobi(num_puzzles=100, output_file="data/generated/zebra_puzzles_gurobi_100.json",
+                                     clue_mode="random", formulation="weighted", num_candidates=8,
+                                     start_seed=3000, seeds=None, solve_time_limit=None,
+                                     puzzle_time_limit=None, retry_time_factor=4, num_shards=None,
+                                     dedup=True, dedup_against=None, num_persons_choices=(3, 4),
+                                     clue_type_weights=zebra_abs_pro.CLUE_TYPE_WEIGHTS,
+                                     sign_weights=zebra_abs_pro.SIGN_WEIGHTS, cache_dir=None):
+    """
+    Generate puzzles using Gurobi with FIXED constraints.
+
+    Seeds that exhaust their time budget are deferred instead of stalling the run.
+    After the main pass, deferred seeds are retried once with both budgets scaled
+    by 'retry_time_factor' (0 or None disables the retry). Per-seed status and timing,
+    plus the seeds that still timed out, are written to the run report next to
+    'output_file' so they can be retried later (see --retry-from).
+
+    :param seeds: Explicit list of seeds; defaults to start_seed .. start_seed + num_puzzles - 1.
+    :param num_shards: Write 'output_file' as a directory of this many shards plus a
+                       manifest (see puzzle_io.save_sharded) instead of a single file.
+                       The shards are written at the end of the run; progress is
+                       checkpointed to '<output_file>.checkpoint.jsonl' until then.
+    :param dedup: Skip puzzles equivalent to one already generated in this run, by
+                  canonical hash (see puzzle_dedup).
+    :param dedup_against: Corpora whose puzzles count as already generated.
+    :param cache_dir: Generation cache directory (None = no cache). Seeds whose entry
+                      matches the current settings are reused instead of regenerated.
+    """
+    if seeds is None:
+        seeds = list(range(start_seed, start_seed + num_puzzles))
+    num_puzzles = len(seeds)
+
+    generator_config = {
+        "clue_mode": clue_mode,
+        "formulation": formulation,
+        "num_candidates": num_candidates,
+        "solve_time_limit": solve_time_limit,
+        "puzzle_time_limit": puzzle_time_limit,
+        "num_persons_choices": list(num_persons_choices),
+        "clue_type_weights": list(clue_type_weights),
+        "sign_weights": list(sign_weights),
+        "seeds": [min(seeds), max(seeds)] if seeds else None
+    }
+    settings = None
+    if cache_dir:
+        settings = generation_settings(clue_mode, formulation, num_candidates, num_persons_choices,
+                                       clue_type_weights, sign_weights)
+
+    # Sharded outputs are written once at the end: the shards split the sorted
+    # corpus, so every checkpoint would rewrite all of them. Until then new
+    # puzzles are appended to a JSON Lines checkpoint next to the output.
+    checkpoint_file = None
+    if num_shards:
+        checkpoint_file = os.path.normpath(output_file) + ".checkpoint.jsonl"
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+    checkpointed = 0
+
+    def save_checkpoint(puzzles):
+        nonlocal checkpointed
+        if checkpoint_file is None:
+            save_puzzles(puzzles, output_file)
+            return
+        append_puzzles(puzzles[checkpointed:], checkpoint_file)
+        checkpointed = len(puzzles)
+
+    def save_output(puzzles):
+        if num_shards:
+            save_sharded(puzzles, output_file, num_shards, config=generator_config)
+            if os.path.exists(checkpoint_file):
+                os.remove(checkpoint_file)
+        else:
+            save_puzzles(puzzles, output_file)
+
     print("=" * 70)
     print(f"GENERATING {num_puzzles} ZEBRA PUZZLES WITH GUROBI (FIXED)")
     print("=" * 70)
     print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Output file: {output_file}")
+    print(f"Clue mode: {clue_mode}")
+    print(f"Formulation: {formulation}")
+    print(f"Time budget: {solve_time_limit or 'unlimited'} s/solve, {puzzle_time_limit or 'unlimited'} s/puzzle")
+    if cache_dir:
+        print(f"Generation cache: {cache_dir}")
     print()
 
     puzzles = []
     success_count = 0
     failure_count = 0
+    duplicate_count = 0
+    deferred = []
+    seed_report = []
+    run_start = time.monotonic()
+
+    seen_hashes = None
+    if dedup:
+        seen_hashes = {canonical_hash(p) for path in dedup_against or [] for p in iter_puzzles(path)
+                       if p.get("generation_success", True)}
+        if dedup_against:
+            print(f"Deduplicating against {len(seen_hashes)} existing puzzles")
+
+    def run_seed(seed, attempt, time_factor):
+        seed_start = time.monotonic()
+        puzzle = None
+        if settings is not None:
+            key = cache_key(seed, settings)
+            puzzle = cache_get(cache_dir, key)
+        cached = puzzle is not None
+        if not cached:
+            puzzle = generate_single_puzzle_FIXED(
+                seed=seed, clue_mode=clue_mode, formulation=formulation, num_candidates=num_candidates,
+                solve_time_limit=_scale_time_limit(solve_time_limit, time_factor),
+                puzzle_time_limit=_scale_time_limit(puzzle_time_limit, time_factor),
+                num_persons_choices=num_persons_choices, clue_type_weights=clue_type_weights,
+                sign_weights=sign_weights
+            )
+            if settings is not None:
+                cache_put(cache_dir, key, seed, settings, puzzle)
+        elapsed = time.monotonic() - seed_start
 
-    for i in range(num_puzzles):
-        seed = 3000 + i
+        if puzzle and puzzle.get("generation_success", False):
+            status = "ok"
+            if seen_hashes is not None:
+                key = canonical_hash(puzzle)
+                if key in seen_hashes:
+                    status = "duplicate"
+                seen_hashes.add(key)
+        elif puzzle and puzzle.get("timed_out", False):
+            status = "timed_out"
+        else:
+            status = "failed"
+        seed_report.append({
+            "seed": seed,
+            "attempt": attempt,
+            "status": status,
+            "cached": cached,
+            "elapsed_seconds": round(elapsed, 3)
+        })
+        return puzzle, status, elapsed
+
+    for i, seed in enumerate(seeds):
         print(f"Generating puzzle {i+1}/{num_puzzles} (seed={seed})...", end=" ")
 
-        puzzle = generate_single_puzzle_FIXED(seed=seed)
+        puzzle, status, elapsed = run_seed(seed, attempt=1, time_factor=1)
 
-        if puzzle and puzzle.get("generation_success", False):
+        if status == "ok":
             puzzles.append(puzzle)
             success_count += 1
-            print(f"[OK] ({puzzle['num_persons']} persons, {puzzle['num_clues']} clues)")
+            print(f"[OK] ({puzzle['num_persons']} persons, {puzzle['num_clues']} clues) {elapsed:.2f}s")
+        elif status == "duplicate":
+            duplicate_count += 1
+            print(f"[DUP] equivalent to an earlier puzzle, skipped ({elapsed:.2f}s)")
+        elif status == "timed_out":
+            deferred.append(seed)
+            print(f"[DEFERRED] {puzzle['reason']} after {elapsed:.2f}s")
         else:
             failure_count += 1
             reason = puzzle.get("reason", "Unknown error") if puzzle else "No puzzle data"
-            print(f"[FAIL] {reason}")
+            print(f"[FAIL] {reason} ({elapsed:.2f}s)")
 
         if (i + 1) % 10 == 0:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(puzzles, f, indent=2, ensure_ascii=False)
-            print(f"  -> Progress saved ({len(puzzles)} puzzles)")
-
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(puzzles, f, indent=2, ensure_ascii=False)
+            save_checkpoint(puzzles)
+            run_elapsed = time.monotonic() - run_start
+            eta = run_elapsed / (i + 1) * (num_puzzles - i - 1)
+            print(f"  -> Progress saved ({len(puzzles)} puzzles, {len(deferred)} deferred, "
+                  f"{run_elapsed:.1f}s elapsed, ETA {eta:.1f}s)")
+
+    timed_out = deferred
+    if deferred and retry_time_factor:
+        print()
+        print(f"Retrying {len(deferred)} deferred seeds with {retry_time_factor}x time budgets...")
+        timed_out = []
+        for seed in deferred:
+            print(f"Retrying seed {seed}...", end=" ")
+            puzzle, status, elapsed = run_seed(seed, attempt=2, time_factor=retry_time_factor)
+            if status == "ok":
+                puzzles.append(puzzle)
+                success_count += 1
+                print(f"[OK] ({puzzle['num_persons']} persons, {puzzle['num_clues']} clues) {elapsed:.2f}s")
+            elif status == "duplicate":
+                duplicate_count += 1
+                print(f"[DUP] equivalent to an earlier puzzle, skipped ({elapsed:.2f}s)")
+            elif status == "timed_out":
+                timed_out.append(seed)
+                print(f"[TIMEOUT] {puzzle['reason']} after {elapsed:.2f}s")
+            else:
+                failure_count += 1
+                print(f"[FAIL] {puzzle.get('reason', 'Unknown error')} ({elapsed:.2f}s)")
+        puzzles.sort(key=lambda p: p['puzzle_id'])
+
+    save_output(puzzles)
+
+    report_file = run_report_path(output_file)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            "output_file": output_file,
+            "solve_time_limit": solve_time_limit,
+            "puzzle_time_limit": puzzle_time_limit,
+            "retry_time_factor": retry_time_factor,
+            "total_seconds": round(time.monotonic() - run_start, 3),
+            "deferred_seeds": timed_out,
+            "seeds": seed_report
+        }, f, indent=2)
 
     print()
     print("=" * 70)
@@ -224,15 +713,149 @@ def generate_100_puzzles_with_gurobi(num_puzzles=100, output_file="data/generate
     print(f"Total attempted: {num_puzzles}")
     print(f"Successful: {success_count}")
     print(f"Failed: {failure_count}")
+    print(f"Duplicates skipped: {duplicate_count}")
+    if cache_dir:
+        print(f"Reused from cache: {sum(1 for r in seed_report if r['cached'])}")
+    print(f"Timed out (deferred for retry): {len(timed_out)}")
     print(f"Success rate: {success_count/num_puzzles*100:.1f}%")
+    print(f"Total time: {time.monotonic() - run_start:.1f}s")
     print(f"End time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Output saved to: {output_file}")
+    print(f"Run report saved to: {report_file}")
 
     return puzzles
 
 
 def main():
     """Main generation function."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate zebra puzzles with Gurobi')
+    parser.add_argument(
+        '--num',
+        type=int,
+        default=100,
+        help='Number of puzzles to generate (default: 100)'
+    )
+    parser.add_argument(
+        '--output',
+        default=None,
+        help='Output file for puzzles (.json, .jsonl or compact binary .zpz; add .gz or .zst to compress; '
+             'default: data/generated/zebra_puzzles_gurobi_100.json, required with --retry-from)'
+    )
+    parser.add_argument(
+        '--num-shards',
+        type=int,
+        default=None,
+        help='Write the output as a directory of this many shards plus a manifest (written at the end of the run)'
+    )
+    parser.add_argument(
+        '--no-dedup',
+        action='store_true',
+        help='Keep puzzles equivalent to one already generated (under person/value relabeling)'
+    )
+    parser.add_argument(
+        '--dedup-against',
+        nargs='+',
+        default=None,
+        help='Existing corpora whose puzzles are skipped as duplicates'
+    )
+    parser.add_argument(
+        '--num-persons',
+        type=int,
+        nargs='+',
+        default=[3, 4],
+        help='Person counts each seed picks from (default: 3 4)'
+    )
+    parser.add_argument(
+        '--positional-weight',
+        type=float,
+        default=zebra_abs_pro.CLUE_TYPE_WEIGHTS[0],
+        help=f'Share of positional clues among random clues (default: {zebra_abs_pro.CLUE_TYPE_WEIGHTS[0]})'
+    )
+    parser.add_argument(
+        '--sign-weights',
+        type=float,
+        nargs=2,
+        default=list(zebra_abs_pro.SIGN_WEIGHTS),
+        metavar=('POSITIVE', 'NEGATIVE'),
+        help='Draw weights of positive and negative clues (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=None,
+        help='Generation cache directory; seeds with unchanged settings are reused (default: no cache)'
+    )
+    parser.add_argument(
+        '--clue-mode',
+        choices=CLUE_MODES,
+        default='random',
+        help='How clues are proposed: random draws, counterexample-guided synthesis, '
+             'or best-of-K candidates per multi-scenario solve'
+    )
+    parser.add_argument(
+        '--num-candidates',
+        type=int,
+        default=8,
+        help='Candidate clues evaluated per solve in scenario mode (default: 8)'
+    )
+    parser.add_argument(
+        '--formulation',
+        choices=FORMULATIONS,
+        default='weighted',
+        help="Positional clues: 'weighted' draws only immediately-left clues, 'ranked' all relations "
+             "(both are encoded over person-at-rank indicators)"
+    )
+
+    parser.add_argument(
+        '--start-seed',
+        type=int,
+        default=3000,
+        help='First seed of the generated range (default: 3000)'
+    )
+    parser.add_argument(
+        '--solve-time-limit',
+        type=float,
+        default=None,
+        help='Seconds allowed per solver call (default: unlimited)'
+    )
+    parser.add_argument(
+        '--puzzle-time-limit',
+        type=float,
+        default=None,
+        help='Seconds allowed per puzzle before its seed is deferred (default: unlimited)'
+    )
+    parser.add_argument(
+        '--retry-time-factor',
+        type=float,
+        default=4,
+        help='Budget multiplier for the end-of-run retry of deferred seeds (0 disables, default: 4)'
+    )
+    parser.add_argument(
+        '--retry-from',
+        default=None,
+        help='Run report of an earlier run; generate only its deferred seeds into a new --output'
+    )
+
+    args = parser.parse_args()
+
+    seeds = None
+    if args.retry_from:
+        report = load_json(args.retry_from)
+        # The retried puzzles and their report must not replace the earlier
+        # corpus or the report that lists the deferred seeds
+        if args.output is None:
+            parser.error("--retry-from needs an explicit --output for the retried puzzles")
+        output = os.path.abspath(args.output)
+        if report.get("output_file") and output == os.path.abspath(report["output_file"]):
+            parser.error(f"--output must differ from the corpus of the earlier run ({report['output_file']})")
+        if os.path.abspath(run_report_path(args.output)) == os.path.abspath(args.retry_from):
+            parser.error(f"--output {args.output} would overwrite the run report {args.retry_from}")
+        seeds = report["deferred_seeds"]
+        print(f"Retrying {len(seeds)} deferred seeds from {args.retry_from}")
+    elif args.output is None:
+        args.output = 'data/generated/zebra_puzzles_gurobi_100.json'
+
     try:
         import gurobipy
         print(f"Gurobi version: {gurobipy.gurobi.version()}")
@@ -242,7 +865,25 @@ def main():
         print(f"ERROR: Gurobi issue: {e}")
         return
 
-    puzzles = generate_100_puzzles_with_gurobi()
+    puzzles = generate_100_puzzles_with_gurobi(
+        num_puzzles=args.num,
+        output_file=args.output,
+        clue_mode=args.clue_mode,
+        formulation=args.formulation,
+        num_candidates=args.num_candidates,
+        start_seed=args.start_seed,
+        seeds=seeds,
+        solve_time_limit=args.solve_time_limit,
+        puzzle_time_limit=args.puzzle_time_limit,
+        retry_time_factor=args.retry_time_factor,
+        num_shards=args.num_shards,
+        dedup=not args.no_dedup,
+        dedup_against=args.dedup_against,
+        num_persons_choices=tuple(args.num_persons),
+        clue_type_weights=(args.positional_weight, 1 - args.positional_weight),
+        sign_weights=tuple(args.sign_weights),
+        cache_dir=args.cache_dir
+    )
 
     if puzzles:
         # Show first puzzle
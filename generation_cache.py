@@ -0,0 +1,92 @@
+"""
+Content-addressed cache of generated puzzles.
+
+Each cache entry holds the result of generate_single_puzzle_FIXED for one seed
+and is stored under the SHA-256 of everything that determines that result: the
+seed, the settings the clue mode actually uses, the solver and its version, the
+generator version and the entity data files. Changing one setting only misses
+the entries whose key includes it, so a re-run reuses every puzzle it does not
+change. The settings themselves are assembled by the generator (see
+generate_100_with_gurobi.generation_settings).
+
+Only deterministic outcomes are cached: generated puzzles and seeds that end
+without a unique solution (NO_UNIQUE_SOLUTION). Timeouts depend on the time
+budget and errors on the environment (e.g. a solver license error) rather than
+on the key, so those seeds are generated again on the next run.
+
+Layout:
+    <cache_dir>/<key[:2]>/<key>.json
+"""
+
+import os
+import json
+import hashlib
+
+from puzzle_io import file_sha256, load_json, save_json
+
+# Failure reason of a seed whose clues never pin down a unique solution
+NO_UNIQUE_SOLUTION = "No unique solution found"
+
+
+def entity_data_hash(file_paths):
+    """Combined SHA-256 of the entity data files (missing files hash as absent)."""
+    digest = hashlib.sha256()
+    for file_path in file_paths:
+        digest.update(file_sha256(file_path).encode('ascii') if os.path.exists(file_path) else b"-")
+    return digest.hexdigest()
+
+
+def cache_key(seed, settings):
+    """
+    Key of one seed's cache entry.
+
+    :param settings: JSON-serializable dict of everything besides the seed that
+                     determines the generated puzzle.
+    """
+    encoded = json.dumps({"seed": seed, "settings": settings}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def entry_path(cache_dir, key):
+    """Path of the cache entry for 'key'."""
+    return os.path.join(cache_dir, key[:2], f"{key}.json")
+
+
+def is_cacheable(result):
+    """True for deterministic results: generated puzzles and NO_UNIQUE_SOLUTION failures."""
+    if not result or result.get("timed_out", False):
+        return False
+    return bool(result.get("generation_success", False)) or result.get("reason") == NO_UNIQUE_SOLUTION
+
+
+def cache_get(cache_dir, key):
+    """
+    Return the cached result for 'key', or None on a miss, an unreadable entry
+    or an entry that is not cacheable (e.g. an error stored by an older version).
+    """
+    path = entry_path(cache_dir, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        result = load_json(path)["result"]
+    except (ValueError, KeyError):
+        return None
+    return result if is_cacheable(result) else None
+
+
+def cache_put(cache_dir, key, seed, settings, result):
+    """
+    Store a result; results that are not cacheable (timeouts, errors) are skipped.
+
+    The entry keeps the seed and settings next to the result so it can be audited.
+    Entries are written to a temporary file and renamed, so concurrent workers
+    sharing a cache never read a partial entry.
+    """
+    if not is_cacheable(result):
+        return False
+    path = entry_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    save_json({"seed": seed, "settings": settings, "result": result}, tmp_path, indent=None)
+    os.replace(tmp_path, path)
+    return True
@@ -0,0 +1,436 @@
+"""
+Streaming client for OpenAI-compatible chat completion endpoints.
+
+util.query_seek only returns complete responses. This client streams the
+completion as server-sent events, so the evaluator can parse the answer while it
+arrives and close the connection as soon as it is complete (see
+query_until_complete). Closing the stream stops the generation, which saves the
+latency and output tokens of explanations written after the answer.
+
+hedged_call adds optional request hedging: when a request is slower than a
+latency percentile learned from the run (HedgePolicy), a duplicate is sent and
+the first answer wins. The losing attempt is told to stop through its cancel
+event; streamed requests close their connection, while opaque calls such as
+query_seek can only be abandoned. Attempts run on daemon threads, so an
+abandoned call does not delay the interpreter's exit.
+
+Requests go through a ConnectionPool per endpoint: keep-alive HTTP/1.1
+connections (http.client) are reused across requests, so a run of thousands of
+prompts pays the TCP and TLS handshakes once per connection rather than once per
+request. The pool caps the number of open connections, applies the socket
+timeout and retries connection errors and 429/5xx responses with exponential
+backoff. complete() is a drop-in replacement for util.query_seek.query
+(prompt -> response text) on top of the pool; scripts choose between the two
+with their client option or LLM_CLIENT.
+
+Configuration comes from the environment unless passed explicitly:
+    LLM_BASE_URL         Endpoint base URL (default: https://api.deepseek.com)
+    LLM_API_KEY          Bearer token (not needed for local servers)
+    LLM_MODEL            Model name (default: deepseek-chat)
+    LLM_CLIENT           'query_seek' (default) or 'http' for complete()
+    LLM_MAX_CONNECTIONS  Open connections per endpoint (default: 8)
+    LLM_TIMEOUT          Socket timeout in seconds (default: 120)
+    LLM_MAX_RETRIES      Retries of a failed request (default: 2)
+"""
+
+import os
+import json
+import math
+import time
+import queue
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+DEFAULT_BASE_URL = "https://api.deepseek.com"
+DEFAULT_MODEL = "deepseek-chat"
+DEFAULT_MAX_CONNECTIONS = 8
+DEFAULT_TIMEOUT = 120
+DEFAULT_MAX_RETRIES = 2
+
+# Clients a script can send its prompts through: util.query_seek or complete()
+LLM_CLIENTS = ('query_seek', 'http')
+
+# Statuses worth retrying: rate limits and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def client_config(base_url=None, api_key=None, model=None):
+    """Resolve the endpoint settings from the arguments and the environment."""
+    return {
+        "base_url": (base_url or os.environ.get("LLM_BASE_URL", DEFAULT_BASE_URL)).rstrip('/'),
+        "api_key": api_key or os.environ.get("LLM_API_KEY"),
+        "model": model or os.environ.get("LLM_MODEL", DEFAULT_MODEL),
+    }
+
+
+def default_client():
+    """Client selected by LLM_CLIENT (one of LLM_CLIENTS)."""
+    client = os.environ.get("LLM_CLIENT", "query_seek")
+    if client not in LLM_CLIENTS:
+        raise ValueError(f"LLM_CLIENT must be one of {', '.join(LLM_CLIENTS)}, not {client!r}")
+    return client
+
+
+class LLMHTTPError(Exception):
+    """Raised for a response with an error status that is not (or no longer) retried."""
+
+    def __init__(self, status, body):
+        super().__init__(f"HTTP {status}: {body[:200]}")
+        self.status = status
+        self.body = body
+
+
+class PooledResponse:
+    """
+    Response holding a pooled connection until it is closed.
+
+    Iterating yields the body line by line. close() returns the connection to
+    the pool when the body was read to the end, and closes it otherwise (an
+    unread body would corrupt the next request on the connection).
+    """
+
+    def __init__(self, pool, connection, response):
+        self.pool = pool
+        self.connection = connection
+        self.response = response
+        self.status = response.status
+
+    def __iter__(self):
+        return iter(self.response)
+
+    def read(self):
+        """Read the whole body."""
+        return self.response.read()
+
+    def close(self):
+        """Release the connection."""
+        if self.connection is None:
+            return
+        reusable = self.response.isclosed() and not self.response.will_close
+        self.pool.release(self.connection, reusable)
+        self.connection = None
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections to one endpoint.
+
+    At most max_connections requests are in flight at once; further requests
+    wait for a free connection. Idle connections are reused, so only new
+    connections pay the TCP and TLS handshakes. Safe to share between threads.
+    """
+
+    def __init__(self, base_url, max_connections=DEFAULT_MAX_CONNECTIONS, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=0.5):
+        """
+        :param base_url: Endpoint base URL; its path is prefixed to request paths.
+        :param timeout: Socket timeout in seconds (connect and each read).
+        :param max_retries: Retries of a request after a connection error or a
+                            status in RETRY_STATUSES.
+        :param backoff: Seconds before the first retry, doubled for each further one.
+        """
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL scheme: {base_url}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path_prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.idle = []
+        self.num_connections = 0
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        with self.lock:
+            self.num_connections += 1
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self):
+        """
+        Take a connection, waiting while max_connections are in use.
+
+        :return: (connection, True if it is a reused idle connection).
+        """
+        self.slots.acquire()
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return self._connect(), False
+
+    def release(self, connection, reusable=True):
+        """Return a connection taken with acquire(); closed unless reusable."""
+        if reusable:
+            with self.lock:
+                self.idle.append(connection)
+        else:
+            connection.close()
+        self.slots.release()
+
+    def close(self):
+        """Close the idle connections."""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Send a request, retrying connection errors and statuses in RETRY_STATUSES.
+
+        A failure on a reused connection (e.g. closed by the server while idle)
+        is retried at once on another connection without counting as a retry.
+
+        :return: PooledResponse with status 200; close it when done.
+        :raises LLMHTTPError: for other statuses, or once the retries are used up.
+        """
+        retries = 0
+        while True:
+            connection, reused = self.acquire()
+            try:
+                connection.request(method, self.path_prefix + path, body=body, headers=headers or {})
+                response = connection.getresponse()
+            except (OSError, http.client.HTTPException):
+                self.release(connection, reusable=False)
+                if reused:
+                    continue
+                if retries >= self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** retries
+            else:
+                pooled = PooledResponse(self, connection, response)
+                if response.status == 200:
+                    return pooled
+                try:
+                    error_body = response.read().decode('utf-8', errors='replace')
+                finally:
+                    pooled.close()
+                if response.status not in RETRY_STATUSES or retries >= self.max_retries:
+                    raise LLMHTTPError(response.status, error_body)
+                delay = self.backoff * 2 ** retries
+                retry_after = response.getheader('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+            retries += 1
+            time.sleep(delay)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(base_url=None, max_connections=None, timeout=None, max_retries=None):
+    """
+    Shared connection pool of an endpoint (created on first use).
+
+    Settings not passed come from LLM_MAX_CONNECTIONS, LLM_TIMEOUT and
+    LLM_MAX_RETRIES; each combination of endpoint and settings has its own pool.
+    """
+    base_url = client_config(base_url=base_url)["base_url"]
+    settings = (
+        int(max_connections or os.environ.get("LLM_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+        float(timeout or os.environ.get("LLM_TIMEOUT", DEFAULT_TIMEOUT)),
+        int(max_retries if max_retries is not None else os.environ.get("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+    )
+    with _pools_lock:
+        key = (base_url,) + settings
+        if key not in _pools:
+            _pools[key] = ConnectionPool(base_url, *settings)
+        return _pools[key]
+
+
+def _post_completion(prompt, config, pool, stream):
+    body = json.dumps({
+        "model": config["model"],
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": stream,
+    }).encode('utf-8')
+    headers = {"Content-Type": "application/json",
+               "Accept": "text/event-stream" if stream else "application/json"}
+    if config["api_key"]:
+        headers["Authorization"] = f"Bearer {config['api_key']}"
+    if pool is None:
+        pool = get_pool(config["base_url"])
+    return pool.request("POST", "/chat/completions", body=body, headers=headers)
+
+
+def stream_completion(prompt, base_url=None, api_key=None, model=None, pool=None):
+    """
+    Stream a chat completion.
+
+    :param pool: ConnectionPool to use (default: get_pool(base_url)).
+    :return: Generator of text chunks. Closing it early (or breaking out of a loop
+             over it) closes the connection.
+    """
+    config = client_config(base_url, api_key, model)
+    response = _post_completion(prompt, config, pool, stream=True)
+    try:
+        for line in response:
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            data = line[len(b"data:"):].strip()
+            if data == b"[DONE]":
+                # Drain the rest of the body so the connection can be reused
+                response.read()
+                break
+            for choice in json.loads(data).get("choices", []):
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    yield text
+    finally:
+        response.close()
+
+
+def complete(prompt, base_url=None, api_key=None, model=None, pool=None):
+    """
+    Request a complete chat completion (drop-in for util.query_seek.query).
+
+    :param pool: ConnectionPool to use (default: get_pool(base_url)).
+    :return: Response text.
+    """
+    config = client_config(base_url, api_key, model)
+    response = _post_completion(prompt, config, pool, stream=False)
+    try:
+        payload = json.loads(response.read())
+    finally:
+        response.close()
+    return payload["choices"][0]["message"]["content"] or ""
+
+
+class RequestCancelled(Exception):
+    """Raised by a request whose cancel event was set."""
+
+
+def query_until_complete(prompt, parser, cancel=None, **client_kwargs):
+    """
+    Stream a completion into an incremental parser and stop once it is complete.
+
+    :param parser: Object with feed(chunk) -> bool and a 'text' attribute, e.g.
+                   answer_parser.IncrementalAnswerParser.
+    :param cancel: Optional threading.Event; when set, the stream is closed at the
+                   next chunk and RequestCancelled is raised.
+    :return: (response text, True if the stream was closed before it ended).
+    """
+    chunks = stream_completion(prompt, **client_kwargs)
+    try:
+        for chunk in chunks:
+            if cancel is not None and cancel.is_set():
+                raise RequestCancelled()
+            if parser.feed(chunk):
+                return parser.text, True
+    finally:
+        chunks.close()
+    return parser.text, False
+
+
+class HedgePolicy:
+    """
+    When to send a duplicate request, learned from the latencies of a run.
+
+    A request is hedged once it has been running longer than the given
+    percentile of the latencies recorded so far (or initial_delay seconds while
+    fewer than min_samples are recorded; None disables hedging until then).
+    Duplicates are capped at max_fraction of all requests. Safe to share
+    between threads.
+    """
+
+    def __init__(self, percentile=95, max_fraction=0.1, min_samples=10, initial_delay=None):
+        self.percentile = percentile
+        self.max_fraction = max_fraction
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.latencies = []
+        self.num_requests = 0
+        self.num_hedges = 0
+        self.lock = threading.Lock()
+
+    def delay(self):
+        """Seconds to wait before hedging, or None to never hedge."""
+        with self.lock:
+            if len(self.latencies) < max(self.min_samples, 1):
+                return self.initial_delay
+            ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(self.percentile / 100 * len(ordered)) - 1)]
+
+    def start_request(self):
+        """Count a new request."""
+        with self.lock:
+            self.num_requests += 1
+
+    def allow_hedge(self):
+        """Reserve a duplicate request if the cap allows one."""
+        with self.lock:
+            if self.num_hedges + 1 > self.max_fraction * self.num_requests:
+                return False
+            self.num_hedges += 1
+            return True
+
+    def record(self, latency):
+        """Record the latency of a completed request."""
+        with self.lock:
+            self.latencies.append(latency)
+
+
+def hedged_call(attempt, policy):
+    """
+    Run a request, sending one duplicate when it is slow.
+
+    :param attempt: Function attempt(cancel) performing the request; 'cancel' is
+                    a threading.Event set when the other attempt has won.
+    :param policy: HedgePolicy deciding when to hedge and recording latencies
+                   (measured from the first attempt, whichever attempt wins).
+    :return: (result of the first successful attempt, True if a duplicate was sent).
+             If every attempt fails, the last exception is raised.
+    """
+    policy.start_request()
+    results = queue.Queue()
+    cancels = []
+    start = time.time()
+
+    def launch():
+        cancel = threading.Event()
+        index = len(cancels)
+        cancels.append(cancel)
+
+        def run():
+            try:
+                results.put((index, attempt(cancel), None))
+            except BaseException as e:
+                results.put((index, None, e))
+
+        # Daemon threads: an abandoned attempt (e.g. a query_seek call that
+        # cannot be interrupted) must not keep the interpreter alive at exit
+        threading.Thread(target=run, daemon=True).start()
+
+    launch()
+    running = 1
+    timeout = policy.delay()
+    waited = False
+    error = None
+    while running:
+        try:
+            index, result, exception = results.get(timeout=None if waited else timeout)
+        except queue.Empty:
+            # The first attempt is slower than the learned percentile
+            waited = True
+            if policy.allow_hedge():
+                launch()
+                running += 1
+            continue
+        running -= 1
+        if exception is not None:
+            error = exception
+            continue
+        for other, cancel in enumerate(cancels):
+            if other != index:
+                cancel.set()
+        # The latency the caller saw, even when the duplicate won
+        policy.record(time.time() - start)
+        return result, len(cancels) > 1
+    raise error
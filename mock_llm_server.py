@@ -0,0 +1,364 @@
+"""
+Local mock of an OpenAI-compatible chat completion endpoint for offline tests.
+
+The server answers the evaluator's prompts from the puzzles themselves, so
+throughput, concurrency, retries, streaming and answer parsing can be tested
+and benchmarked without a model:
+
+  - a prompt is matched to its puzzle and answer format by content hash over
+    every answer format, prompt layout and prompt encoding (see
+    batch_api.prompt_digest); batch prompts and unknown prompts are answered
+    with text that holds no answer,
+  - answers are drawn from a mix of kinds (ANSWER_KINDS): 'gold' (the puzzle's
+    solution), 'corrupt' (two persons' values swapped in one dimension) and
+    'malformed' (the answer cut short in the middle of a value list),
+  - each request waits for a latency drawn from a distribution (constant,
+    uniform, exponential or lognormal) before its first byte,
+  - a fraction of requests fails with an error status (e.g. 429 or 503) or by
+    dropping the connection without a response,
+  - "stream": true requests get server-sent events in chunks, with an
+    explanation after the answer and an optional delay between chunks.
+
+Connections are HTTP/1.1 keep-alive, as with real providers.
+
+Usage:
+    python mock_llm_server.py --input data/generated/zebra_puzzles_gurobi_100.json --port 8000 \\
+        --latency lognormal:0.8,0.5 --error-rate 0.05 --answers gold=0.8,corrupt=0.1,malformed=0.1
+    LLM_BASE_URL=http://127.0.0.1:8000 python test_llm_on_puzzles.py --client http --quiet
+"""
+
+import sys
+import json
+import time
+import random
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from batch_api import prompt_digest
+from prompt_encodings import PROMPT_ENCODINGS
+from puzzle_io import iter_puzzles
+from test_llm_on_puzzles import ANSWER_FORMATS, PROMPT_LAYOUTS, format_puzzle_as_prompt
+
+ANSWER_KINDS = ('gold', 'corrupt', 'malformed')
+
+UNKNOWN_PROMPT_RESPONSE = "I could not find a puzzle I know in this prompt."
+
+EXPLANATION = "\n\nExplanation: each clue was applied in turn until only one assignment remained."
+
+
+def gold_answer(puzzle):
+    """Dict mapping each dimension name to its values for each person, from the solution."""
+    answer = {}
+    for i, dim_name in enumerate(puzzle['dimensions']):
+        if i == 0:
+            # The first dimension lists the persons in order
+            answer[dim_name] = list(puzzle['entities'][0])
+        else:
+            answer[dim_name] = [puzzle['entities'][i][index] for index in puzzle['solution'][i]]
+    return answer
+
+
+def corrupt_answer(answer, rng):
+    """Copy of an answer with two persons' values swapped in one dimension."""
+    corrupted = {dim_name: list(values) for dim_name, values in answer.items()}
+    candidates = [dim_name for dim_name, values in corrupted.items() if len(values) > 1]
+    if candidates:
+        values = corrupted[rng.choice(candidates)]
+        i, j = rng.sample(range(len(values)), 2)
+        values[i], values[j] = values[j], values[i]
+    return corrupted
+
+
+def render_answer(answer, answer_format='text'):
+    """Answer text in the format the prompt asked for."""
+    if answer_format == 'json':
+        return json.dumps(answer, ensure_ascii=False, indent=2)
+    return "".join(f"{dim_name}: [{', '.join(str(v) for v in values)}]\n" for dim_name, values in answer.items())
+
+
+def malform_answer(text):
+    """An answer cut short in the middle of its value lists."""
+    return text[:len(text) // 2]
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution "kind:params" in seconds.
+
+    Kinds: "constant:S", "uniform:LOW,HIGH", "exponential:MEAN" and
+    "lognormal:MEDIAN,SIGMA" (SIGMA of the log of the latency).
+
+    :return: Function sample(rng) -> seconds.
+    """
+    kind, _, params = spec.partition(':')
+    try:
+        values = [float(v) for v in params.split(',')] if params else []
+    except ValueError:
+        raise ValueError(f"Invalid latency parameters: {spec}")
+    expected = {'constant': 1, 'uniform': 2, 'exponential': 1, 'lognormal': 2}
+    if kind not in expected:
+        raise ValueError(f"Unknown latency distribution: {kind} (expected one of {', '.join(expected)})")
+    if len(values) != expected[kind]:
+        raise ValueError(f"Latency distribution {kind} takes {expected[kind]} parameter(s): {spec}")
+
+    if kind == 'constant':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'exponential':
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    median, sigma = values
+    return lambda rng: median * rng.lognormvariate(0, sigma)
+
+
+def parse_mix(spec):
+    """
+    Parse an answer mix "gold=0.8,corrupt=0.1,malformed=0.1".
+
+    :return: Dict mapping answer kind to weight.
+    """
+    mix = {}
+    for item in spec.split(','):
+        kind, _, weight = item.partition('=')
+        kind = kind.strip()
+        if kind not in ANSWER_KINDS:
+            raise ValueError(f"Unknown answer kind: {kind} (expected one of {', '.join(ANSWER_KINDS)})")
+        mix[kind] = float(weight) if weight else 1.0
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError(f"Answer mix needs a positive weight: {spec}")
+    return mix
+
+
+def index_prompts(puzzles):
+    """Dict mapping the digest of every prompt of each puzzle to (puzzle, answer_format)."""
+    index = {}
+    for puzzle in puzzles:
+        if not puzzle.get('generation_success', True):
+            continue
+        for answer_format in ANSWER_FORMATS:
+            for layout in PROMPT_LAYOUTS:
+                for encoding in PROMPT_ENCODINGS:
+                    prompt = format_puzzle_as_prompt(puzzle, answer_format=answer_format, prompt_layout=layout,
+                                                     prompt_encoding=encoding)
+                    index[prompt_digest(prompt)] = (puzzle, answer_format)
+    return index
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    Threaded mock chat completion server.
+
+    The profile (answer mix, latency, error rates, streaming chunks) is set at
+    construction; 'stats' counts requests by outcome. Random draws come from one
+    seeded generator, so a sequential run is reproducible.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, puzzles, answer_mix=None, latency='constant:0', error_rate=0.0,
+                 error_statuses=(503,), disconnect_rate=0.0, chunk_size=16, chunk_delay=0.0, seed=None):
+        """
+        :param address: (host, port); port 0 picks a free port.
+        :param puzzles: Iterable of puzzles the prompts are answered from.
+        :param answer_mix: Dict mapping answer kind to weight (default: all gold).
+        :param latency: Latency distribution before the first byte (see parse_latency).
+        :param error_rate: Fraction of requests answered with one of error_statuses.
+        :param disconnect_rate: Fraction of requests whose connection is dropped without a response.
+        :param chunk_size: Characters per streamed chunk.
+        :param chunk_delay: Seconds between streamed chunks.
+        """
+        super().__init__(address, MockLLMHandler)
+        self.prompts = index_prompts(puzzles)
+        self.answer_mix = answer_mix or {'gold': 1.0}
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_statuses = list(error_statuses)
+        self.disconnect_rate = disconnect_rate
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.rng = random.Random(seed)
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients resetting connections (streams closed early, idle keep-alive
+        # connections dropped) are part of normal operation
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        """Base URL to set as LLM_BASE_URL."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self, prompt):
+        """
+        Decide the outcome of a request.
+
+        :return: (latency, outcome, text): outcome is 'disconnect', an error
+                 status, or an answer kind / 'unknown' with the response text.
+        """
+        known = self.prompts.get(prompt_digest(prompt))
+        with self.lock:
+            latency = self.latency(self.rng)
+            roll = self.rng.random()
+            if roll < self.disconnect_rate:
+                outcome, text = 'disconnect', None
+            elif roll < self.disconnect_rate + self.error_rate:
+                outcome, text = self.rng.choice(self.error_statuses), None
+            elif known is None:
+                outcome, text = 'unknown', UNKNOWN_PROMPT_RESPONSE
+            else:
+                puzzle, answer_format = known
+                outcome = self.rng.choices(list(self.answer_mix), weights=list(self.answer_mix.values()))[0]
+                answer = gold_answer(puzzle)
+                if outcome == 'corrupt':
+                    answer = corrupt_answer(answer, self.rng)
+                text = render_answer(answer, answer_format)
+                if outcome == 'malformed':
+                    text = malform_answer(text)
+            self.stats[outcome] += 1
+        return latency, outcome, text
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """Handler of POST {base}/chat/completions for MockLLMServer."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": f"Unknown path: {self.path}"}})
+            return
+        try:
+            request = json.loads(body)
+            prompt = request['messages'][-1]['content']
+        except (ValueError, KeyError, IndexError, TypeError):
+            self._send_json(400, {"error": {"message": "Expected a chat completion request"}})
+            return
+
+        latency, outcome, text = self.server.draw(prompt)
+        time.sleep(latency)
+        if outcome == 'disconnect':
+            self.close_connection = True
+            return
+        if text is None:
+            self._send_json(outcome, {"error": {"message": f"Mock error {outcome}"}})
+            return
+
+        model = request.get('model', 'mock')
+        if request.get('stream'):
+            self._stream(text + EXPLANATION, model)
+        else:
+            self._send_json(200, {
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+            })
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, text, model):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        size = self.server.chunk_size
+        events = [{"object": "chat.completion.chunk", "model": model,
+                   "choices": [{"index": 0, "delta": {"content": text[i:i + size]}}]}
+                  for i in range(0, len(text), size)]
+        try:
+            for i, event in enumerate(events):
+                if i and self.server.chunk_delay:
+                    time.sleep(self.server.chunk_delay)
+                self._write_chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream early (e.g. once the answer was complete)
+            self.close_connection = True
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(puzzles, host='127.0.0.1', port=0, **profile):
+    """
+    Start a MockLLMServer in a background thread.
+
+    :param profile: Keyword arguments of MockLLMServer.
+    :return: The server; call shutdown() to stop it.
+    """
+    server = MockLLMServer((host, port), puzzles, **profile)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """Serve mock completions for a puzzle corpus until interrupted."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Mock OpenAI-compatible LLM server answering zebra puzzles')
+    parser.add_argument('--input', default='data/generated/zebra_puzzles_gurobi_100.json',
+                        help='Puzzle file or shard directory to answer from')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--answers', default='gold=1',
+                        help='Answer mix, e.g. gold=0.8,corrupt=0.1,malformed=0.1 (default: gold=1)')
+    parser.add_argument('--latency', default='constant:0',
+                        help='Latency before the first byte: constant:S, uniform:LOW,HIGH, exponential:MEAN '
+                             'or lognormal:MEDIAN,SIGMA (default: constant:0)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with an error')
+    parser.add_argument('--error-statuses', default='503',
+                        help='Comma-separated error statuses to draw from (default: 503)')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0,
+                        help='Fraction of requests whose connection is dropped without a response')
+    parser.add_argument('--chunk-size', type=int, default=16, help='Characters per streamed chunk (default: 16)')
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help='Seconds between streamed chunks')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+
+    args = parser.parse_args()
+
+    try:
+        answer_mix = parse_mix(args.answers)
+        parse_latency(args.latency)
+        error_statuses = [int(status) for status in args.error_statuses.split(',')]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.error_rate + args.disconnect_rate > 1:
+        parser.error("--error-rate and --disconnect-rate must add up to at most 1")
+
+    server = MockLLMServer((args.host, args.port), iter_puzzles(args.input), answer_mix=answer_mix,
+                           latency=args.latency, error_rate=args.error_rate, error_statuses=error_statuses,
+                           disconnect_rate=args.disconnect_rate, chunk_size=args.chunk_size,
+                           chunk_delay=args.chunk_delay, seed=args.seed)
+    print(f"Mock LLM server for {len(server.prompts)} prompts listening on {server.base_url}")
+    print(f"Run the evaluator with: LLM_BASE_URL={server.base_url} python test_llm_on_puzzles.py --client http")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("\nRequests by outcome:")
+        for outcome, count in sorted(server.stats.items(), key=lambda item: str(item[0])):
+            print(f"  {outcome}: {count}")
+
+
+if __name__ == '__main__':
+    main()
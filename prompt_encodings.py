@@ -0,0 +1,176 @@
+"""
+Compact prompt encodings of a puzzle's setup and clues, and prompt token counts.
+
+Encodings (PROMPT_ENCODINGS):
+  - sentence: the markdown setup and the English clue sentences of the
+    puzzle (the original prompt),
+  - table:    plain "Dimension: values" setup lines and one clue per line in a
+    short notation over "Dimension:value" references, e.g.
+    "FavoriteActor:Daniel Day-Lewis = Phone Brand:BQ",
+  - alias:    dimensions aliased to letters and values numbered in a legend,
+    with clues over the aliases, e.g. "FavoriteActor: E1=Daniel Day-Lewis, ..."
+    and "E1 = D1".
+
+The answer is always requested with the full dimension names and values, so
+parsing and evaluation do not depend on the encoding. Clues are taken from
+'clues_data' (or parsed from the clue text of older puzzles); a clue that
+cannot be parsed keeps its sentence.
+
+count_tokens uses tiktoken's cl100k_base encoding when the optional tiktoken
+package is installed and a local approximation of it otherwise.
+
+Usage:
+    python prompt_encodings.py --input data/generated/zebra_puzzles_gurobi_100.json
+"""
+
+import re
+from string import ascii_uppercase
+
+from verify_puzzles import puzzle_clue_records
+
+PROMPT_ENCODINGS = ('sentence', 'table', 'alias')
+
+NOTATION = ("Notation (positions from left to right): = same person; != different persons; "
+            "left-of somewhere left; just-left-of immediately left; next-to neighbours.\n")
+
+CLUE_OPERATORS = {
+    "positive": "=",
+    "negative": "!=",
+    "left": "left-of",
+    "immediately_left": "just-left-of",
+    "next_to": "next-to",
+}
+
+# Pre-tokenizer close to the one of cl100k_base: words with a leading space,
+# numbers in groups of up to three digits, punctuation runs and whitespace
+_APPROX_TOKEN = re.compile(r" ?[^\W\d_]+| ?\d{1,3}| ?[^\w\s]+|\s+")
+
+_tiktoken_encoding = None
+
+
+def dimension_alias(dim_index):
+    """Letter alias of a dimension (A, B, ..., Z, AA, ...)."""
+    alias = ""
+    dim_index += 1
+    while dim_index:
+        dim_index, rest = divmod(dim_index - 1, 26)
+        alias = ascii_uppercase[rest] + alias
+    return alias
+
+
+def _clue_lines(puzzle, reference):
+    lines = []
+    for record, text in zip(puzzle_clue_records(puzzle), puzzle['clues']):
+        if record is None:
+            lines.append(text)
+            continue
+        _, r, c, r1, c1, qualifier = record
+        lines.append(f"{reference(r, c)} {CLUE_OPERATORS[qualifier]} {reference(r1, c1)}")
+    return lines
+
+
+def format_encoded_sections(puzzle, encoding):
+    """
+    Format the setup and clue sections of a puzzle in a compact encoding.
+
+    Returns a list of prompt parts.
+    """
+    entities = puzzle['entities']
+    prompt_parts = [f"\nSetup: {puzzle['num_persons']} persons; each value below belongs to exactly one person.\n"]
+
+    if encoding == 'alias':
+        for r, (dim_name, values) in enumerate(zip(puzzle['dimensions'], entities)):
+            alias = dimension_alias(r)
+            legend = ", ".join(f"{alias}{i}={value}" for i, value in enumerate(values, 1))
+            prompt_parts.append(f"{dim_name}: {legend}\n")
+        lines = _clue_lines(puzzle, lambda r, c: f"{dimension_alias(r)}{c + 1}")
+    elif encoding == 'table':
+        for dim_name, values in zip(puzzle['dimensions'], entities):
+            prompt_parts.append(f"{dim_name}: {', '.join(str(v) for v in values)}\n")
+        lines = _clue_lines(puzzle, lambda r, c: f"{puzzle['dimensions'][r]}:{entities[r][c]}")
+    else:
+        raise ValueError(f"Unknown prompt encoding: {encoding}")
+
+    prompt_parts.append(f"\nClues ({len(lines)}):\n")
+    prompt_parts.append(NOTATION)
+    prompt_parts.extend(f"{i}. {line}\n" for i, line in enumerate(lines, 1))
+    return prompt_parts
+
+
+def count_tokens(text):
+    """Number of prompt tokens of a text (tiktoken cl100k_base if installed, else approximated)."""
+    global _tiktoken_encoding
+    if _tiktoken_encoding is None:
+        try:
+            import tiktoken
+            _tiktoken_encoding = tiktoken.get_encoding("cl100k_base")
+        except (ImportError, OSError, ValueError):
+            _tiktoken_encoding = False
+    if _tiktoken_encoding:
+        return len(_tiktoken_encoding.encode(text))
+    # Long words split into several tokens; assume about 6 characters per token
+    return sum(max(1, (len(token.strip()) + 5) // 6) if token.strip() else 1
+               for token in _APPROX_TOKEN.findall(text))
+
+
+def token_counter_name():
+    """Name of the counter count_tokens uses."""
+    count_tokens("")
+    return "tiktoken cl100k_base" if _tiktoken_encoding else "approximate"
+
+
+def encoding_report(puzzles, encodings=PROMPT_ENCODINGS, answer_format='text', prompt_layout='inline'):
+    """
+    Count the prompt tokens of every puzzle in each encoding.
+
+    :return: Dict mapping encoding to {'total_tokens', 'mean_tokens', 'max_tokens', 'num_prompts'}.
+    """
+    from test_llm_on_puzzles import format_puzzle_as_prompt
+
+    totals = {encoding: [] for encoding in encodings}
+    for puzzle in puzzles:
+        if not puzzle.get('generation_success', True):
+            continue
+        for encoding in encodings:
+            prompt = format_puzzle_as_prompt(puzzle, answer_format=answer_format, prompt_layout=prompt_layout,
+                                             prompt_encoding=encoding)
+            totals[encoding].append(count_tokens(prompt))
+
+    return {
+        encoding: {
+            'total_tokens': sum(counts),
+            'mean_tokens': sum(counts) / len(counts) if counts else 0.0,
+            'max_tokens': max(counts, default=0),
+            'num_prompts': len(counts),
+        }
+        for encoding, counts in totals.items()
+    }
+
+
+def main():
+    """Report the prompt tokens of a corpus in each encoding."""
+    import argparse
+
+    from puzzle_io import iter_puzzles
+    from test_llm_on_puzzles import ANSWER_FORMATS, PROMPT_LAYOUTS
+
+    parser = argparse.ArgumentParser(description='Compare prompt token counts of the prompt encodings')
+    parser.add_argument('--input', default='data/generated/zebra_puzzles_gurobi_100.json',
+                        help='Puzzle file or shard directory')
+    parser.add_argument('--answer-format', choices=ANSWER_FORMATS, default='text')
+    parser.add_argument('--prompt-layout', choices=PROMPT_LAYOUTS, default='inline')
+
+    args = parser.parse_args()
+
+    report = encoding_report(iter_puzzles(args.input), answer_format=args.answer_format,
+                             prompt_layout=args.prompt_layout)
+    baseline = report['sentence']['total_tokens'] or 1
+    print(f"Token counter: {token_counter_name()}")
+    print(f"{'Encoding':<10} {'Prompts':>8} {'Mean':>8} {'Max':>6} {'Total':>9} {'vs sentence':>12}")
+    for encoding, stats in report.items():
+        print(f"{encoding:<10} {stats['num_prompts']:>8} {stats['mean_tokens']:>8.1f} {stats['max_tokens']:>6} "
+              f"{stats['total_tokens']:>9} {stats['total_tokens'] / baseline:>11.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import os
 import random
 
 
@@ -14,3 +15,27 @@ def format_setup_string(entities):
     return "\n".join(
         f"{dimension}: {', '.join(values)}" for dimension, values in entities.items()
     )
+
+
+def assemble_prompt(static_parts, dynamic_parts):
+    """
+    Join a prompt from its static parts (instructions, examples, output-format
+    rules) followed by its per-request parts.
+
+    Keeping every static part in front gives all prompts of a template the same
+    byte-stable prefix, which provider-side and local prompt caches can reuse.
+
+    :return: (prompt, length of the static prefix in characters)
+    """
+    prefix = "".join(static_parts)
+    return prefix + "".join(dynamic_parts), len(prefix)
+
+
+def shared_prefix_length(prompts):
+    """Length in characters of the longest prefix shared by all prompts (0 if none)."""
+    prefix = None
+    for prompt in prompts:
+        prefix = prompt if prefix is None else os.path.commonprefix([prefix, prompt])
+        if not prefix:
+            break
+    return len(prefix or "")
@@ -0,0 +1,177 @@
+"""
+Canonical puzzle hashing and deduplication.
+
+Two puzzles are equivalent when one becomes the other by renaming persons,
+renaming the values of a dimension, reordering the non-positional dimensions or
+reordering the clues. The canonical form removes all of these:
+
+  - every value is replaced by the position rank of the person who holds it in
+    the solution (the position dimension fixes an order of the persons, so this
+    also removes person relabeling),
+  - symmetric clues ("also has", "does not have", "next to") list their two
+    attributes in a fixed order, and the clues are sorted,
+  - the non-positional dimensions are renumbered in the order that gives the
+    smallest clue list.
+
+Usage:
+    python puzzle_dedup.py data/generated/*.json --output deduped.json
+"""
+
+import json
+import hashlib
+from itertools import permutations
+
+from clue_records import POSITION_DIMENSION
+from puzzle_io import iter_puzzles, save_puzzles
+from verify_puzzles import puzzle_clue_records, stored_assignment
+
+SYMMETRIC_QUALIFIERS = ("positive", "negative", "next_to")
+
+
+def canonical_form(puzzle):
+    """
+    Return the canonical form of a puzzle: (num_persons, num_dimensions, clues).
+
+    Clues are tuples (type, r, k, r1, k1, qualifier) where k/k1 are position ranks.
+    The stored solution is used to map values to persons.
+    """
+    num_persons = puzzle['num_persons']
+    num_dimensions = len(puzzle['dimensions'])
+    assignment = stored_assignment(puzzle)
+    records = [record for record in puzzle_clue_records(puzzle) if record is not None]
+
+    positions = puzzle['entities'][POSITION_DIMENSION]
+    order = sorted(range(num_persons), key=lambda att: int(positions[att]))
+    person_rank = [order.index(assignment[POSITION_DIMENSION][p]) for p in range(num_persons)]
+    # rank_of[r][c] = rank of the person holding value c of dimension r
+    rank_of = [[person_rank[row.index(c)] for c in range(num_persons)] for row in assignment]
+    clues = [(ctype, r, rank_of[r][c], r1, rank_of[r1][c1], qualifier)
+             for ctype, r, c, r1, c1, qualifier in records]
+
+    others = [r for r in range(num_dimensions) if r != POSITION_DIMENSION]
+    best = None
+    for perm in permutations(range(len(others))):
+        dim_map = {POSITION_DIMENSION: POSITION_DIMENSION}
+        for r, new in zip(others, perm):
+            # Skip over POSITION_DIMENSION so it keeps its own index
+            dim_map[r] = new if new < POSITION_DIMENSION else new + 1
+        relabeled = []
+        for ctype, r, k, r1, k1, qualifier in clues:
+            a, b = (dim_map[r], k), (dim_map[r1], k1)
+            if qualifier in SYMMETRIC_QUALIFIERS and b < a:
+                a, b = b, a
+            relabeled.append((ctype,) + a + b + (qualifier,))
+        relabeled.sort()
+        if best is None or relabeled < best:
+            best = relabeled
+    return num_persons, num_dimensions, tuple(best)
+
+
+def canonical_hash(puzzle):
+    """Stable SHA-256 hex digest of a puzzle's canonical form."""
+    encoded = json.dumps(canonical_form(puzzle), separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over hex digests (e.g. canonical_hash values).
+
+    Membership tests may report false positives at roughly 'error_rate' once
+    'capacity' keys are added, but never false negatives.
+    """
+
+    def __init__(self, capacity, error_rate=1e-4):
+        import math
+
+        capacity = max(capacity, 1)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _indices(self, key):
+        # Double hashing from two 64-bit halves of the digest
+        h1 = int(key[:16], 16)
+        h2 = int(key[16:32], 16) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        """Add a key; return True if it may already have been present."""
+        present = True
+        for i in self._indices(key):
+            byte, bit = divmod(i, 8)
+            if not self.bits[byte] & (1 << bit):
+                present = False
+                self.bits[byte] |= 1 << bit
+        return present
+
+    def __contains__(self, key):
+        return all(self.bits[i // 8] & (1 << (i % 8)) for i in self._indices(key))
+
+
+def find_duplicates(input_files, capacity=None, error_rate=1e-4):
+    """
+    Find duplicate puzzles across corpora in two streaming passes.
+
+    The first pass only adds canonical hashes to a Bloom filter and remembers the
+    hashes it may have seen before; the second pass confirms those candidates
+    exactly. Memory is the filter plus the candidates, not one entry per puzzle.
+
+    :param capacity: Expected number of puzzles (default: counted in an extra pass).
+    :return: Dict mapping (file index, position) of every duplicate to the
+             puzzle_id of the first equivalent puzzle.
+    """
+    if capacity is None:
+        capacity = sum(1 for input_file in input_files for _ in iter_puzzles(input_file))
+
+    bloom = BloomFilter(capacity, error_rate)
+    candidates = set()
+    for input_file in input_files:
+        for puzzle in iter_puzzles(input_file):
+            if puzzle.get('generation_success', True):
+                key = canonical_hash(puzzle)
+                if bloom.add(key):
+                    candidates.add(key)
+
+    first_seen = {}
+    duplicates = {}
+    for file_index, input_file in enumerate(input_files):
+        for position, puzzle in enumerate(iter_puzzles(input_file)):
+            if not puzzle.get('generation_success', True):
+                continue
+            key = canonical_hash(puzzle)
+            if key not in candidates:
+                continue
+            if key in first_seen:
+                duplicates[(file_index, position)] = first_seen[key]
+            else:
+                first_seen[key] = puzzle.get('puzzle_id')
+    return duplicates
+
+
+def main():
+    """Report duplicate puzzles and optionally write a deduplicated corpus."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Find equivalent puzzles across corpora')
+    parser.add_argument('inputs', nargs='+', help='Puzzle corpus files or shard directories')
+    parser.add_argument('--output', default=None, help='Write the puzzles without duplicates to this file')
+    parser.add_argument('--error-rate', type=float, default=1e-4, help='Bloom filter false-positive rate')
+
+    args = parser.parse_args()
+
+    duplicates = find_duplicates(args.inputs, error_rate=args.error_rate)
+    for (file_index, position), first_id in sorted(duplicates.items()):
+        print(f"  {args.inputs[file_index]}[{position}] duplicates puzzle #{first_id}")
+    print(f"Duplicates: {len(duplicates)}")
+
+    if args.output:
+        kept = (puzzle for file_index, input_file in enumerate(args.inputs)
+                for position, puzzle in enumerate(iter_puzzles(input_file))
+                if (file_index, position) not in duplicates)
+        save_puzzles(kept, args.output)
+        print(f"Deduplicated corpus saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
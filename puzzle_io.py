@@ -0,0 +1,829 @@
+"""
+Reading and writing puzzle corpora.
+
+Three on-disk formats are supported and picked by file extension:
+
+  - JSON (.json): the list of puzzle dicts written by generate_100_with_gurobi.py.
+  - JSON Lines (.jsonl): one puzzle per line, read and written incrementally.
+  - Compact binary (.zpz): columnar integer arrays plus one interned entity table.
+
+Any of them may carry a .gz (gzip) or .zst (zstd, needs 'zstandard') suffix and
+is then compressed and decompressed as it streams. load_json/save_json do the
+same for other JSON documents such as evaluation results.
+
+In the binary format every dimension is stored as a category ID and every entity
+as a value ID into the entity table, which is seeded from attribute_entity.json
+and numbered_entity.json so IDs are the same across corpora. Clues are stored as
+clue records (see clue_records) and the clue text is rendered again on load.
+Puzzles that cannot be stored as arrays (e.g. failed generations) are kept as
+JSON in the header, so any corpus round-trips.
+
+File layout (all integers little-endian):
+
+    b"ZPZ1" | uint32 header length | zlib(JSON header) | column arrays
+
+A sharded dataset is a directory of shard files (any of the formats above) plus
+manifest.json with per-shard record counts, seed ranges and SHA-256 hashes and
+the generator settings. load_puzzles accepts the directory and reads the shards
+in parallel; load_sharded can also select shards and verify hashes.
+
+For training pipelines, export_tensors writes the same integer data as padded,
+fixed-width .npy arrays that can be memory-mapped (see load_tensors).
+
+Usage:
+    python puzzle_io.py data/generated/zebra_puzzles_gurobi_100.json corpus.zpz
+    python puzzle_io.py corpus.zpz tensors/ --tensors
+    python puzzle_io.py corpus.zpz corpus_shards/ --shards 8
+"""
+
+import gc
+import os
+import sys
+import gzip
+import json
+import zlib
+import struct
+import uuid
+import hashlib
+from array import array
+from multiprocessing import Pool
+
+from clue_records import CLUE_PATTERNS, POSITIONAL_RELATIONS, parse_clue_text, render_clue
+
+ATTRIBUTE_ENTITY_FILE = 'data/attribute_entity.json'
+NUMBERED_ENTITY_FILE = 'data/numbered_entity.json'
+
+ZPZ_MAGIC = b"ZPZ1"
+ZPZ_EXTENSION = ".zpz"
+ZPZ_VERSION = 1
+
+JSONL_EXTENSION = ".jsonl"
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+SHARD_EXTENSION = ".jsonl.gz"
+
+# (clue type, qualifier) pairs, indexed by the stored clue kind code
+CLUE_CODES = [("NonPositional", "positive"), ("NonPositional", "negative")] + \
+             [("PositionalTwo", relation) for relation in POSITIONAL_RELATIONS]
+
+# Column name -> array typecode; every column is a flat array over all puzzles
+COLUMNS = [
+    ("puzzle_id", "q"),
+    ("num_persons", "B"),
+    ("num_dimensions", "B"),
+    ("num_clues", "H"),
+    ("flags", "B"),
+    ("dims", "H"),       # category ID per dimension
+    ("values", "H"),     # value ID per dimension and person, row-major
+    ("solution", "B"),   # solution rows 1.. (row 0 is always Person_0..n-1)
+    ("clues", "B"),      # 5 per clue: kind code, r, c, r1, c1
+]
+
+FLAG_SUCCESS = 1
+FLAG_CLUES_DATA = 2
+
+TENSOR_PAD = -1
+TENSOR_META_FILE = "tensors.json"
+TENSOR_NAMES = ["puzzle_id", "num_persons", "num_dimensions", "num_clues",
+                "dims", "entity_ids", "solution", "clues"]
+
+# Keys written for every successful puzzle, in the generator's order
+_PUZZLE_KEYS = ["puzzle_id", "num_persons", "dimensions", "entities", "num_clues",
+                "clues", "clues_data", "solution", "generation_success"]
+
+
+def build_entity_table(attribute_file=ATTRIBUTE_ENTITY_FILE, numbered_file=NUMBERED_ENTITY_FILE):
+    """
+    Build the interned entity table from the entity files.
+
+    :return: List of [category name, list of values]. Missing files give an empty
+             table; unknown categories and values are interned on write.
+    """
+    table = []
+    for file_path in (attribute_file, numbered_file):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                entities = json.load(f)
+        except FileNotFoundError:
+            continue
+        table.extend([name, list(values)] for name, values in entities.items())
+    return table
+
+
+class _EntityInterner:
+    """Maps category names and their values to IDs, extending the table as needed."""
+
+    def __init__(self, table):
+        self.table = [[name, list(values)] for name, values in table]
+        self.category_ids = {}
+        self.value_ids = []
+        for name, values in self.table:
+            self.category_ids.setdefault(name, len(self.value_ids))
+            self.value_ids.append({})
+            for i, value in enumerate(values):
+                self.value_ids[-1].setdefault(_value_key(value), i)
+
+    def category(self, name):
+        if name not in self.category_ids:
+            self.category_ids[name] = len(self.table)
+            self.table.append([name, []])
+            self.value_ids.append({})
+        return self.category_ids[name]
+
+    def value(self, category_id, value):
+        ids = self.value_ids[category_id]
+        key = _value_key(value)
+        if key not in ids:
+            ids[key] = len(self.table[category_id][1])
+            self.table[category_id][1].append(value)
+        return ids[key]
+
+
+def _value_key(value):
+    # Keep 1 and "1" apart; both can occur as entity values
+    return (type(value).__name__, value)
+
+
+def _clue_records(puzzle):
+    """Clue records of a puzzle, or None if its clue text cannot be parsed."""
+    if 'clues_data' in puzzle:
+        return [tuple(record) for record in puzzle['clues_data']]
+    records = [parse_clue_text(clue, puzzle['dimensions'], puzzle['entities']) for clue in puzzle['clues']]
+    return None if None in records else records
+
+
+def _is_encodable(puzzle):
+    """Whether a puzzle fits the column layout exactly."""
+    if not puzzle.get('generation_success') or not all(key in puzzle for key in _PUZZLE_KEYS if key != 'clues_data'):
+        return False
+    num_persons = puzzle['num_persons']
+    num_dimensions = len(puzzle['dimensions'])
+    return (
+        num_persons <= 255 and num_dimensions <= 255 and puzzle['num_clues'] == len(puzzle['clues'])
+        and len(puzzle['entities']) == num_dimensions
+        and all(len(row) == num_persons for row in puzzle['entities'])
+        and len(puzzle['solution']) == num_dimensions
+        and puzzle['solution'][0] == [f"Person_{p}" for p in range(num_persons)]
+        and all(isinstance(v, int) and 0 <= v < num_persons for row in puzzle['solution'][1:] for v in row)
+    )
+
+
+def _encode_puzzle(puzzle, interner):
+    """
+    Encode one puzzle as integer rows.
+
+    :return: (dim_ids, value_ids, solution, clue_codes), where value_ids and
+             solution are per-dimension rows and clue_codes holds one
+             [kind code, r, c, r1, c1] row per clue; None if the puzzle does not
+             fit the column layout.
+    """
+    records = _clue_records(puzzle) if _is_encodable(puzzle) else None
+    if records is None or len(records) != len(puzzle['clues']):
+        return None
+    # Text that does not match its records would not survive re-rendering
+    if any(render_clue(record, puzzle['dimensions'], puzzle['entities']) != clue
+           for record, clue in zip(records, puzzle['clues'])):
+        return None
+
+    dim_ids = [interner.category(name) for name in puzzle['dimensions']]
+    value_ids = [[interner.value(category_id, value) for value in values]
+                 for category_id, values in zip(dim_ids, puzzle['entities'])]
+    clue_codes = [[CLUE_CODES.index((ctype, qualifier)), r, c, r1, c1]
+                  for ctype, r, c, r1, c1, qualifier in records]
+    return dim_ids, value_ids, puzzle['solution'][1:], clue_codes
+
+
+def encode_puzzles(puzzles, table=None):
+    """
+    Encode a list of puzzle dicts in the compact binary format.
+
+    :param table: Entity table to intern against (default: build_entity_table()).
+    :return: The encoded bytes.
+    """
+    interner = _EntityInterner(build_entity_table() if table is None else table)
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    raw = {}
+    extras = {}
+
+    for index, puzzle in enumerate(puzzles):
+        encoded = _encode_puzzle(puzzle, interner)
+        if encoded is None:
+            raw[index] = puzzle
+            continue
+        dim_ids, value_ids, solution, clue_codes = encoded
+
+        columns['puzzle_id'].append(puzzle['puzzle_id'])
+        columns['num_persons'].append(puzzle['num_persons'])
+        columns['num_dimensions'].append(len(dim_ids))
+        columns['num_clues'].append(len(clue_codes))
+        columns['flags'].append(FLAG_SUCCESS | (FLAG_CLUES_DATA if 'clues_data' in puzzle else 0))
+        columns['dims'].extend(dim_ids)
+        for row in value_ids:
+            columns['values'].extend(row)
+        for row in solution:
+            columns['solution'].extend(row)
+        for row in clue_codes:
+            columns['clues'].extend(row)
+
+        extra = {key: value for key, value in puzzle.items() if key not in _PUZZLE_KEYS}
+        if extra:
+            extras[index] = extra
+
+    header = {
+        "version": ZPZ_VERSION,
+        "num_puzzles": len(puzzles),
+        "entity_table": interner.table,
+        "columns": [[name, typecode, len(columns[name])] for name, typecode in COLUMNS],
+        "raw": raw,
+        "extras": extras
+    }
+    header_bytes = zlib.compress(json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    chunks = [ZPZ_MAGIC, struct.pack('<I', len(header_bytes)), header_bytes]
+    for name, _ in COLUMNS:
+        column = columns[name]
+        if sys.byteorder == 'big':
+            column.byteswap()
+        chunks.append(column.tobytes())
+    return b"".join(chunks)
+
+
+def decode_puzzles(data, clue_text=True):
+    """
+    Decode bytes written by encode_puzzles back into a list of puzzle dicts.
+
+    The columns are read as numpy views of 'data' and the entities, clue records
+    and clue text of all puzzles are built in bulk, so the per-puzzle work is only
+    slicing those lists into puzzle dicts.
+
+    :param clue_text: Render the 'clues' text. Without it the clue records are
+                      returned in 'clues_data' instead, which is the cheaper of
+                      the two to build; with it records are only built for
+                      puzzles that were stored with 'clues_data'.
+    """
+    import numpy as np
+
+    if data[:4] != ZPZ_MAGIC:
+        raise ValueError("Not a compact puzzle file (bad magic)")
+    (header_len,) = struct.unpack_from('<I', data, 4)
+    offset = 8 + header_len
+    header = json.loads(zlib.decompress(data[8:offset]).decode('utf-8'))
+    if header["version"] != ZPZ_VERSION:
+        raise ValueError(f"Unsupported compact puzzle file version: {header['version']}")
+
+    columns = {}
+    for name, typecode, length in header["columns"]:
+        dtype = np.dtype(typecode).newbyteorder('<')
+        columns[name] = np.frombuffer(data, dtype=dtype, count=length, offset=offset)
+        offset += dtype.itemsize * length
+
+    # Building hundreds of thousands of small lists would otherwise trigger a
+    # garbage collection pass every few hundred of them
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _decode_columns(columns, header, clue_text)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _decode_columns(columns, header, clue_text):
+    """Build the puzzle dicts of decode_puzzles from its column arrays."""
+    import numpy as np
+
+    table = header["entity_table"]
+    # JSON object keys are strings; both are keyed by position in the corpus
+    raw = {int(index): puzzle for index, puzzle in header["raw"].items()}
+    extras = {int(index): extra for index, extra in header["extras"].items()}
+
+    num_persons = columns['num_persons'].astype(np.intp)
+    num_dimensions = columns['num_dimensions'].astype(np.intp)
+    num_clues = columns['num_clues'].astype(np.intp)
+    flags = columns['flags']
+    value_counts = num_dimensions * num_persons
+
+    # Entity values of all categories in one flat table, indexed by category offset + value ID
+    category_offsets = np.cumsum([0] + [len(values) for _, values in table])
+    category_names = [name for name, _ in table]
+    dims = columns['dims'].astype(np.intp)
+    value_index = np.repeat(category_offsets[dims], np.repeat(num_persons, num_dimensions)) + columns['values']
+    flat_values = [value for _, values in table for value in values]
+    entities = [flat_values[i] for i in value_index.tolist()]
+
+    clue_codes = columns['clues'].reshape(-1, 5).astype(np.intp)
+    kinds = clue_codes[:, 0]
+
+    texts = None
+    if clue_text:
+        # Each side of a clue is a "<dimension> <value>" label of the flat entity table
+        labels = np.array([f"{name} {value}" for name, values in table for value in values] + [None],
+                          dtype=object)[:-1]
+        clue_rows = np.repeat(np.arange(len(num_persons)), num_clues)
+        clue_persons = num_persons[clue_rows]
+        clue_values = (np.cumsum(value_counts) - value_counts)[clue_rows]
+        left = labels[value_index[clue_values + clue_codes[:, 1] * clue_persons + clue_codes[:, 2]]]
+        right = labels[value_index[clue_values + clue_codes[:, 3] * clue_persons + clue_codes[:, 4]]]
+        patterns = {(ctype, qualifier): (prefix, middle, suffix)
+                    for ctype, qualifier, prefix, middle, suffix in CLUE_PATTERNS}
+        phrasings = [patterns[code] for code in CLUE_CODES]
+        texts = [f"{prefix}{a}{middle}{b}{suffix}" for (prefix, middle, suffix), a, b
+                 in zip(map(phrasings.__getitem__, kinds.tolist()), left.tolist(), right.tolist())]
+
+    records = None
+    if not clue_text or (flags & FLAG_CLUES_DATA).any():
+        record_array = np.empty((len(clue_codes), 6), dtype=object)
+        record_array[:, 0] = np.array([ctype for ctype, _ in CLUE_CODES], dtype=object)[kinds]
+        record_array[:, 1:5] = clue_codes[:, 1:]
+        record_array[:, 5] = np.array([qualifier for _, qualifier in CLUE_CODES], dtype=object)[kinds]
+        records = record_array.tolist()
+
+    dim_names = [category_names[i] for i in dims.tolist()]
+    solutions = columns['solution'].tolist()
+    puzzle_ids = columns['puzzle_id'].tolist()
+    person_rows = {}
+    puzzles = []
+    dim_pos = value_pos = solution_pos = clue_pos = 0
+
+    for index, (num_p, num_d, num_c, flag) in enumerate(zip(num_persons.tolist(), num_dimensions.tolist(),
+                                                            num_clues.tolist(), flags.tolist())):
+        while len(puzzles) in raw:
+            puzzles.append(raw[len(puzzles)])
+
+        if num_p not in person_rows:
+            person_rows[num_p] = [f"Person_{p}" for p in range(num_p)]
+        value_end = value_pos + num_d * num_p
+        solution_end = solution_pos + (num_d - 1) * num_p
+        clue_end = clue_pos + num_c
+
+        puzzle = {
+            "puzzle_id": puzzle_ids[index],
+            "num_persons": num_p,
+            "dimensions": dim_names[dim_pos:dim_pos + num_d],
+            "entities": [entities[i:i + num_p] for i in range(value_pos, value_end, num_p)],
+            "num_clues": num_c,
+        }
+        if clue_text:
+            puzzle["clues"] = texts[clue_pos:clue_end]
+        if flag & FLAG_CLUES_DATA or not clue_text:
+            puzzle["clues_data"] = records[clue_pos:clue_end]
+        puzzle["solution"] = [person_rows[num_p][:]] + \
+            [solutions[i:i + num_p] for i in range(solution_pos, solution_end, num_p)]
+        puzzle["generation_success"] = bool(flag & FLAG_SUCCESS)
+        if len(puzzles) in extras:
+            puzzle.update(extras[len(puzzles)])
+        puzzles.append(puzzle)
+
+        dim_pos += num_d
+        value_pos = value_end
+        solution_pos = solution_end
+        clue_pos = clue_end
+
+    while len(puzzles) < header["num_puzzles"]:
+        puzzles.append(raw[len(puzzles)])
+    return puzzles
+
+
+def split_compression(file_path):
+    """
+    Split a compression suffix off 'file_path'.
+
+    :return: (path without the suffix, "gzip" / "zstd" / None)
+    """
+    for suffix, codec in COMPRESSION_SUFFIXES.items():
+        if file_path.endswith(suffix):
+            return file_path[:-len(suffix)], codec
+    return file_path, None
+
+
+def open_stream(file_path, mode='r'):
+    """
+    Open a file, transparently (de)compressing .gz and .zst files.
+
+    Text modes use UTF-8. Data is compressed and decompressed as it streams,
+    so large files are never held in memory compressed and decompressed at once.
+    zstd needs the optional 'zstandard' package.
+    """
+    _, codec = split_compression(file_path)
+    encoding = None if 'b' in mode else 'utf-8'
+    if 'b' not in mode and 't' not in mode:
+        mode += 't'
+    if codec == "gzip":
+        return gzip.open(file_path, mode, encoding=encoding)
+    if codec == "zstd":
+        try:
+            import zstandard
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError(f"Reading or writing {file_path} needs zstandard: pip install zstandard")
+        return zstandard.open(file_path, mode, encoding=encoding)
+    return open(file_path, mode, encoding=encoding)
+
+
+def is_compact_file(file_path):
+    """Whether 'file_path' should be read and written in the compact binary format."""
+    return split_compression(file_path)[0].endswith(ZPZ_EXTENSION)
+
+
+def is_jsonl_file(file_path):
+    """Whether 'file_path' holds one JSON record per line."""
+    return split_compression(file_path)[0].endswith(JSONL_EXTENSION)
+
+
+def iter_puzzles(file_path, clue_text=True):
+    """
+    Yield the puzzles of a corpus one at a time.
+
+    JSON Lines corpora (.jsonl, optionally compressed) are parsed line by line, so
+    only one puzzle is in memory at a time; sharded datasets are read shard by
+    shard and other formats are loaded first.
+    """
+    if is_sharded(file_path):
+        out_dir = os.path.dirname(file_path) if os.path.basename(file_path) == MANIFEST_FILE else file_path
+        for shard in load_manifest(file_path)["shards"]:
+            yield from iter_puzzles(os.path.join(out_dir, shard["file"]), clue_text=clue_text)
+        return
+    if not is_jsonl_file(file_path):
+        yield from load_puzzles(file_path, clue_text=clue_text)
+        return
+    with open_stream(file_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_puzzles(file_path, clue_text=True):
+    """
+    Load a puzzle corpus from a JSON, JSON Lines or compact binary file, or from a
+    sharded dataset directory (see load_sharded).
+
+    Any of them may be gzip (.gz) or zstd (.zst) compressed.
+
+    :param clue_text: For compact files, whether to render the clue text (see decode_puzzles).
+    """
+    if is_sharded(file_path):
+        return load_sharded(file_path, clue_text=clue_text)
+    if is_compact_file(file_path):
+        with open_stream(file_path, 'rb') as f:
+            return decode_puzzles(f.read(), clue_text=clue_text)
+    if is_jsonl_file(file_path):
+        return list(iter_puzzles(file_path))
+    with open_stream(file_path, 'r') as f:
+        return json.load(f)
+
+
+def save_puzzles(puzzles, file_path):
+    """
+    Save a puzzle corpus as JSON, JSON Lines or compact binary, depending on the file
+    extension, compressed if it ends in .gz or .zst.
+
+    JSON and JSON Lines are written one puzzle at a time, so 'puzzles' may be any iterable.
+    """
+    if is_compact_file(file_path):
+        with open_stream(file_path, 'wb') as f:
+            f.write(encode_puzzles(list(puzzles)))
+        return
+    with open_stream(file_path, 'w') as f:
+        if is_jsonl_file(file_path):
+            for puzzle in puzzles:
+                f.write(json.dumps(puzzle, ensure_ascii=False) + "\n")
+            return
+        # Same layout as json.dump(..., indent=2), without building the whole text
+        f.write("[")
+        empty = True
+        for puzzle in puzzles:
+            f.write("\n  " if empty else ",\n  ")
+            f.write(json.dumps(puzzle, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+            empty = False
+        f.write("]" if empty else "\n]")
+
+
+def append_puzzles(puzzles, file_path):
+    """Append puzzles to a JSON Lines file (created if missing), e.g. as a cheap checkpoint."""
+    with open_stream(file_path, 'a') as f:
+        for puzzle in puzzles:
+            f.write(json.dumps(puzzle, ensure_ascii=False) + "\n")
+
+
+def load_json(file_path):
+    """Load any JSON document (e.g. a results file), decompressing .gz/.zst files."""
+    with open_stream(file_path, 'r') as f:
+        return json.load(f)
+
+
+def save_json(data, file_path, indent=2):
+    """Save any JSON document (e.g. a results file), compressing .gz/.zst files."""
+    with open_stream(file_path, 'w') as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+
+
+def is_sharded(path):
+    """Whether 'path' is a sharded dataset directory (or its manifest file)."""
+    if os.path.basename(path) == MANIFEST_FILE:
+        return True
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def shard_file_name(index, num_shards, extension=SHARD_EXTENSION):
+    """File name of shard 'index' out of 'num_shards'."""
+    return f"shard-{index:05d}-of-{num_shards:05d}{extension}"
+
+
+def file_sha256(file_path):
+    """SHA-256 of a file's bytes, as stored in the manifest."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_shard(puzzles, out_dir, file_name, before_replace=None):
+    """
+    Write one shard and return its manifest entry.
+
+    Shards are written to a temporary name unique to the writer and renamed, so a
+    crashed writer never leaves a partial shard behind and concurrent writers of
+    the same shard never write into each other's file. The hash is taken from the
+    file that is renamed into place.
+
+    :param before_replace: Optional function called just before the rename; if it
+                           returns False the shard is discarded and None returned
+                           (e.g. a distributed worker that lost its lease).
+    """
+    puzzles = list(puzzles)
+    shard_path = os.path.join(out_dir, file_name)
+    root, _ = split_compression(shard_path)
+    base, extension = os.path.splitext(root)
+    # Keep the format and compression suffixes so save_puzzles picks the same format
+    tmp_path = f"{base}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}{extension}{shard_path[len(root):]}"
+    save_puzzles(puzzles, tmp_path)
+    sha256 = file_sha256(tmp_path)
+    if before_replace is not None and not before_replace():
+        os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, shard_path)
+
+    ids = [p['puzzle_id'] for p in puzzles if 'puzzle_id' in p]
+    return {
+        "file": file_name,
+        "num_records": len(puzzles),
+        "seed_range": [min(ids), max(ids)] if ids else None,
+        "sha256": sha256
+    }
+
+
+def write_manifest(out_dir, shards, config=None):
+    """
+    Write the manifest of a sharded dataset.
+
+    :param shards: Manifest entries as returned by write_shard, in shard order.
+    :param config: Generator settings recorded alongside the shards.
+    """
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "num_records": sum(shard["num_records"] for shard in shards),
+        "num_shards": len(shards),
+        "generator_config": config or {},
+        "shards": shards
+    }
+    save_json(manifest, os.path.join(out_dir, MANIFEST_FILE))
+    return manifest
+
+
+def load_manifest(path):
+    """Load the manifest of a sharded dataset (directory or manifest path)."""
+    if os.path.basename(path) != MANIFEST_FILE:
+        path = os.path.join(path, MANIFEST_FILE)
+    return load_json(path)
+
+
+def save_sharded(puzzles, out_dir, num_shards, extension=SHARD_EXTENSION, config=None):
+    """
+    Save a corpus as 'num_shards' shard files plus a manifest.
+
+    Puzzles are sorted by puzzle ID and split into contiguous, near-equal shards,
+    so each shard covers one seed range.
+
+    :param extension: Shard format, any extension save_puzzles accepts.
+    :return: The manifest.
+    """
+    puzzles = sorted(puzzles, key=lambda p: p.get('puzzle_id', -1))
+    os.makedirs(out_dir, exist_ok=True)
+    shards = []
+    for i in range(num_shards):
+        chunk = puzzles[len(puzzles) * i // num_shards:len(puzzles) * (i + 1) // num_shards]
+        shards.append(write_shard(chunk, out_dir, shard_file_name(i, num_shards, extension)))
+    return write_manifest(out_dir, shards, config)
+
+
+def select_shards(manifest, shards=None):
+    """
+    Pick manifest entries by shard index or file name (None = all shards).
+    """
+    if shards is None:
+        return list(manifest["shards"])
+    by_name = {shard["file"]: shard for shard in manifest["shards"]}
+    return [by_name[s] if isinstance(s, str) else manifest["shards"][s] for s in shards]
+
+
+def _load_shard(args):
+    shard_path, expected_sha256, clue_text = args
+    if expected_sha256 is not None and file_sha256(shard_path) != expected_sha256:
+        raise ValueError(f"Shard {shard_path} does not match the hash in its manifest")
+    return load_puzzles(shard_path, clue_text=clue_text)
+
+
+def load_sharded(path, shards=None, workers=None, verify=False, clue_text=True):
+    """
+    Load a sharded dataset, reading shards in parallel.
+
+    :param path: Dataset directory or its manifest.
+    :param shards: Shard indices or file names to load (None = all).
+    :param workers: Reader processes (None = one per shard up to os.cpu_count(), 1 = in-process).
+    :param verify: Check every shard against its manifest hash first.
+    :return: Puzzles of the selected shards, in manifest order.
+    """
+    out_dir = os.path.dirname(path) if os.path.basename(path) == MANIFEST_FILE else path
+    selected = select_shards(load_manifest(path), shards)
+    tasks = [(os.path.join(out_dir, shard["file"]), shard["sha256"] if verify else None, clue_text)
+             for shard in selected]
+
+    if workers is None:
+        workers = min(len(tasks), os.cpu_count() or 1)
+    if workers <= 1 or len(tasks) <= 1:
+        parts = [_load_shard(task) for task in tasks]
+    else:
+        with Pool(processes=workers) as pool:
+            parts = pool.map(_load_shard, tasks)
+    return [puzzle for part in parts for puzzle in part]
+
+
+def export_tensors(puzzles, out_dir, table=None, max_clues=None):
+    """
+    Export a corpus as fixed-width .npy arrays for np.load(mmap_mode='r').
+
+    One file per array is written to 'out_dir', with N puzzles, D = max dimensions,
+    P = max persons and C = max clues; padding is TENSOR_PAD (-1):
+
+        puzzle_id (N,) int64, num_persons (N,) int8, num_dimensions (N,) int8,
+        num_clues (N,) int16,
+        dims (N, D) int16            category ID per dimension
+        entity_ids (N, D, P) int16   global entity ID per dimension and person
+        solution (N, D, P) int8      value index held by each person (row 0 = identity)
+        clues (N, C, 5) int8         kind code, r, c, r1, c1 per clue
+
+    plus tensors.json with the entity table (global entity ID = category offset +
+    value ID), the clue kind codes and the IDs of puzzles that were left out
+    (failed generations and clue text that cannot be parsed).
+
+    :param max_clues: Clue width C (default: the largest clue count in the corpus).
+    :return: Number of puzzles exported.
+    """
+    import numpy as np
+    from numpy.lib.format import open_memmap
+
+    interner = _EntityInterner(build_entity_table() if table is None else table)
+    kept = []
+    skipped = []
+    for puzzle in puzzles:
+        encoded = _encode_puzzle(puzzle, interner)
+        if encoded is None:
+            skipped.append(puzzle.get('puzzle_id'))
+        else:
+            kept.append((puzzle, encoded))
+
+    num = len(kept)
+    max_dims = max((len(enc[0]) for _, enc in kept), default=0)
+    max_persons = max((p['num_persons'] for p, _ in kept), default=0)
+    longest = max((len(enc[3]) for _, enc in kept), default=0)
+    if max_clues is None:
+        max_clues = longest
+    elif longest > max_clues:
+        raise ValueError(f"Corpus has puzzles with {longest} clues, more than max_clues={max_clues}")
+
+    offsets = []
+    total = 0
+    for _, values in interner.table:
+        offsets.append(total)
+        total += len(values)
+
+    os.makedirs(out_dir, exist_ok=True)
+    shapes = {
+        "puzzle_id": ((num,), np.int64),
+        "num_persons": ((num,), np.int8),
+        "num_dimensions": ((num,), np.int8),
+        "num_clues": ((num,), np.int16),
+        "dims": ((num, max_dims), np.int16),
+        "entity_ids": ((num, max_dims, max_persons), np.int16),
+        "solution": ((num, max_dims, max_persons), np.int8),
+        "clues": ((num, max_clues, 5), np.int8),
+    }
+    # Written straight into the .npy files, so large corpora never sit in memory twice
+    arrays = {name: open_memmap(os.path.join(out_dir, f"{name}.npy"), mode='w+', dtype=dtype, shape=shape)
+              for name, (shape, dtype) in shapes.items()}
+    for name in ("dims", "entity_ids", "solution", "clues"):
+        arrays[name][...] = TENSOR_PAD
+
+    for i, (puzzle, (dim_ids, value_ids, solution, clue_codes)) in enumerate(kept):
+        num_persons = puzzle['num_persons']
+        num_dims = len(dim_ids)
+        arrays['puzzle_id'][i] = puzzle['puzzle_id']
+        arrays['num_persons'][i] = num_persons
+        arrays['num_dimensions'][i] = num_dims
+        arrays['num_clues'][i] = len(clue_codes)
+        arrays['dims'][i, :num_dims] = dim_ids
+        arrays['entity_ids'][i, :num_dims, :num_persons] = \
+            np.asarray(value_ids) + np.asarray([offsets[c] for c in dim_ids])[:, None]
+        arrays['solution'][i, 0, :num_persons] = np.arange(num_persons)
+        arrays['solution'][i, 1:num_dims, :num_persons] = solution
+        if clue_codes:
+            arrays['clues'][i, :len(clue_codes)] = clue_codes
+
+    for array_ in arrays.values():
+        array_.flush()
+    del arrays
+
+    with open(os.path.join(out_dir, TENSOR_META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            "num_puzzles": num,
+            "pad": TENSOR_PAD,
+            "clue_codes": [list(code) for code in CLUE_CODES],
+            "entity_table": [[name, values, offset] for (name, values), offset in zip(interner.table, offsets)],
+            "skipped_puzzle_ids": skipped
+        }, f, ensure_ascii=False)
+
+    return num
+
+
+def load_tensors(out_dir, mmap_mode='r'):
+    """
+    Open arrays written by export_tensors.
+
+    :param mmap_mode: Passed to np.load; the default maps the files read-only, so
+                      slices are read from disk on access without parsing.
+    :return: (arrays, meta) where arrays maps names to arrays and meta is tensors.json.
+    """
+    import numpy as np
+
+    with open(os.path.join(out_dir, TENSOR_META_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+              for name in TENSOR_NAMES}
+    return arrays, meta
+
+
+def main():
+    """Convert a corpus between the JSON and compact binary formats, or export tensors."""
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert puzzle corpora between JSON and compact binary (.zpz)')
+    parser.add_argument('input', help='Input corpus (.json or .zpz)')
+    parser.add_argument('output', help='Output corpus (.json, .jsonl or .zpz), or a directory with --tensors/--shards')
+    parser.add_argument(
+        '--tensors',
+        action='store_true',
+        help='Export fixed-width .npy arrays into the output directory instead'
+    )
+    parser.add_argument(
+        '--max-clues',
+        type=int,
+        default=None,
+        help='Clue width of the exported clue tensor (default: longest puzzle)'
+    )
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=None,
+        help='Write a sharded dataset with this many shards into the output directory'
+    )
+
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    puzzles = load_puzzles(args.input)
+    load_seconds = time.monotonic() - start
+
+    if args.tensors:
+        num = export_tensors(puzzles, args.output, max_clues=args.max_clues)
+        print(f"Exported {num} of {len(puzzles)} puzzles as tensors to {args.output}")
+        return
+
+    if args.shards:
+        manifest = save_sharded(puzzles, args.output, args.shards)
+        print(f"Wrote {manifest['num_records']} puzzles in {manifest['num_shards']} shards to {args.output}")
+        return
+
+    save_puzzles(puzzles, args.output)
+
+    input_size = os.path.getsize(args.input)
+    output_size = os.path.getsize(args.output)
+    print(f"Converted {len(puzzles)} puzzles: {args.input} -> {args.output}")
+    print(f"Size: {input_size:,} -> {output_size:,} bytes ({input_size / max(output_size, 1):.1f}x)")
+    print(f"Load time of input: {load_seconds * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,23 @@
 Test LLMs on generated zebra puzzles.
 
 This script loads puzzles from JSON, formats them as natural language prompts,
-sends them to an LLM via query_seek, and evaluates the responses.
+sends them to an LLM via query_seek (or the pooled HTTP client of llm_client),
+and evaluates the responses.
 """
 
 import sys
 import os
-import json
 import re
+import time
+import hashlib
 from datetime import datetime
+from itertools import islice
+
+from answer_parser import IncrementalAnswerParser, compile_vocabulary, parse_answer, parse_json_answer
+from llm_client import LLM_CLIENTS, HedgePolicy, complete, default_client, hedged_call, query_until_complete
+from prompt_encodings import PROMPT_ENCODINGS, format_encoded_sections
+from prompt_formatting import assemble_prompt, shared_prefix_length
+from puzzle_io import iter_puzzles, load_json, save_json
 
 # Setup paths - add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -21,20 +30,34 @@ except ModuleNotFoundError:
     # Fallback: Mock query function for testing
     def query_seek(prompt):
         print("[WARNING] Using mock query_seek - util module not found")
-        print("[INFO] Install util module or implement query_seek for actual LLM testing")
+        print("[INFO] Install util module or implement query_seek for actual LLM testing, "
+              "or use --client http (see mock_llm_server.py for an offline endpoint)")
         return "MOCK RESPONSE - Replace with actual LLM integration"
 
+# Answer formats the prompt can ask for: free-text lines or a JSON object
+ANSWER_FORMATS = ('text', 'json')
+
+# Prompt layouts: 'inline' interleaves instructions with the puzzle (the original
+# layout), 'prefix' puts all static text first so prompts share a cacheable prefix
+PROMPT_LAYOUTS = ('inline', 'prefix')
+
+# Heading line that starts the answer to one puzzle of a batch ("### Puzzle 2")
+BATCH_HEADING = re.compile(r"^[ \t#*]*puzzle[ \t]*#?[ \t]*(\d+)[ \t*:#]*$", re.IGNORECASE | re.MULTILINE)
+
 
-def format_puzzle_as_prompt(puzzle):
+def format_puzzle_sections(puzzle, prompt_encoding='sentence'):
     """
-    Convert a puzzle JSON object into a natural language prompt for LLM testing.
+    Format the setup and clue sections of a puzzle prompt.
     
-    Returns a string that asks the LLM to solve the puzzle.
+    prompt_encoding 'sentence' writes the markdown setup and clue sentences;
+    the compact encodings are formatted by prompt_encodings.
+    
+    Returns a list of prompt parts.
     """
-    prompt_parts = []
+    if prompt_encoding != 'sentence':
+        return format_encoded_sections(puzzle, prompt_encoding)
     
-    # Title
-    prompt_parts.append("# Zebra Puzzle\n")
+    prompt_parts = []
     
     # Setup section
     prompt_parts.append("## Puzzle Setup\n")
@@ -52,6 +75,41 @@ def format_puzzle_as_prompt(puzzle):
     for i, clue in enumerate(puzzle['clues'], 1):
         prompt_parts.append(f"{i}. {clue}\n")
     
+    return prompt_parts
+
+
+def format_answer_template(puzzle, answer_format='text'):
+    """Return the answer template of a puzzle: one line per dimension or a JSON object."""
+    if answer_format == 'json':
+        lines = [f'  "{dim_name}": [value1, value2, ...]' for dim_name in puzzle['dimensions']]
+        return "{\n" + ",\n".join(lines) + "\n}\n"
+    return "".join(f"{dim_name}: [value1, value2, ...]\n" for dim_name in puzzle['dimensions'])
+
+
+def format_puzzle_as_prompt(puzzle, answer_format='text', prompt_layout='inline', prompt_encoding='sentence'):
+    """
+    Convert a puzzle JSON object into a natural language prompt for LLM testing.
+    
+    Args:
+        puzzle: Puzzle dict
+        answer_format: 'text' asks for one "Dimension: [...]" line per dimension,
+            'json' for a JSON object keyed by dimension
+        prompt_layout: 'inline' or 'prefix' (see format_prefix_prompt)
+        prompt_encoding: Encoding of the setup and clues, one of PROMPT_ENCODINGS
+            (see prompt_encodings)
+    
+    Returns a string that asks the LLM to solve the puzzle.
+    """
+    if prompt_layout == 'prefix':
+        return format_prefix_prompt(puzzle, answer_format, prompt_encoding)[0]
+    
+    prompt_parts = []
+    
+    # Title
+    prompt_parts.append("# Zebra Puzzle\n")
+    
+    prompt_parts.extend(format_puzzle_sections(puzzle, prompt_encoding))
+    
     # Question section
     prompt_parts.append("\n## Question\n")
     prompt_parts.append("Based on the clues above, determine the complete solution.\n")
@@ -59,46 +117,162 @@ def format_puzzle_as_prompt(puzzle):
     
     # Format instructions
     prompt_parts.append("## Output Format\n")
-    prompt_parts.append("Please provide your answer in the following format:\n\n")
+    if answer_format == 'json':
+        prompt_parts.append("Please provide your answer as a single JSON object with one key per dimension. ")
+        prompt_parts.append("Each key maps to the list of that dimension's values for each person, ")
+        prompt_parts.append("written exactly as listed above (numbers as numbers):\n\n")
+        prompt_parts.append(format_answer_template(puzzle, answer_format))
+        prompt_parts.append("\nProvide ONLY the JSON object, no additional explanation.\n")
+    else:
+        prompt_parts.append("Please provide your answer in the following format:\n\n")
+        prompt_parts.append(format_answer_template(puzzle, answer_format))
+        prompt_parts.append("\nProvide ONLY the solution in this exact format, no additional explanation.\n")
+    
+    return "".join(prompt_parts)
+
+
+def format_prefix_prompt(puzzle, answer_format='text', prompt_encoding='sentence'):
+    """
+    Format a puzzle prompt with all static text in front.
     
-    for dim_name in puzzle['dimensions']:
-        prompt_parts.append(f"{dim_name}: [value1, value2, ...]\n")
+    The title, instructions and output-format rules only depend on the answer
+    format, so every prompt starts with the same bytes and prompt caches can
+    reuse them; the setup, clues and the puzzle's answer template follow.
     
-    prompt_parts.append("\nProvide ONLY the solution in this exact format, no additional explanation.\n")
+    Returns (prompt, length of the static prefix in characters).
+    """
+    static_parts = [
+        "# Zebra Puzzle\n",
+        "\n## Instructions\n",
+        "Each person in the puzzle below has exactly one value of every dimension, and no two persons share a value.\n",
+        "Based on the clues, determine the complete solution.\n",
+        "For each dimension, provide the sequence of values corresponding to each person.\n",
+        "\n## Output Format\n",
+    ]
+    if answer_format == 'json':
+        static_parts.append("Please provide your answer as a single JSON object with one key per dimension, ")
+        static_parts.append("filled in from the answer template at the end. Each key maps to the list of that ")
+        static_parts.append("dimension's values for each person, written exactly as listed in the setup (numbers as numbers).\n")
+        static_parts.append("\nProvide ONLY the JSON object, no additional explanation.\n")
+    else:
+        static_parts.append("Please provide your answer with one line per dimension, in the format of the answer ")
+        static_parts.append("template at the end:\n\n")
+        static_parts.append("Dimension: [value1, value2, ...]\n")
+        static_parts.append("\nProvide ONLY the solution in this exact format, no additional explanation.\n")
+    
+    dynamic_parts = ["\n"]
+    dynamic_parts.extend(format_puzzle_sections(puzzle, prompt_encoding))
+    dynamic_parts.append("\n## Answer Template\n")
+    dynamic_parts.append(format_answer_template(puzzle, answer_format))
+    
+    return assemble_prompt(static_parts, dynamic_parts)
+
+
+def format_batch_prompt(puzzles, answer_format='text', prompt_encoding='sentence'):
+    """
+    Pack several puzzles into one prompt with numbered answer sections.
+    
+    The question and format instructions are written once; the answer to puzzle
+    k must start with a "### Puzzle k" heading (see split_batch_response).
+    
+    Returns a string that asks the LLM to solve all the puzzles.
+    """
+    prompt_parts = []
+    
+    prompt_parts.append("# Zebra Puzzles\n")
+    prompt_parts.append(f"Solve each of the following {len(puzzles)} puzzles independently.\n")
+    
+    for k, puzzle in enumerate(puzzles, 1):
+        prompt_parts.append(f"\n# Puzzle {k}\n")
+        prompt_parts.extend(format_puzzle_sections(puzzle, prompt_encoding))
+    
+    # Question section
+    prompt_parts.append("\n## Question\n")
+    prompt_parts.append("Based on the clues, determine the complete solution of every puzzle.\n")
+    prompt_parts.append("For each dimension, provide the sequence of values corresponding to each person.\n\n")
+    
+    # Format instructions
+    prompt_parts.append("## Output Format\n")
+    prompt_parts.append("Please answer every puzzle in order, starting each answer with its heading")
+    if answer_format == 'json':
+        prompt_parts.append(" followed by a single JSON object with one key per dimension. ")
+        prompt_parts.append("Each key maps to the list of that dimension's values for each person, ")
+        prompt_parts.append("written exactly as listed in the puzzle (numbers as numbers):\n")
+    else:
+        prompt_parts.append(", in the following format:\n")
+    
+    for k, puzzle in enumerate(puzzles, 1):
+        prompt_parts.append(f"\n### Puzzle {k}\n")
+        prompt_parts.append(format_answer_template(puzzle, answer_format))
+    
+    prompt_parts.append("\nProvide ONLY the solutions in this exact format, no additional explanation.\n")
     
     return "".join(prompt_parts)
 
 
+def split_batch_response(response, puzzles):
+    """
+    Split the response to a batch prompt into per-puzzle answers.
+    
+    Each answer runs from its "Puzzle k" heading to the next heading. A heading
+    is a line holding nothing but "Puzzle k" (with optional markdown '#'/'*',
+    '#' before k and a trailing ':'), so prose such as "Puzzle 1 was easy." is
+    never taken for one. If puzzle k has several sections, the one in which the
+    most dimensions parse is used (the last of equals), so a remark after a
+    complete answer does not replace it.
+    
+    Returns a list of answer strings, one per puzzle ('' where no heading was found).
+    """
+    headings = list(BATCH_HEADING.finditer(response))
+    sections = [[] for _ in puzzles]
+    for heading, next_heading in zip(headings, headings[1:] + [None]):
+        k = int(heading.group(1))
+        if 1 <= k <= len(puzzles):
+            sections[k - 1].append(response[heading.end():next_heading.start() if next_heading else len(response)])
+    
+    answers = []
+    for puzzle, candidates in zip(puzzles, sections):
+        if len(candidates) > 1:
+            candidates = sorted(candidates, key=lambda section: len(parse_answer(
+                section, puzzle['dimensions'], puzzle['entities'])))
+        answers.append(candidates[-1] if candidates else '')
+    return answers
+
+
 def parse_llm_response(response, puzzle):
     """
     Parse the LLM's response and extract the solution.
     
+    The response is matched against the puzzle's own entity vocabulary in one
+    pass (see answer_parser), so values containing commas are kept whole and
+    case or quoting differences do not matter.
+    
     Returns a dict mapping dimension names to lists of values.
     """
-    solution = {}
+    vocabulary = compile_vocabulary(puzzle['dimensions'], puzzle['entities'])
     
-    # Try to extract each dimension's solution
-    for dim_name in puzzle['dimensions']:
-        # Look for patterns like "DimensionName: [value1, value2, ...]"
-        # or "DimensionName: value1, value2, ..."
-        pattern = rf"{re.escape(dim_name)}\s*:\s*\[?([^\n\]]+)\]?"
-        match = re.search(pattern, response, re.IGNORECASE)
-        
-        if match:
-            values_str = match.group(1).strip()
-            # Split by comma and clean up
-            values = [v.strip().strip('"').strip("'") for v in values_str.split(',')]
-            solution[dim_name] = values
-        else:
-            # Try alternative format: look for dimension name followed by values on next line
-            pattern = rf"{re.escape(dim_name)}\s*:?\s*\n\s*(.+?)(?:\n|$)"
-            match = re.search(pattern, response, re.IGNORECASE)
-            if match:
-                values_str = match.group(1).strip()
-                values = [v.strip().strip('"').strip("'") for v in values_str.split(',')]
-                solution[dim_name] = values
+    return {
+        puzzle['dimensions'][dim_index]: [vocabulary.entities[dim_index][i] for i in indices]
+        for dim_index, indices in vocabulary.parse(response).items()
+    }
+
+
+def parse_json_response(response, puzzle):
+    """
+    Parse a JSON-format response (see format_puzzle_as_prompt).
     
-    return solution
+    Returns (solution, errors): solution maps dimension names to lists of values
+    and is None when the response is not valid JSON or does not match the
+    puzzle's answer schema.
+    """
+    answer, errors = parse_json_answer(response, puzzle['dimensions'], puzzle['entities'], puzzle['num_persons'])
+    if answer is None:
+        return None, errors
+    
+    return {
+        puzzle['dimensions'][dim_index]: [str(puzzle['entities'][dim_index][i]) for i in indices]
+        for dim_index, indices in answer.items()
+    }, []
 
 
 def evaluate_solution(parsed_solution, gold_solution, puzzle):
@@ -158,10 +332,93 @@ def evaluate_solution(parsed_solution, gold_solution, puzzle):
     return results
 
 
-def test_single_puzzle(puzzle, verbose=True):
+def query_llm(prompt, hedge=None, parser_factory=None, client='query_seek'):
+    """
+    Send a prompt to the LLM.
+    
+    Args:
+        prompt: Prompt text
+        hedge: Optional llm_client.HedgePolicy; a request slower than its learned
+            latency percentile is duplicated and the first answer wins
+        parser_factory: Stream the response through llm_client instead of
+            query_seek, feeding a new parser from parser_factory() per attempt and
+            stopping once the answer is complete
+        client: 'query_seek' or 'http' for llm_client.complete, which reuses
+            keep-alive connections across requests (ignored when streaming,
+            which always uses llm_client)
+    
+    Returns (response, stream_cancelled, hedged); stream_cancelled is None
+    without streaming.
+    """
+    if parser_factory is not None:
+        def attempt(cancel):
+            return query_until_complete(prompt, parser_factory(), cancel=cancel)
+    else:
+        query = complete if client == 'http' else query_seek
+        def attempt(cancel):
+            # Complete responses cannot be interrupted; a losing hedge attempt is abandoned
+            return query(prompt), None
+    
+    if hedge is None:
+        response, stream_cancelled = attempt(None)
+        return response, stream_cancelled, False
+    (response, stream_cancelled), hedged = hedged_call(attempt, hedge)
+    return response, stream_cancelled, hedged
+
+
+def grade_response(puzzle, response, answer_format='text', verbose=True):
+    """
+    Parse and evaluate a response to one puzzle.
+    
+    With answer_format='json' the response is parsed as JSON first and falls back
+    to the text parser when it is malformed.
+    
+    Returns (parsed_solution, parser_used, evaluation).
+    """
+    parsed_solution = None
+    if answer_format == 'json':
+        parsed_solution, schema_errors = parse_json_response(response, puzzle)
+        if parsed_solution is None and verbose:
+            print(f"\n[WARNING] JSON answer rejected ({schema_errors[0]}); falling back to text parser")
+    parser_used = 'json' if parsed_solution is not None else 'text'
+    if parsed_solution is None:
+        parsed_solution = parse_llm_response(response, puzzle)
+    
+    # Evaluate
+    evaluation = evaluate_solution(parsed_solution, puzzle['solution'], puzzle)
+    
+    if verbose:
+        print(f"\nEvaluation:")
+        print(f"Correct: {evaluation['correct']}")
+        print(f"Accuracy: {evaluation['accuracy']:.2%}")
+        print(f"Dimensions correct: {evaluation['num_correct_dimensions']}/{evaluation['total_dimensions']}")
+        
+        if evaluation['errors']:
+            print("\nErrors:")
+            for error in evaluation['errors']:
+                print(f"  - {error}")
+    
+    return parsed_solution, parser_used, evaluation
+
+
+def test_single_puzzle(puzzle, verbose=True, answer_format='text', stream=False, prompt_layout='inline',
+                       prompt_encoding='sentence', hedge=None, client='query_seek'):
     """
     Test the LLM on a single puzzle.
     
+    With answer_format='json' the response is parsed as JSON first and falls back
+    to the text parser when it is malformed (see grade_response); the result
+    records which parser was used.
+    
+    With stream=True the response is streamed through llm_client instead of
+    query_seek and the stream is closed as soon as every dimension has a complete
+    value list; 'stream_cancelled' records whether that happened.
+    
+    prompt_layout and prompt_encoding select the prompt layout and the encoding
+    of the setup and clues (see format_puzzle_as_prompt). With a hedge policy,
+    slow requests are hedged (see query_llm); 'hedged' records whether that
+    happened. client selects query_seek or the pooled HTTP client (see query_llm).
+    
     Returns a dict with test results.
     """
     if verbose:
@@ -172,7 +429,8 @@ def test_single_puzzle(puzzle, verbose=True):
         print(f"Clues: {puzzle['num_clues']}")
     
     # Format puzzle as prompt
-    prompt = format_puzzle_as_prompt(puzzle)
+    prompt = format_puzzle_as_prompt(puzzle, answer_format=answer_format, prompt_layout=prompt_layout,
+                                     prompt_encoding=prompt_encoding)
     
     if verbose:
         print("\nPrompt sent to LLM:")
@@ -182,35 +440,39 @@ def test_single_puzzle(puzzle, verbose=True):
     
     # Query the LLM
     try:
-        response = query_seek(prompt)
+        start_time = time.time()
+        parser_factory = None
+        if stream:
+            def parser_factory():
+                return IncrementalAnswerParser(puzzle['dimensions'], puzzle['entities'],
+                                               puzzle['num_persons'], answer_format=answer_format)
+        response, stream_cancelled, hedged = query_llm(prompt, hedge=hedge, parser_factory=parser_factory,
+                                                       client=client)
+        elapsed = time.time() - start_time
         
         if verbose:
             print("\nLLM Response:")
             print("-" * 70)
             print(response)
             print("-" * 70)
+            if stream_cancelled:
+                print("[Stream closed once the answer was complete]")
+            if hedged:
+                print("[Slow request was hedged with a duplicate]")
         
-        # Parse the response
-        parsed_solution = parse_llm_response(response, puzzle)
-        
-        # Evaluate
-        evaluation = evaluate_solution(parsed_solution, puzzle['solution'], puzzle)
-        
-        if verbose:
-            print(f"\nEvaluation:")
-            print(f"Correct: {evaluation['correct']}")
-            print(f"Accuracy: {evaluation['accuracy']:.2%}")
-            print(f"Dimensions correct: {evaluation['num_correct_dimensions']}/{evaluation['total_dimensions']}")
-            
-            if evaluation['errors']:
-                print("\nErrors:")
-                for error in evaluation['errors']:
-                    print(f"  - {error}")
+        # Parse and evaluate the response
+        parsed_solution, parser_used, evaluation = grade_response(puzzle, response, answer_format, verbose)
         
         return {
             'puzzle_id': puzzle['puzzle_id'],
             'prompt': prompt,
             'response': response,
+            'answer_format': answer_format,
+            'parser': parser_used,
+            'prompt_encoding': prompt_encoding,
+            'stream_cancelled': stream_cancelled,
+            'hedged': hedged,
+            'elapsed_seconds': elapsed,
             'parsed_solution': parsed_solution,
             'evaluation': evaluation,
             'success': True
@@ -228,7 +490,192 @@ def test_single_puzzle(puzzle, verbose=True):
         }
 
 
-def test_multiple_puzzles(puzzles_file, num_puzzles=None, output_file=None, verbose=True):
+def evaluate_puzzle_batch(puzzles, verbose=True, answer_format='text', prompt_encoding='sentence', hedge=None,
+                          client='query_seek'):
+    """
+    Test the LLM on several puzzles with a single request.
+    
+    The puzzles are packed into one prompt (see format_batch_prompt) and the
+    response is split back into per-puzzle answers (see split_batch_response),
+    which are graded like single responses. Every result holds the batch prompt
+    and response, its own 'answer' section and a 'batch' record with the batch
+    size and the puzzle's position; 'elapsed_seconds' and 'hedged' describe the
+    shared request. An answer that cannot be graded gives a failed result for
+    its puzzle only.
+    
+    Returns a list of result dicts, one per puzzle.
+    """
+    puzzle_ids = ", ".join(f"#{p['puzzle_id']}" for p in puzzles)
+    if verbose:
+        print(f"\n{'='*70}")
+        print(f"Testing Puzzles {puzzle_ids} (batch of {len(puzzles)})")
+        print(f"{'='*70}")
+    
+    prompt = format_batch_prompt(puzzles, answer_format=answer_format, prompt_encoding=prompt_encoding)
+    
+    if verbose:
+        print("\nPrompt sent to LLM:")
+        print("-" * 70)
+        print(prompt[:500] + "..." if len(prompt) > 500 else prompt)
+        print("-" * 70)
+    
+    # Query the LLM
+    try:
+        start_time = time.time()
+        response, _, hedged = query_llm(prompt, hedge=hedge, client=client)
+        elapsed = time.time() - start_time
+    except Exception as e:
+        error_msg = f"Error testing puzzle batch: {str(e)}"
+        if verbose:
+            print(f"\n{error_msg}")
+        return [{'puzzle_id': p['puzzle_id'], 'success': False, 'error': error_msg} for p in puzzles]
+    
+    if verbose:
+        print("\nLLM Response:")
+        print("-" * 70)
+        print(response)
+        print("-" * 70)
+    
+    results = []
+    for position, (puzzle, answer) in enumerate(zip(puzzles, split_batch_response(response, puzzles))):
+        if verbose:
+            print(f"\n--- Puzzle #{puzzle['puzzle_id']} (answer {position + 1}/{len(puzzles)}) ---")
+        try:
+            parsed_solution, parser_used, evaluation = grade_response(puzzle, answer, answer_format, verbose)
+        except Exception as e:
+            error_msg = f"Error testing puzzle: {str(e)}"
+            if verbose:
+                print(f"\n{error_msg}")
+            # The request fields are kept, so the batch is still counted in the summary
+            results.append({
+                'puzzle_id': puzzle['puzzle_id'],
+                'prompt': prompt,
+                'response': response,
+                'answer': answer,
+                'batch': {'size': len(puzzles), 'position': position},
+                'hedged': hedged,
+                'elapsed_seconds': elapsed,
+                'success': False,
+                'error': error_msg
+            })
+            continue
+        results.append({
+            'puzzle_id': puzzle['puzzle_id'],
+            'prompt': prompt,
+            'response': response,
+            'answer': answer,
+            'answer_format': answer_format,
+            'parser': parser_used,
+            'prompt_encoding': prompt_encoding,
+            'batch': {'size': len(puzzles), 'position': position},
+            'hedged': hedged,
+            'elapsed_seconds': elapsed,
+            'parsed_solution': parsed_solution,
+            'evaluation': evaluation,
+            'success': True
+        })
+    
+    return results
+
+
+def puzzle_shard(puzzle_id, num_shards):
+    """
+    Return the evaluation shard of a puzzle.
+    
+    Uses a hash of the puzzle ID that is stable across processes and machines,
+    so every worker agrees on the split without coordination.
+    """
+    digest = hashlib.sha1(str(puzzle_id).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % num_shards
+
+
+def summarize_results(results, puzzles_file=None, shard=None):
+    """
+    Build the results summary from per-puzzle results.
+    
+    Args:
+        results: List of dicts returned by test_single_puzzle
+        puzzles_file: Puzzle corpus the results come from
+        shard: Optional {'index': ..., 'num_shards': ...} of a sharded run
+    
+    Returns a dict with overall metrics, per-dimension stats and the detailed results.
+    Per-dimension stats are keyed by dimension name and count a dimension as
+    attempted for every successful response to a puzzle that has it; 'parsers'
+    counts the successful responses read by each parser ('json' or 'text');
+    'num_requests' and 'request_seconds' count the LLM requests (one per batch)
+    and their total time, for comparing batch sizes, and 'hedged_requests' how
+    many of them were hedged; 'shared_prompt_prefix_chars'
+    is the length of the prefix shared by all prompts, which prompt caches can
+    reuse.
+    """
+    num_puzzles = len(results)
+    correct_count = sum(1 for r in results if r['success'] and r['evaluation']['correct'])
+    total_accuracy = sum(r['evaluation']['accuracy'] for r in results if r['success'])
+    
+    per_dimension = {}
+    for r in results:
+        if not r['success']:
+            continue
+        for dim_name, correct in r['evaluation']['dimensions_correct'].items():
+            stats = per_dimension.setdefault(dim_name, {'attempted': 0, 'correct': 0})
+            stats['attempted'] += 1
+            stats['correct'] += int(correct)
+    for stats in per_dimension.values():
+        stats['accuracy'] = stats['correct'] / stats['attempted']
+    
+    parsers = {}
+    for r in results:
+        if r['success']:
+            parser_used = r.get('parser', 'text')
+            parsers[parser_used] = parsers.get(parser_used, 0) + 1
+    
+    # One request per unbatched result and per batch
+    requests = [r for r in results if 'elapsed_seconds' in r and r.get('batch', {}).get('position', 0) == 0]
+    
+    summary = {
+        'test_date': datetime.now().isoformat(),
+        'puzzles_file': puzzles_file,
+        'num_puzzles': num_puzzles,
+        'correct_count': correct_count,
+        'success_rate': correct_count / num_puzzles if num_puzzles else 0.0,
+        'average_accuracy': total_accuracy / num_puzzles if num_puzzles else 0.0,
+        'per_dimension': dict(sorted(per_dimension.items())),
+        'parsers': dict(sorted(parsers.items())),
+        'num_requests': len(requests),
+        'request_seconds': sum(r['elapsed_seconds'] for r in requests),
+        'hedged_requests': sum(1 for r in requests if r.get('hedged')),
+        'shared_prompt_prefix_chars': shared_prefix_length(r['prompt'] for r in results if 'prompt' in r),
+    }
+    if shard is not None:
+        summary['shard'] = shard
+    summary['detailed_results'] = results
+    return summary
+
+
+def print_summary(summary):
+    """Print the overall metrics of a results summary."""
+    results = summary['detailed_results']
+    print(f"Total puzzles: {summary['num_puzzles']}")
+    print(f"Successful responses: {sum(1 for r in results if r['success'])}")
+    print(f"Completely correct: {summary['correct_count']}")
+    print(f"Success rate: {summary['success_rate']*100:.1f}%")
+    print(f"Average accuracy: {summary['average_accuracy']*100:.1f}%")
+    if summary.get('num_requests'):
+        print(f"LLM requests: {summary['num_requests']} ({summary['request_seconds']:.1f}s total)")
+        if summary.get('hedged_requests'):
+            print(f"Hedged requests: {summary['hedged_requests']}")
+    if summary.get('shared_prompt_prefix_chars') is not None:
+        print(f"Shared prompt prefix: {summary['shared_prompt_prefix_chars']} chars")
+    json_answers = sum(1 for r in results if r['success'] and r.get('answer_format') == 'json')
+    if json_answers:
+        fallbacks = sum(1 for r in results if r['success'] and r.get('answer_format') == 'json' and r['parser'] == 'text')
+        print(f"JSON answers parsed with text fallback: {fallbacks}/{json_answers}")
+
+
+def test_multiple_puzzles(puzzles_file, num_puzzles=None, output_file=None, verbose=True,
+                          shard_index=None, num_shards=None, answer_format='text', stream=False,
+                          batch_size=1, prompt_layout='inline', prompt_encoding='sentence', hedge=None,
+                          client='query_seek'):
     """
     Test the LLM on multiple puzzles from a JSON file.
     
@@ -237,70 +684,76 @@ def test_multiple_puzzles(puzzles_file, num_puzzles=None, output_file=None, verb
         num_puzzles: Number of puzzles to test (None = all)
         output_file: Path to save results JSON (None = auto-generate)
         verbose: Whether to print detailed output
+        shard_index: With num_shards, only test the puzzles whose ID hashes to this
+            shard (see puzzle_shard); combine shard outputs with merge_results
+        num_shards: Number of evaluation shards
+        answer_format: 'text' or 'json' (see format_puzzle_as_prompt)
+        stream: Stream responses and stop at the end of the answer (see test_single_puzzle)
+        batch_size: Number of puzzles sent per request (see evaluate_puzzle_batch)
+        prompt_layout: 'inline' or 'prefix' (see format_puzzle_as_prompt)
+        prompt_encoding: Encoding of the setup and clues (see format_puzzle_as_prompt)
+        hedge: Optional llm_client.HedgePolicy shared by all requests of the run
+        client: 'query_seek' or 'http' (see query_llm)
     """
     # Load puzzles
-    with open(puzzles_file, 'r', encoding='utf-8') as f:
-        puzzles = json.load(f)
+    # Streams JSON Lines corpora, so only the requested puzzles are read
+    puzzles = list(islice(iter_puzzles(puzzles_file), num_puzzles or None))
     
-    if num_puzzles:
-        puzzles = puzzles[:num_puzzles]
+    shard = None
+    if num_shards:
+        # Shard after the --num cut, so the shards together cover the same puzzles
+        shard = {'index': shard_index, 'num_shards': num_shards}
+        puzzles = [p for p in puzzles if puzzle_shard(p['puzzle_id'], num_shards) == shard_index]
     
     print(f"\n{'='*70}")
     print(f"LLM TESTING ON ZEBRA PUZZLES")
     print(f"{'='*70}")
     print(f"Puzzles file: {puzzles_file}")
+    if shard is not None:
+        print(f"Shard: {shard_index + 1}/{num_shards}")
     print(f"Number of puzzles: {len(puzzles)}")
+    if batch_size > 1:
+        print(f"Batch size: {batch_size}")
     print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*70}\n")
     
     # Test each puzzle
     results = []
-    correct_count = 0
-    total_accuracy = 0.0
     
-    for i, puzzle in enumerate(puzzles, 1):
-        print(f"\n[{i}/{len(puzzles)}] ", end="")
-        result = test_single_puzzle(puzzle, verbose=verbose)
-        results.append(result)
-        
-        if result['success'] and result['evaluation']['correct']:
-            correct_count += 1
-        
-        if result['success']:
-            total_accuracy += result['evaluation']['accuracy']
+    for i in range(0, len(puzzles), batch_size):
+        batch = puzzles[i:i + batch_size]
+        if batch_size > 1:
+            print(f"\n[{i + 1}-{i + len(batch)}/{len(puzzles)}] ", end="")
+            batch_results = evaluate_puzzle_batch(batch, verbose=verbose, answer_format=answer_format,
+                                                  prompt_encoding=prompt_encoding, hedge=hedge, client=client)
+        else:
+            print(f"\n[{i + 1}/{len(puzzles)}] ", end="")
+            batch_results = [test_single_puzzle(batch[0], verbose=verbose, answer_format=answer_format,
+                                                stream=stream, prompt_layout=prompt_layout,
+                                                prompt_encoding=prompt_encoding, hedge=hedge, client=client)]
+        results.extend(batch_results)
         
         # Brief progress update if not verbose
         if not verbose:
-            status = "[OK]" if (result['success'] and result['evaluation']['correct']) else "[FAIL]"
-            print(f"Puzzle #{puzzle['puzzle_id']}: {status}")
+            for puzzle, result in zip(batch, batch_results):
+                status = "[OK]" if (result['success'] and result['evaluation']['correct']) else "[FAIL]"
+                print(f"Puzzle #{puzzle['puzzle_id']}: {status}")
     
     # Summary statistics
+    summary = summarize_results(results, puzzles_file=puzzles_file, shard=shard)
+    
     print(f"\n{'='*70}")
     print("TESTING SUMMARY")
     print(f"{'='*70}")
-    print(f"Total puzzles: {len(puzzles)}")
-    print(f"Successful responses: {sum(1 for r in results if r['success'])}")
-    print(f"Completely correct: {correct_count}")
-    print(f"Success rate: {correct_count/len(puzzles)*100:.1f}%")
-    print(f"Average accuracy: {total_accuracy/len(puzzles)*100:.1f}%")
+    print_summary(summary)
     print(f"End time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
     # Save results
     if output_file is None:
-        output_file = f"llm_test_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    
-    summary = {
-        'test_date': datetime.now().isoformat(),
-        'puzzles_file': puzzles_file,
-        'num_puzzles': len(puzzles),
-        'correct_count': correct_count,
-        'success_rate': correct_count / len(puzzles),
-        'average_accuracy': total_accuracy / len(puzzles),
-        'detailed_results': results
-    }
+        shard_suffix = f"_shard{shard_index}of{num_shards}" if shard is not None else ""
+        output_file = f"llm_test_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}{shard_suffix}.json"
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(summary, f, indent=2, ensure_ascii=False)
+    save_json(summary, output_file)
     
     print(f"\nResults saved to: {output_file}")
     print(f"{'='*70}\n")
@@ -308,6 +761,56 @@ def test_multiple_puzzles(puzzles_file, num_puzzles=None, output_file=None, verb
     return summary
 
 
+def merge_results(result_files, output_file=None):
+    """
+    Merge the outputs of a sharded evaluation into one results summary.
+    
+    Args:
+        result_files: Results files written by test_multiple_puzzles for each shard
+        output_file: Path to save the merged results (None = auto-generate)
+    
+    Returns the merged summary; overall and per-dimension metrics are recomputed
+    from the detailed results of all shards.
+    """
+    summaries = [load_json(path) for path in result_files]
+    
+    results = {}
+    for summary in summaries:
+        for result in summary['detailed_results']:
+            if result['puzzle_id'] in results:
+                print(f"[WARNING] Puzzle #{result['puzzle_id']} appears in more than one shard; keeping the first")
+                continue
+            results[result['puzzle_id']] = result
+    
+    shards = [s['shard'] for s in summaries if 'shard' in s]
+    num_shards = {shard['num_shards'] for shard in shards}
+    if len(num_shards) > 1:
+        print(f"[WARNING] Shard outputs come from different shard counts: {sorted(num_shards)}")
+    elif num_shards:
+        missing = set(range(num_shards.pop())) - {shard['index'] for shard in shards}
+        if missing:
+            print(f"[WARNING] Missing shard outputs for shard indices {sorted(missing)}")
+    
+    puzzles_files = {s.get('puzzles_file') for s in summaries}
+    merged = summarize_results([results[pid] for pid in sorted(results)],
+                               puzzles_file=puzzles_files.pop() if len(puzzles_files) == 1 else None)
+    merged['merged_from'] = list(result_files)
+    
+    print(f"\n{'='*70}")
+    print(f"MERGED RESULTS ({len(result_files)} files)")
+    print(f"{'='*70}")
+    print_summary(merged)
+    for dim_name, stats in merged['per_dimension'].items():
+        print(f"  {dim_name}: {stats['correct']}/{stats['attempted']} ({stats['accuracy']*100:.1f}%)")
+    
+    if output_file is None:
+        output_file = f"llm_test_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}_merged.json"
+    save_json(merged, output_file)
+    print(f"\nMerged results saved to: {output_file}")
+    
+    return merged
+
+
 def main():
     """Main function to run LLM tests."""
     import argparse
@@ -316,7 +819,7 @@ def main():
     parser.add_argument(
         '--input',
         default='data/generated/zebra_puzzles_gurobi_100.json',
-        help='Input JSON file with puzzles'
+        help='Input puzzle file (.json, .jsonl or .zpz, optionally .gz/.zst compressed)'
     )
     parser.add_argument(
         '--num',
@@ -327,7 +830,7 @@ def main():
     parser.add_argument(
         '--output',
         default=None,
-        help='Output JSON file for results (default: auto-generated)'
+        help='Output JSON file for results, .gz/.zst compressed by extension (default: auto-generated)'
     )
     parser.add_argument(
         '--quiet',
@@ -340,26 +843,109 @@ def main():
         default=None,
         help='Test a single puzzle by ID'
     )
+    parser.add_argument(
+        '--num-shards',
+        type=int,
+        default=None,
+        help='Split the puzzles into this many shards by puzzle-ID hash'
+    )
+    parser.add_argument(
+        '--shard-index',
+        type=int,
+        default=None,
+        help='Shard to evaluate (0-based, with --num-shards)'
+    )
+    parser.add_argument(
+        '--answer-format',
+        choices=ANSWER_FORMATS,
+        default='text',
+        help='Ask for free-text answer lines or a JSON object (falls back to the text parser)'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Stream responses from the endpoint in LLM_BASE_URL (see llm_client.py) and stop once the answer is complete'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=1,
+        help='Number of puzzles packed into each LLM request (default: 1)'
+    )
+    parser.add_argument(
+        '--prompt-layout',
+        choices=PROMPT_LAYOUTS,
+        default='inline',
+        help="'prefix' puts all static instructions before the puzzle so prompts share a cacheable prefix"
+    )
+    parser.add_argument(
+        '--prompt-encoding',
+        choices=PROMPT_ENCODINGS,
+        default='sentence',
+        help='Encoding of the setup and clues; compare token counts with prompt_encodings.py'
+    )
+    parser.add_argument(
+        '--hedge',
+        action='store_true',
+        help='Send a duplicate of requests slower than a latency percentile learned from the run'
+    )
+    parser.add_argument(
+        '--hedge-percentile',
+        type=float,
+        default=95,
+        help='Latency percentile after which a request is hedged (default: 95)'
+    )
+    parser.add_argument(
+        '--hedge-max-fraction',
+        type=float,
+        default=0.1,
+        help='Cap on duplicate requests as a fraction of all requests (default: 0.1)'
+    )
+    parser.add_argument(
+        '--client',
+        choices=LLM_CLIENTS,
+        default=None,
+        help="'http' sends requests through llm_client's pooled keep-alive connections "
+             "(default: $LLM_CLIENT or query_seek)"
+    )
+    parser.add_argument(
+        '--merge',
+        nargs='+',
+        default=None,
+        help='Merge the results files of a sharded run instead of testing'
+    )
     
     args = parser.parse_args()
     
-    if args.single is not None:
+    if args.num_shards is not None and not (args.shard_index is not None and 0 <= args.shard_index < args.num_shards):
+        parser.error("--num-shards needs --shard-index between 0 and num_shards - 1")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.batch_size > 1 and args.stream:
+        parser.error("--stream does not support --batch-size > 1")
+    if args.batch_size > 1 and args.prompt_layout != 'inline':
+        parser.error("--prompt-layout only applies to single-puzzle prompts")
+    
+    hedge = HedgePolicy(args.hedge_percentile, args.hedge_max_fraction) if args.hedge else None
+    client = args.client or default_client()
+    
+    if args.merge:
+        merge_results(args.merge, output_file=args.output)
+    elif args.single is not None:
         # Test single puzzle
-        with open(args.input, 'r', encoding='utf-8') as f:
-            puzzles = json.load(f)
-        
-        puzzle = next((p for p in puzzles if p['puzzle_id'] == args.single), None)
+        puzzle = next((p for p in iter_puzzles(args.input) if p['puzzle_id'] == args.single), None)
         
         if puzzle is None:
             print(f"Error: Puzzle with ID {args.single} not found")
             return
         
-        result = test_single_puzzle(puzzle, verbose=True)
+        result = test_single_puzzle(puzzle, verbose=True, answer_format=args.answer_format, stream=args.stream,
+                                    prompt_layout=args.prompt_layout, prompt_encoding=args.prompt_encoding,
+                                    client=client)
         
         # Save single result
         output_file = f"puzzle_{args.single}_result.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
+        save_json(result, output_file)
         
         print(f"\nResult saved to: {output_file}")
     else:
@@ -368,7 +954,16 @@ def main():
             args.input,
             num_puzzles=args.num,
             output_file=args.output,
-            verbose=not args.quiet
+            verbose=not args.quiet,
+            shard_index=args.shard_index,
+            num_shards=args.num_shards,
+            answer_format=args.answer_format,
+            stream=args.stream,
+            batch_size=args.batch_size,
+            prompt_layout=args.prompt_layout,
+            prompt_encoding=args.prompt_encoding,
+            hedge=hedge,
+            client=client
         )
 
 
@@ -0,0 +1,83 @@
+import test_llm_on_puzzles
+from answer_parser import compile_vocabulary, parse_answer, parse_json_answer
+from test_llm_on_puzzles import evaluate_solution, parse_llm_response
+
+DIMENSIONS = ["Name", "University", "Pet"]
+ENTITIES = [
+    ["Quentin", "Kevin"],
+    ["University of California, Berkeley", "University of Cambridge"],
+    ["Cat", "Catfish"],
+]
+
+
+def test_vocabulary_matches_longest_whole_word_entries():
+    vocabulary = compile_vocabulary(["City"], [["York", "New York", "New York City", "Newark"]])
+
+    found = vocabulary.pattern.findall("city: in new  'york' city, newyork, york, new york-ish\n")
+
+    assert found == ["city:", "new  'york' city", "york", "new york", "\n"]
+    assert [vocabulary.lookup(match) for match in found[1:4]] == [{0: [2]}, {0: [0]}, {0: [1]}]
+    assert compile_vocabulary(["City"], [("York", "New York", "New York City", "Newark")]) is vocabulary
+
+
+def test_parse_answer_keeps_values_with_commas():
+    response = (
+        "Name is tricky, but:\n"
+        "**Name**: [Kevin, Quentin]\n"
+        "University: [university of cambridge, \"University of California, Berkeley\"]\n"
+        "Pet:\n"
+        "Catfish, 'cat'\n"
+    )
+
+    assert parse_answer(response, DIMENSIONS, ENTITIES) == {0: [1, 0], 1: [1, 0], 2: [1, 0]}
+
+
+def test_parse_answer_ignores_text_before_first_header():
+    response = (
+        "Kevin went to the University of Cambridge] and owns a Cat.\n"
+        "So the answer is Pet: Catfish, Cat\nName: [Kevin, Quentin]\n"
+    )
+
+    assert parse_answer(response, DIMENSIONS, ENTITIES) == {0: [1, 0], 2: [1, 0]}
+    assert parse_answer("Kevin, Quentin\n", DIMENSIONS, ENTITIES) == {}
+
+
+def test_parse_llm_response_grades_comma_values_correctly():
+    puzzle = {"dimensions": DIMENSIONS, "entities": ENTITIES}
+    response = (
+        "Name: [Quentin, Kevin]\n"
+        "University: [University of Cambridge, University of California, Berkeley]\n"
+        "Pet: [Cat, Catfish]\n"
+    )
+
+    parsed = parse_llm_response(response, puzzle)
+    evaluation = evaluate_solution(parsed, [["Person_0", "Person_1"], [1, 0], [0, 1]], puzzle)
+
+    assert parsed["University"] == ["University of Cambridge", "University of California, Berkeley"]
+    assert evaluation["correct"], evaluation["errors"]
+
+
+def test_parse_json_answer_validates_against_schema():
+    dimensions = ["Name", "Age"]
+    entities = [["Quentin", "Kevin"], [30, 20]]
+
+    answer, errors = parse_json_answer('```json\n{"Name": ["Kevin", "Quentin"], "Age": [20, 30]}\n```',
+                                       dimensions, entities, 2)
+    rejected, reasons = parse_json_answer('{"Name": ["Kevin", "Kevin"], "Age": ["20", 30]}', dimensions, entities, 2)
+
+    assert errors == [] and answer == {0: [1, 0], 1: [1, 0]}
+    assert rejected is None
+    assert "answer.Name: items are not unique" in reasons
+    assert "answer.Age[0]: '20' is not one of the allowed values" in reasons
+
+
+def test_json_mode_falls_back_to_text_parser(monkeypatch):
+    puzzle = {"puzzle_id": 7, "num_persons": 2, "num_clues": 0, "clues": [],
+              "dimensions": ["Name", "Age"], "entities": [["Quentin", "Kevin"], [30, 20]],
+              "solution": [["Person_0", "Person_1"], [1, 0]]}
+    monkeypatch.setattr(test_llm_on_puzzles, "query_seek", lambda prompt: '{"Name": ["Quentin", "Kevin"], "Age": [20, 30],}')
+
+    result = test_llm_on_puzzles.test_single_puzzle(puzzle, verbose=False, answer_format='json')
+
+    assert result["parser"] == "text"
+    assert result["evaluation"]["correct"]
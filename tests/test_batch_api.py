@@ -0,0 +1,41 @@
+import json
+
+from batch_api import export_requests, ingest_results, parse_custom_id
+from puzzle_io import save_puzzles
+
+
+def _puzzle(puzzle_id):
+    return {"puzzle_id": puzzle_id, "num_persons": 2, "num_clues": 1, "clues": ["A clue."],
+            "dimensions": ["Name", "Age"], "entities": [["Ann", "Bob"], [30, 20]],
+            "solution": [["Person_0", "Person_1"], [1, 0]]}
+
+
+def _output(custom_id, content):
+    body = {"choices": [{"message": {"role": "assistant", "content": content}}]}
+    return {"id": "r", "custom_id": custom_id, "response": {"status_code": 200, "body": body}, "error": None}
+
+
+def test_export_then_ingest(tmp_path):
+    puzzles_file = str(tmp_path / "puzzles.json")
+    requests_file = str(tmp_path / "batch_requests.jsonl")
+    save_puzzles([_puzzle(1), _puzzle(2), _puzzle(3)], puzzles_file)
+
+    assert export_requests(puzzles_file, requests_file, model="m") == 3
+    requests = [json.loads(line) for line in open(requests_file)]
+    assert export_requests(puzzles_file, str(tmp_path / "again.jsonl"), model="m") == 3
+    assert [json.loads(line)["custom_id"] for line in open(tmp_path / "again.jsonl")] == \
+        [r["custom_id"] for r in requests]
+    assert parse_custom_id(requests[0]["custom_id"])[:2] == (1, "text")
+
+    stale = requests[2]["custom_id"][:-12] + "0" * 12
+    output_file = tmp_path / "batch_output.jsonl"
+    output_file.write_text("\n".join(json.dumps(record) for record in [
+        _output(requests[1]["custom_id"], "Name: [Ann, Bob]\nAge: [30, 20]"),
+        _output(requests[0]["custom_id"], "Name: [Ann, Bob]\nAge: [20, 30]"),
+        _output(stale, "Name: [Ann, Bob]\nAge: [20, 30]"),
+    ]) + "\n")
+
+    summary = ingest_results(str(output_file), puzzles_file, results_file=str(tmp_path / "results.json"))
+
+    assert [r['puzzle_id'] for r in summary['detailed_results']] == [1, 2]
+    assert summary['correct_count'] == 1
@@ -0,0 +1,72 @@
+import test_llm_on_puzzles
+from test_llm_on_puzzles import format_batch_prompt, split_batch_response, summarize_results
+
+
+def _puzzle(puzzle_id, names):
+    return {"puzzle_id": puzzle_id, "num_persons": 2, "num_clues": 1, "clues": ["A clue."],
+            "dimensions": ["Name", "Age"], "entities": [names, [30, 20]],
+            "solution": [["Person_0", "Person_1"], [1, 0]]}
+
+
+PUZZLES = [_puzzle(1, ["Ann", "Bob"]), _puzzle(2, ["Cid", "Dee"])]
+
+
+def test_batch_prompt_numbers_each_puzzle_and_answer():
+    prompt = format_batch_prompt(PUZZLES)
+
+    assert prompt.count("## Puzzle Setup") == 2
+    assert prompt.count("## Output Format") == 1
+    assert "# Puzzle 2\n" in prompt and "### Puzzle 2\nName: [value1, value2, ...]" in prompt
+
+
+def test_split_batch_response_only_takes_heading_lines():
+    response = ("Puzzle 1 looks easy.\n"
+                "### Puzzle 2\nName: [Cid, Dee]\n"
+                "**Puzzle 1:**\nName: [Ann, Bob]\n")
+
+    answers = split_batch_response(response, PUZZLES + [_puzzle(3, ["Eve", "Fay"])])
+
+    assert answers == ["\nName: [Ann, Bob]\n", "\nName: [Cid, Dee]\n", ""]
+
+
+def test_split_batch_response_keeps_complete_section():
+    response = ("### Puzzle 1\nName: [Ann, Bob]\nAge: [20, 30]\n"
+                "### Puzzle 2\nName: [Cid, Dee]\nAge: [30, 20]\n"
+                "Puzzle 1 was solved from clue 3.\n"
+                "Puzzle 1:\nThe Name of the first person came from the clue.\n")
+
+    answers = split_batch_response(response, PUZZLES)
+
+    assert answers[0] == "\nName: [Ann, Bob]\nAge: [20, 30]\n"
+    assert answers[1].startswith("\nName: [Cid, Dee]\nAge: [30, 20]\nPuzzle 1 was solved")
+
+
+def test_batch_evaluation_grades_each_answer(monkeypatch):
+    response = "### Puzzle 1\nName: [Ann, Bob]\nAge: [20, 30]\n\n### Puzzle 2\nName: [Cid, Dee]\nAge: [30, 20]\n"
+    monkeypatch.setattr(test_llm_on_puzzles, "query_seek", lambda prompt: response)
+
+    results = test_llm_on_puzzles.evaluate_puzzle_batch(PUZZLES, verbose=False)
+    summary = summarize_results(results)
+
+    assert [r['evaluation']['correct'] for r in results] == [True, False]
+    assert [r['batch']['position'] for r in results] == [0, 1]
+    assert summary['num_requests'] == 1
+
+
+def test_batch_evaluation_records_grading_failure_per_puzzle(monkeypatch):
+    response = "### Puzzle 1\nName: [Ann, Bob]\nAge: [20, 30]\n\n### Puzzle 2\nName: [Cid, Dee]\nAge: [30, 20]\n"
+    monkeypatch.setattr(test_llm_on_puzzles, "query_seek", lambda prompt: response)
+    grade_response = test_llm_on_puzzles.grade_response
+
+    def failing_grade(puzzle, answer, *args):
+        if puzzle['puzzle_id'] == 1:
+            raise ValueError("unparseable answer")
+        return grade_response(puzzle, answer, *args)
+
+    monkeypatch.setattr(test_llm_on_puzzles, "grade_response", failing_grade)
+
+    results = test_llm_on_puzzles.evaluate_puzzle_batch(PUZZLES, verbose=False)
+
+    assert [r['success'] for r in results] == [False, True]
+    assert "unparseable answer" in results[0]['error']
+    assert summarize_results(results)['num_requests'] == 1
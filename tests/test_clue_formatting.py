@@ -31,3 +31,14 @@ def test_generate_module_format_clue_matches_base():
         "NonPositional", "Color", "Blue", "Pet", "Cat", sign="positive"
     )
     assert text == "The person with Color Blue also has Pet Cat."
+
+
+def test_format_clue_positional_relations():
+    left = zebra_abs_pro.format_clue(
+        "PositionalTwo", "Color", "Blue", "Pet", "Cat", relation="left"
+    )
+    next_to = zebra_abs_pro.format_clue(
+        "PositionalTwo", "Color", "Blue", "Pet", "Cat", relation="next_to"
+    )
+    assert "somewhere left of the person with Pet Cat" in left
+    assert next_to == "The person with Color Blue is next to the person with Pet Cat."
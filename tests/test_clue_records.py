@@ -0,0 +1,31 @@
+from clue_records import clue_kind, render_clue, render_clues
+
+
+DIM_NAMES = ["Name", "Age", "Color", "Pet"]
+ENTITIES = [["Alice", "Bob"], [20, 30], ["Red", "Blue"], ["Cat", "Dog"]]
+
+
+def test_render_nonpositional_records():
+    positive = ("NonPositional", 2, 1, 3, 0, "positive")
+    negative = ("NonPositional", 0, 0, 3, 1, "negative")
+
+    assert render_clue(positive, DIM_NAMES, ENTITIES) == "The person with Color Blue also has Pet Cat."
+    assert render_clue(negative, DIM_NAMES, ENTITIES) == "The person with Name Alice does not have Pet Dog."
+
+
+def test_render_clues_reads_json_lists():
+    puzzle = {
+        "dimensions": DIM_NAMES,
+        "entities": ENTITIES,
+        "clues_data": [["PositionalTwo", 2, 0, 3, 1, "immediately_left"]],
+    }
+
+    text = render_clues(puzzle)[0]
+
+    assert "person with Color Red is immediately left of the person with Pet Dog" in text
+
+
+def test_clue_kind():
+    assert clue_kind(["NonPositional", 2, 1, 3, 0, "positive"]) == "positive"
+    assert clue_kind(["NonPositional", 2, 1, 3, 0, "negative"]) == "negative"
+    assert clue_kind(["PositionalTwo", 2, 0, 3, 1, "left"]) == "positional"
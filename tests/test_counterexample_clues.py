@@ -0,0 +1,102 @@
+import random
+
+import numpy as np
+
+import zebra_abs_pro
+
+
+def _holds(constraint, sol):
+    _, c, r, r1, sign, c1 = constraint
+    holder = sol[r].index(c)
+    return (sol[r1][holder] == c1) == (sign == "positive")
+
+
+def test_planted_assignment_fixes_name_dimension():
+    matrix = [["Person_0", "Person_1", "Person_2"], [2, 0, 1], [1, 2, 0]]
+
+    planted = zebra_abs_pro.get_planted_assignment(matrix)
+
+    assert planted == [[0, 1, 2], [2, 0, 1], [1, 2, 0]]
+
+
+def test_counterexample_clue_is_true_in_planted_and_false_in_witness():
+    matrix = [["Person_0", "Person_1", "Person_2"], [2, 0, 1], [1, 2, 0]]
+    planted = zebra_abs_pro.get_planted_assignment(matrix)
+    witness = [[0, 1, 2], [0, 2, 1], [1, 2, 0]]
+    random.seed(0)
+
+    for _ in range(20):
+        con = zebra_abs_pro.create_counterexample_constraint(matrix, [planted, witness])
+        assert con[0] == "NonPositional"
+        assert _holds(con, planted)
+        assert not _holds(con, witness)
+
+
+def test_counterexample_clue_none_when_only_planted_remains():
+    matrix = [["Person_0", "Person_1"], [1, 0], [0, 1]]
+    planted = zebra_abs_pro.get_planted_assignment(matrix)
+
+    assert zebra_abs_pro.create_counterexample_constraint(matrix, [planted]) is None
+
+
+def test_counterexample_clue_accepts_pool_array():
+    matrix = [["Person_0", "Person_1", "Person_2"], [2, 0, 1], [1, 2, 0]]
+    planted = zebra_abs_pro.get_planted_assignment(matrix)
+    witness = [[0, 1, 2], [0, 2, 1], [1, 2, 0]]
+    random.seed(1)
+
+    con = zebra_abs_pro.create_counterexample_constraint(matrix, np.array([planted, witness]))
+
+    assert _holds(con, planted)
+    assert not _holds(con, witness)
+
+
+def _one_hot(assignment):
+    # Xn values in (p, r, att) order for assignment[r][p] = att
+    num_dimensions, num_persons = len(assignment), len(assignment[0])
+    return [1.0 if assignment[r][p] == att else 0.0
+            for p in range(num_persons) for r in range(num_dimensions) for att in range(num_persons)]
+
+
+_KEYS = [(p, r, att) for p in range(3) for r in range(3) for att in range(3)]
+
+
+class _PoolModel:
+    """Stands in for a solved gurobipy Model; its variables are (p, r, att) keys."""
+
+    def __init__(self, pool):
+        self.pool = [dict(zip(_KEYS, _one_hot(sol))) for sol in pool]
+        self.SolCount = len(pool)
+        self.solution = 0
+
+    def setParam(self, name, value):
+        assert name == 'SolutionNumber'
+        self.solution = value
+
+    def getAttr(self, attr, variables):
+        return [self.pool[0 if attr == 'X' else self.solution][v] for v in variables]
+
+
+def test_decode_assignment_reads_known_xn_vector():
+    solution = [[0, 1, 2], [2, 0, 1], [1, 2, 0]]
+    other = [[0, 1, 2], [0, 2, 1], [1, 2, 0]]
+
+    decoded = zebra_abs_pro._decode_assignment(np.array(_one_hot(solution)), 3, 3)
+    pool = zebra_abs_pro._decode_assignment(np.array([_one_hot(solution), _one_hot(other)]), 3, 3)
+
+    assert decoded.tolist() == solution
+    assert pool.tolist() == [solution, other]
+
+
+def test_get_pool_array_and_final_solution_without_gurobi():
+    matrix = [["Person_0", "Person_1", "Person_2"], [2, 0, 1], [1, 2, 0]]
+    var = {p: {r: {att: (p, r, att) for att in range(3)} for r in range(3)} for p in range(3)}
+    planted = zebra_abs_pro.get_planted_assignment(matrix)
+    witness = [[0, 1, 2], [0, 2, 1], [1, 2, 0]]
+    m = _PoolModel([planted, witness])
+
+    pool = zebra_abs_pro.get_pool_array(m, var, matrix)
+
+    assert pool.dtype == np.int64 and pool.shape == (2, 3, 3)
+    assert pool.tolist() == [planted, witness]
+    assert zebra_abs_pro.get_final_solution(matrix, var, m) == [["Person_0", "Person_1", "Person_2"], [2, 0, 1], [1, 2, 0]]
@@ -0,0 +1,72 @@
+import distributed_generation as dg
+import puzzle_io
+
+
+def _fake_generate(seed, **config):
+    if seed == 13:
+        return {"puzzle_id": seed, "generation_success": False, "timed_out": True}
+    return {"puzzle_id": seed, "generation_success": True, "clue_mode": config["clue_mode"]}
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = str(tmp_path / "queue.db")
+    dg.create_queue(queue, str(tmp_path / "out"), range(10, 14), chunk_size=2)
+    conn = dg.connect(queue)
+
+    task_id, seeds = dg.lease_task(conn, "crashed", lease_seconds=-1)
+    assert seeds == [10, 11]
+    assert dg.queue_status(conn)["expired"] == 1
+
+    assert dg.lease_task(conn, "alive")[0] == task_id
+    assert not dg.heartbeat(conn, task_id, "crashed")
+    assert dg.heartbeat(conn, task_id, "alive")
+    conn.close()
+
+
+def test_workers_drain_queue_and_finalize_writes_manifest(tmp_path):
+    queue = str(tmp_path / "queue.db")
+    out_dir = str(tmp_path / "out")
+    dg.create_queue(queue, out_dir, range(10, 15), chunk_size=2, config={"clue_mode": "random"})
+
+    assert dg.run_worker(queue, worker="a", max_tasks=1, generate=_fake_generate) == 1
+    assert dg.run_worker(queue, worker="b", generate=_fake_generate) == 2
+    manifest = dg.finalize(queue)
+
+    assert manifest["num_records"] == 4
+    assert manifest["generator_config"] == {"clue_mode": "random", "seeds": [10, 14]}
+    assert [p["puzzle_id"] for p in puzzle_io.load_puzzles(out_dir)] == [10, 11, 12, 14]
+    assert puzzle_io.load_json(out_dir + "_run_report.json")["deferred_seeds"] == [13]
+
+
+def test_worker_that_lost_its_lease_does_not_write_shard(tmp_path):
+    queue = str(tmp_path / "queue.db")
+    out_dir = tmp_path / "out"
+    dg.create_queue(queue, str(out_dir), range(10, 12), chunk_size=2, config={"clue_mode": "random"})
+
+    def generate_while_reclaimed(seed, **config):
+        # The lease expires and another worker takes and finishes the task mid-generation
+        if seed == 10:
+            conn = dg.connect(queue)
+            conn.execute("UPDATE tasks SET lease_expires = 0")
+            conn.commit()
+            task_id, _ = dg.lease_task(conn, "new-holder")
+            assert dg.complete_task(conn, task_id, "new-holder", {"file": "elsewhere"}, [])
+            conn.close()
+        return _fake_generate(seed, **config)
+
+    assert dg.run_worker(queue, worker="stale", generate=generate_while_reclaimed) == 0
+    assert list(out_dir.iterdir()) == []
+
+
+def test_running_worker_finishes_task_of_crashed_worker(tmp_path):
+    queue = str(tmp_path / "queue.db")
+    out_dir = str(tmp_path / "out")
+    dg.create_queue(queue, out_dir, range(10, 14), chunk_size=2, config={"clue_mode": "random"})
+    conn = dg.connect(queue)
+    assert dg.lease_task(conn, "crashed", lease_seconds=0.5)[1] == [10, 11]
+    conn.close()
+
+    # The other task is done first; the worker then waits for the crashed lease to expire
+    assert dg.run_worker(queue, worker="alive", generate=_fake_generate, poll_seconds=0.05) == 2
+    assert dg.finalize(queue)["num_records"] == 3
+    assert [p["puzzle_id"] for p in puzzle_io.load_puzzles(out_dir)] == [10, 11, 12]
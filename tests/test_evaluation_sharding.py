@@ -0,0 +1,48 @@
+from puzzle_io import save_json
+from test_llm_on_puzzles import merge_results, puzzle_shard, summarize_results
+
+
+def _result(puzzle_id, dims_correct):
+    dims = dict(zip(["Name", "Age", "Color"], dims_correct))
+    num_correct = sum(dims_correct)
+    return {
+        'puzzle_id': puzzle_id,
+        'success': True,
+        'evaluation': {
+            'correct': num_correct == len(dims),
+            'dimensions_correct': dims,
+            'num_correct_dimensions': num_correct,
+            'total_dimensions': len(dims),
+            'accuracy': num_correct / len(dims)
+        }
+    }
+
+
+def test_puzzle_shard_partitions_ids():
+    shards = [puzzle_shard(puzzle_id, 4) for puzzle_id in range(3000, 3400)]
+
+    assert set(shards) == {0, 1, 2, 3}
+    assert shards == [puzzle_shard(puzzle_id, 4) for puzzle_id in range(3000, 3400)]
+
+
+def test_merge_results_matches_unsharded_summary(tmp_path):
+    results = [
+        _result(1, [True, True, True]),
+        _result(2, [True, False, True]),
+        {'puzzle_id': 3, 'success': False, 'error': 'timeout'},
+        _result(4, [True, False, False]),
+    ]
+    files = []
+    for index in range(2):
+        shard_results = [r for r in results if puzzle_shard(r['puzzle_id'], 2) == index]
+        path = str(tmp_path / f"shard{index}.json")
+        save_json(summarize_results(shard_results, shard={'index': index, 'num_shards': 2}), path)
+        files.append(path)
+
+    merged = merge_results(files, output_file=str(tmp_path / "merged.json"))
+    expected = summarize_results(results)
+
+    for key in ('num_puzzles', 'correct_count', 'success_rate', 'average_accuracy', 'per_dimension'):
+        assert merged[key] == expected[key]
+    assert [r['puzzle_id'] for r in merged['detailed_results']] == [1, 2, 3, 4]
+    assert merged['per_dimension']['Age'] == {'attempted': 3, 'correct': 1, 'accuracy': 1 / 3}
@@ -0,0 +1,62 @@
+from generate_100_with_gurobi import generation_settings
+from generation_cache import NO_UNIQUE_SOLUTION, cache_get, cache_key, cache_put
+
+
+def test_cache_round_trip_and_key_changes(tmp_path):
+    cache_dir = str(tmp_path)
+    settings = {"clue_mode": "random", "sign_weights": [0.8, 0.2]}
+    key = cache_key(3000, settings)
+    puzzle = {"puzzle_id": 3000, "generation_success": True}
+
+    assert cache_get(cache_dir, key) is None
+    assert cache_put(cache_dir, key, 3000, settings, puzzle)
+    assert cache_get(cache_dir, key) == puzzle
+
+    assert cache_key(3000, dict(settings, sign_weights=[0.7, 0.3])) != key
+    assert cache_key(3001, settings) != key
+    assert cache_key(3000, {"sign_weights": [0.8, 0.2], "clue_mode": "random"}) == key
+
+
+def test_timed_out_results_are_not_cached(tmp_path):
+    key = cache_key(3000, {})
+    timed_out = {"puzzle_id": 3000, "generation_success": False, "timed_out": True}
+
+    assert not cache_put(str(tmp_path), key, 3000, {}, timed_out)
+    assert cache_get(str(tmp_path), key) is None
+
+
+def test_settings_only_include_what_the_clue_mode_uses():
+    base = generation_settings("counterexample")
+
+    assert generation_settings("counterexample", clue_type_weights=(0.5, 0.5), num_candidates=3) == base
+    assert generation_settings("counterexample", sign_weights=(0.5, 0.5)) != base
+    assert generation_settings("random", clue_type_weights=(0.5, 0.5)) != generation_settings("random")
+
+
+def test_errors_are_not_cached_and_seed_is_regenerated(tmp_path, monkeypatch):
+    import generate_100_with_gurobi
+
+    calls = []
+
+    def generate(seed, **kwargs):
+        calls.append(seed)
+        if len(calls) == 1:
+            return {"puzzle_id": seed, "generation_success": False, "reason": "Error: Model too large"}
+        return {"puzzle_id": seed, "num_persons": 3, "num_clues": 1, "generation_success": True}
+
+    monkeypatch.setattr(generate_100_with_gurobi, "generate_single_puzzle_FIXED", generate)
+
+    def run():
+        return generate_100_with_gurobi.generate_100_puzzles_with_gurobi(
+            seeds=[3000], output_file=str(tmp_path / "puzzles.json"), cache_dir=str(tmp_path / "cache"),
+            dedup=False)
+
+    run()
+    run()
+    run()
+
+    # The error was not cached, and the puzzle generated on the second run was
+    assert calls == [3000, 3000]
+    assert not cache_put(str(tmp_path), cache_key(1, {}), 1, {},
+                         {"generation_success": False, "reason": "Error: Model too large"})
+    assert cache_put(str(tmp_path), cache_key(1, {}), 1, {}, {"generation_success": False, "reason": NO_UNIQUE_SOLUTION})
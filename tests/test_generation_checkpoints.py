@@ -0,0 +1,27 @@
+import puzzle_io
+import generate_100_with_gurobi
+
+
+def _generate(seed, **kwargs):
+    return {"puzzle_id": seed, "num_persons": 3, "num_clues": 1, "generation_success": True}
+
+
+def test_sharded_output_is_written_once_with_append_only_checkpoints(tmp_path, monkeypatch):
+    out_dir = str(tmp_path / "shards")
+    writes = []
+    appended = []
+    write_shard = puzzle_io.write_shard
+    append_puzzles = generate_100_with_gurobi.append_puzzles
+    monkeypatch.setattr(generate_100_with_gurobi, "generate_single_puzzle_FIXED", _generate)
+    monkeypatch.setattr(puzzle_io, "write_shard", lambda *args, **kwargs: writes.append(args[2]) or
+                        write_shard(*args, **kwargs))
+    monkeypatch.setattr(generate_100_with_gurobi, "append_puzzles", lambda puzzles, path: appended.append(
+        [p["puzzle_id"] for p in puzzles]) or append_puzzles(puzzles, path))
+
+    generate_100_with_gurobi.generate_100_puzzles_with_gurobi(num_puzzles=35, output_file=out_dir,
+                                                              num_shards=4, dedup=False)
+
+    assert len(writes) == 4
+    assert [len(ids) for ids in appended] == [10, 10, 10]
+    assert [p["puzzle_id"] for p in puzzle_io.load_puzzles(out_dir)] == list(range(3000, 3035))
+    assert not (tmp_path / "shards.checkpoint.jsonl").exists()
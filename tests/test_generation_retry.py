@@ -0,0 +1,60 @@
+import json
+import sys
+
+import pytest
+
+import generate_100_with_gurobi
+from generate_100_with_gurobi import run_report_path
+
+
+def _run_main(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["generate_100_with_gurobi.py", *argv])
+    generate_100_with_gurobi.main()
+
+
+def test_retry_from_refuses_to_overwrite_corpus_or_report(tmp_path, monkeypatch):
+    corpus = str(tmp_path / "puzzles.json")
+    report = run_report_path(corpus)
+    with open(report, "w") as f:
+        json.dump({"output_file": corpus, "deferred_seeds": [3001]}, f)
+
+    for argv in ([], ["--output", corpus], ["--output", str(tmp_path / "puzzles.jsonl")]):
+        with pytest.raises(SystemExit):
+            _run_main(monkeypatch, "--retry-from", report, *argv)
+
+    calls = []
+    monkeypatch.setattr(generate_100_with_gurobi, "generate_100_puzzles_with_gurobi",
+                        lambda **kwargs: calls.append(kwargs) or [])
+    _run_main(monkeypatch, "--retry-from", report, "--output", str(tmp_path / "retried.json"))
+
+    assert calls[0]["seeds"] == [3001]
+    assert calls[0]["output_file"] == str(tmp_path / "retried.json")
+
+
+def test_timed_out_seed_is_deferred_and_retried_once_with_scaled_budgets(tmp_path, monkeypatch):
+    output = str(tmp_path / "puzzles.json")
+    calls = []
+
+    def generate(seed, solve_time_limit=None, puzzle_time_limit=None, **kwargs):
+        calls.append((seed, solve_time_limit, puzzle_time_limit))
+        # 3001 times out on both attempts, 3002 only on the first
+        if seed == 3001 or (seed == 3002 and puzzle_time_limit == 10):
+            return {"puzzle_id": seed, "generation_success": False, "reason": "Time budget exceeded",
+                    "timed_out": True}
+        return {"puzzle_id": seed, "num_persons": 3, "num_clues": 1, "generation_success": True}
+
+    monkeypatch.setattr(generate_100_with_gurobi, "generate_single_puzzle_FIXED", generate)
+    puzzles = generate_100_with_gurobi.generate_100_puzzles_with_gurobi(
+        num_puzzles=4, output_file=output, solve_time_limit=2, puzzle_time_limit=10,
+        retry_time_factor=3, dedup=False)
+
+    # The run goes on past the deferred seeds, which are retried after it
+    assert calls == [(3000, 2, 10), (3001, 2, 10), (3002, 2, 10), (3003, 2, 10),
+                     (3001, 6, 30), (3002, 6, 30)]
+    assert [p["puzzle_id"] for p in puzzles] == [3000, 3002, 3003]
+    with open(run_report_path(output)) as f:
+        report = json.load(f)
+    assert report["deferred_seeds"] == [3001]
+    assert [(s["seed"], s["attempt"], s["status"]) for s in report["seeds"]] == [
+        (3000, 1, "ok"), (3001, 1, "timed_out"), (3002, 1, "timed_out"), (3003, 1, "ok"),
+        (3001, 2, "timed_out"), (3002, 2, "ok")]
@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from answer_parser import IncrementalAnswerParser
+from llm_client import HedgePolicy, hedged_call, query_until_complete
+
+ANSWER = "Name: [Bob, Ann]\n"
+
+
+def _serve(delays):
+    # Request i waits delays[i] seconds before streaming the answer
+    counter = iter(range(len(delays)))
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            time.sleep(delays[next(counter)])
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            event = {"choices": [{"delta": {"content": ANSWER}}]}
+            try:
+                self.wfile.write(f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _policy(**kwargs):
+    policy = HedgePolicy(**kwargs)
+    for _ in range(10):
+        policy.record(0.05)
+    return policy
+
+
+def test_slow_request_is_hedged_against_mock_server():
+    server = _serve([1.5, 0.0])
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    def attempt(cancel):
+        parser = IncrementalAnswerParser(["Name"], [["Ann", "Bob"]], 2)
+        return query_until_complete("prompt", parser, cancel=cancel, base_url=base_url)
+
+    try:
+        start = time.time()
+        (response, _), hedged = hedged_call(attempt, _policy(max_fraction=1.0))
+        elapsed = time.time() - start
+    finally:
+        server.shutdown()
+
+    assert hedged
+    assert response == ANSWER
+    assert elapsed < 1.0
+
+
+def test_hedges_are_capped_and_wait_for_samples():
+    capped = _policy(max_fraction=0.0)
+    unlearned = HedgePolicy(max_fraction=1.0)
+
+    def slow(cancel):
+        time.sleep(0.2)
+        return "done"
+
+    assert hedged_call(slow, capped) == ("done", False)
+    assert hedged_call(slow, unlearned) == ("done", False)
+    assert capped.num_hedges == 0 and unlearned.num_hedges == 0
+    assert unlearned.delay() is None
+
+
+def test_duplicate_win_records_latency_from_first_attempt():
+    policy = _policy(max_fraction=1.0)
+    calls = []
+    threads = []
+
+    def attempt(cancel):
+        calls.append(cancel)
+        threads.append(threading.current_thread())
+        if len(calls) == 1:
+            cancel.wait(2.0)
+            return "first"
+        time.sleep(0.2)
+        return "second"
+
+    assert hedged_call(attempt, policy) == ("second", True)
+    # 0.05s before hedging plus 0.2s for the duplicate
+    assert policy.latencies[-1] >= 0.25
+    assert all(thread.daemon for thread in threads)
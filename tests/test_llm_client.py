@@ -0,0 +1,127 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from answer_parser import IncrementalAnswerParser
+from llm_client import ConnectionPool, complete, query_until_complete, stream_completion
+
+DIMENSIONS = ["Name", "University"]
+ENTITIES = [["Quentin", "Kevin"], ["University of California, Berkeley", "University of Cambridge"]]
+CHUNKS = ["Name: [Kevin, ", "Quentin]\nUniversity: [University of California",
+          ", Berkeley, University of Cambridge]", "\n\nExplanation: "] + ["because..."] * 50
+
+
+def _serve(chunks):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            try:
+                for chunk in chunks:
+                    event = {"choices": [{"delta": {"content": chunk}}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_incremental_parser_waits_for_closed_values():
+    parser = IncrementalAnswerParser(DIMENSIONS, ENTITIES, 2)
+
+    states = [parser.feed(chunk) for chunk in CHUNKS[:3]]
+
+    assert states == [False, False, True]
+
+
+def test_query_until_complete_stops_after_answer():
+    server = _serve(CHUNKS)
+    try:
+        parser = IncrementalAnswerParser(DIMENSIONS, ENTITIES, 2)
+        response, cancelled = query_until_complete("prompt", parser,
+                                                   base_url=f"http://127.0.0.1:{server.server_port}")
+    finally:
+        server.shutdown()
+
+    assert cancelled
+    assert response == "".join(CHUNKS[:3])
+
+
+def test_query_until_complete_reads_whole_stream_without_answer():
+    server = _serve(["I could not solve it."])
+    try:
+        parser = IncrementalAnswerParser(DIMENSIONS, ENTITIES, 2)
+        response, cancelled = query_until_complete("prompt", parser,
+                                                   base_url=f"http://127.0.0.1:{server.server_port}")
+    finally:
+        server.shutdown()
+
+    assert not cancelled
+    assert response == "I could not solve it."
+
+
+def _serve_keep_alive(statuses):
+    # HTTP/1.1 server answering with the given statuses in turn (then 200),
+    # recording the client address of every request
+    clients = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            clients.append(self.client_address)
+            status = statuses.pop(0) if statuses else 200
+            if request["stream"]:
+                body = b"data: " + json.dumps({"choices": [{"delta": {"content": "ok"}}]}).encode() + b"\n\n"
+                body += b"data: [DONE]\n\n"
+            else:
+                body = json.dumps({"choices": [{"message": {"content": f"answer {len(clients)}"}}]}).encode()
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, clients
+
+
+def test_pool_reuses_keep_alive_connection():
+    server, clients = _serve_keep_alive([])
+    try:
+        pool = ConnectionPool(f"http://127.0.0.1:{server.server_port}", max_connections=2)
+        answers = [complete("prompt", pool=pool) for _ in range(3)]
+        chunks = list(stream_completion("prompt", pool=pool))
+        pool.close()
+    finally:
+        server.shutdown()
+
+    assert answers == ["answer 1", "answer 2", "answer 3"]
+    assert chunks == ["ok"]
+    assert pool.num_connections == 1
+    assert len(set(clients)) == 1
+
+
+def test_pool_retries_unavailable_server():
+    server, clients = _serve_keep_alive([503, 429])
+    try:
+        pool = ConnectionPool(f"http://127.0.0.1:{server.server_port}", max_retries=2, backoff=0.01)
+        answer = complete("prompt", pool=pool)
+    finally:
+        server.shutdown()
+
+    assert answer == "answer 3"
+    assert len(clients) == 3
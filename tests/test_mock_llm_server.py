@@ -0,0 +1,73 @@
+from itertools import islice
+
+import pytest
+
+import test_llm_on_puzzles
+from llm_client import ConnectionPool, LLMHTTPError, complete
+from mock_llm_server import parse_latency, parse_mix, start_server
+from puzzle_io import iter_puzzles
+from test_llm_on_puzzles import format_puzzle_as_prompt
+
+PUZZLES = list(islice(iter_puzzles("data/generated/zebra_puzzles_gurobi_100.json"), 3))
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    servers = []
+
+    def start(**profile):
+        server = start_server(PUZZLES, **profile)
+        servers.append(server)
+        monkeypatch.setenv("LLM_BASE_URL", server.base_url)
+        monkeypatch.setenv("LLM_MAX_RETRIES", "0")
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_gold_answers_are_graded_correct(mock_server, tmp_path):
+    mock_server()
+
+    summary = test_llm_on_puzzles.test_multiple_puzzles("data/generated/zebra_puzzles_gurobi_100.json", num_puzzles=3,
+                                                        output_file=str(tmp_path / "results.json"), verbose=False,
+                                                        answer_format='json', prompt_encoding='alias', client='http')
+    streamed = test_llm_on_puzzles.test_single_puzzle(PUZZLES[0], verbose=False, stream=True, prompt_layout='prefix')
+
+    assert summary['correct_count'] == 3
+    assert streamed['stream_cancelled'] and streamed['evaluation']['correct']
+
+
+def test_corrupt_and_malformed_answers_are_graded_wrong(mock_server):
+    server = mock_server(answer_mix=parse_mix("corrupt=1,malformed=1"), seed=0)
+
+    results = [test_llm_on_puzzles.test_single_puzzle(PUZZLES[i % 3], verbose=False, client='http') for i in range(6)]
+
+    assert all(result['success'] and not result['evaluation']['correct'] for result in results)
+    assert server.stats['corrupt'] + server.stats['malformed'] == 6
+
+
+def test_errors_and_disconnects_are_retried(mock_server):
+    server = mock_server(error_rate=0.5, error_statuses=(429,), disconnect_rate=0.25, seed=1)
+    prompt = format_puzzle_as_prompt(PUZZLES[0])
+    pool = ConnectionPool(server.base_url, max_retries=20, backoff=0)
+
+    answers = [complete(prompt, pool=pool) for _ in range(5)]
+
+    assert all(answer.startswith(f"{PUZZLES[0]['dimensions'][0]}: [") for answer in answers)
+    assert server.stats[429] > 0 and server.stats['disconnect'] > 0
+    with pytest.raises(LLMHTTPError):
+        complete(prompt, pool=ConnectionPool(mock_server(error_rate=1.0).base_url, max_retries=1, backoff=0))
+
+
+def test_parse_latency_distributions():
+    import random
+    rng = random.Random(0)
+
+    assert parse_latency("constant:0.25")(rng) == 0.25
+    assert 0.1 <= parse_latency("uniform:0.1,0.2")(rng) <= 0.2
+    assert parse_latency("lognormal:0.5,0.3")(rng) > 0
+    with pytest.raises(ValueError):
+        parse_latency("pareto:1")
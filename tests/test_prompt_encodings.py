@@ -0,0 +1,30 @@
+from prompt_encodings import count_tokens, dimension_alias, format_encoded_sections
+from test_llm_on_puzzles import format_puzzle_as_prompt
+
+PUZZLE = {
+    "puzzle_id": 1, "num_persons": 2, "num_clues": 2,
+    "dimensions": ["Name", "Age", "Pet"],
+    "entities": [["Alice", "Bob"], [30, 20], ["Cat", "Dog"]],
+    "clues": ["The person with Name Alice also has Age 20.",
+              "From left to right, the person with Pet Dog is immediately left of the person with Name Bob."],
+    "clues_data": [["NonPositional", 0, 0, 1, 1, "positive"], ["PositionalTwo", 2, 1, 0, 1, "immediately_left"]],
+}
+
+
+def test_compact_encodings_render_clue_records():
+    alias = "".join(format_encoded_sections(PUZZLE, 'alias'))
+    table = "".join(format_encoded_sections(PUZZLE, 'table'))
+
+    assert "Age: B1=30, B2=20\n" in alias
+    assert "1. A1 = B2\n2. C2 just-left-of A2\n" in alias
+    assert "1. Name:Alice = Age:20\n2. Pet:Dog just-left-of Name:Bob\n" in table
+    assert dimension_alias(26) == "AA"
+
+
+def test_compact_prompts_keep_answer_format():
+    sentence = format_puzzle_as_prompt(PUZZLE)
+    alias = format_puzzle_as_prompt(PUZZLE, prompt_encoding='alias')
+
+    assert alias.endswith(sentence[sentence.index("## Question"):])
+    assert count_tokens("") == 0
+    assert 0 < count_tokens("Name: Alice") < count_tokens("Name: Alice, Bob")
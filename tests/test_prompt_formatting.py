@@ -1,6 +1,7 @@
 import random
 
-from prompt_formatting import build_entities, format_setup_string
+from prompt_formatting import build_entities, format_setup_string, shared_prefix_length
+from test_llm_on_puzzles import format_prefix_prompt
 
 
 def test_build_entities_returns_lists():
@@ -27,3 +28,18 @@ def test_format_setup_string_contains_dimensions_and_values():
     for dimension, values in entities.items():
         expected_line = f"{dimension}: {', '.join(values)}"
         assert expected_line in setup_text
+
+
+def test_prefix_layout_prompts_share_static_prefix():
+    puzzles = [
+        {"num_persons": 2, "num_clues": 1, "clues": ["Clue."], "dimensions": ["Name", "Age"],
+         "entities": [["Ann", "Bob"], [30, 20]]},
+        {"num_persons": 3, "num_clues": 1, "clues": ["Other clue."], "dimensions": ["Name", "Pet"],
+         "entities": [["Cid", "Dee", "Eve"], ["Cat", "Dog", "Fish"]]},
+    ]
+
+    (first, prefix_length), (second, _) = [format_prefix_prompt(puzzle) for puzzle in puzzles]
+
+    assert first[:prefix_length] == second[:prefix_length]
+    assert shared_prefix_length([first, second]) >= prefix_length
+    assert first.endswith("## Answer Template\nName: [value1, value2, ...]\nAge: [value1, value2, ...]\n")
@@ -0,0 +1,65 @@
+import hashlib
+
+from puzzle_dedup import BloomFilter, canonical_hash, find_duplicates
+from puzzle_io import save_puzzles
+
+
+def _puzzle(puzzle_id=1):
+    return {
+        "puzzle_id": puzzle_id,
+        "num_persons": 3,
+        "dimensions": ["Name", "Age", "Color", "Pet"],
+        "entities": [["Alice", "Bob", "Carol"], [30, 20, 25], ["Red", "Blue", "Green"], ["Cat", "Dog", "Fish"]],
+        "num_clues": 3,
+        "clues": [],
+        "clues_data": [
+            ["NonPositional", 2, 0, 3, 1, "positive"],
+            ["PositionalTwo", 0, 1, 2, 2, "immediately_left"],
+            ["NonPositional", 3, 2, 0, 0, "negative"],
+        ],
+        "solution": [["Person_0", "Person_1", "Person_2"], [1, 2, 0], [0, 2, 1], [1, 0, 2]],
+        "generation_success": True
+    }
+
+
+def _relabeled():
+    # Persons reversed, values renamed and reordered, Color/Pet swapped, clues shuffled
+    return {
+        "puzzle_id": 2,
+        "num_persons": 3,
+        "dimensions": ["Name", "Height", "Fruit", "Car"],
+        "entities": [["Xena", "Yuri", "Zoe"], [150, 170, 160], ["Kiwi", "Lime", "Plum"], ["Audi", "BMW", "Fiat"]],
+        "num_clues": 3,
+        "clues": [],
+        "clues_data": [
+            ["NonPositional", 0, 2, 2, 0, "negative"],
+            ["NonPositional", 2, 1, 3, 1, "positive"],
+            ["PositionalTwo", 0, 1, 3, 2, "immediately_left"],
+        ],
+        "solution": [["Person_0", "Person_1", "Person_2"], [1, 2, 0], [0, 2, 1], [0, 2, 1]],
+        "generation_success": True
+    }
+
+
+def test_canonical_hash_ignores_relabeling():
+    changed = _puzzle()
+    changed["clues_data"][1][5] = "left"
+
+    assert canonical_hash(_puzzle()) == canonical_hash(_relabeled())
+    assert canonical_hash(_puzzle()) != canonical_hash(changed)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(100, error_rate=1e-3)
+    keys = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(100)]
+
+    assert not any(bloom.add(key) for key in keys)
+    assert all(key in bloom for key in keys)
+
+
+def test_find_duplicates_across_files(tmp_path):
+    first, second = str(tmp_path / "a.json"), str(tmp_path / "b.jsonl")
+    save_puzzles([_puzzle(1)], first)
+    save_puzzles([_puzzle(3), _relabeled()], second)
+
+    assert find_duplicates([first, second]) == {(1, 0): 1, (1, 1): 1}
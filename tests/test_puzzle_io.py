@@ -0,0 +1,169 @@
+import json
+import time
+
+import pytest
+
+import puzzle_io
+from clue_records import render_clue
+
+
+def _puzzle(puzzle_id, with_records=True):
+    dims = ["Name", "Age", "Color"]
+    entities = [["Alice", "Bob", "Carol"], [30, 20, 25], ["Red", "Blue", "Sky Blue"]]
+    records = [
+        ["NonPositional", 2, 1, 0, 0, "negative"],
+        ["PositionalTwo", 0, 1, 2, 2, "next_to"],
+    ]
+    puzzle = {
+        "puzzle_id": puzzle_id,
+        "num_persons": 3,
+        "dimensions": dims,
+        "entities": entities,
+        "num_clues": len(records),
+        "clues": [render_clue(record, dims, entities) for record in records],
+        "clues_data": records,
+        "solution": [["Person_0", "Person_1", "Person_2"], [1, 2, 0], [0, 2, 1]],
+        "generation_success": True
+    }
+    if not with_records:
+        del puzzle["clues_data"]
+    return puzzle
+
+
+def test_compact_round_trip_keeps_every_puzzle():
+    failed = {"puzzle_id": 7, "generation_success": False, "reason": "No unique solution found"}
+    with_extra = dict(_puzzle(3), clue_mode="scenario")
+    puzzles = [_puzzle(1), _puzzle(2, with_records=False), failed, with_extra]
+
+    # An empty table forces every category and value to be interned on write
+    for table in (None, []):
+        assert puzzle_io.decode_puzzles(puzzle_io.encode_puzzles(puzzles, table=table)) == puzzles
+
+
+def test_compact_round_trip_mixes_sizes_and_raw_puzzles():
+    failed = {"puzzle_id": 7, "generation_success": False}
+    larger = _puzzle(4)
+    larger.update(num_persons=4, entities=[["Alice", "Bob", "Carol", "Dan"], [30, 20, 25, 40],
+                                           ["Red", "Blue", "Sky Blue", "Green"]],
+                  solution=[["Person_0", "Person_1", "Person_2", "Person_3"], [1, 2, 0, 3], [3, 2, 1, 0]])
+    larger["clues"] = [render_clue(record, larger["dimensions"], larger["entities"])
+                       for record in larger["clues_data"]]
+    puzzles = [failed, _puzzle(1), larger, _puzzle(2, with_records=False), dict(failed, puzzle_id=8)]
+
+    assert puzzle_io.decode_puzzles(puzzle_io.encode_puzzles(puzzles, table=[])) == puzzles
+
+
+def test_compact_load_is_faster_than_json(tmp_path):
+    puzzles = []
+    for i in range(2000):
+        # Generated puzzles have about 20 clues
+        puzzle = _puzzle(i, with_records=i % 2 == 0)
+        puzzle["num_clues"] *= 10
+        puzzle["clues"] *= 10
+        if "clues_data" in puzzle:
+            puzzle["clues_data"] *= 10
+        puzzles.append(puzzle)
+    json_path = str(tmp_path / "corpus.json")
+    compact_path = str(tmp_path / "corpus.zpz")
+    puzzle_io.save_puzzles(puzzles, json_path)
+    puzzle_io.save_puzzles(puzzles, compact_path)
+
+    def best_time(path, **kwargs):
+        times = []
+        for _ in range(5):
+            start = time.perf_counter()
+            puzzle_io.load_puzzles(path, **kwargs)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    # Skipping the clue text must pay off, and loading records must beat JSON
+    json_time = best_time(json_path)
+    text_time = best_time(compact_path)
+    records_time = best_time(compact_path, clue_text=False)
+    assert records_time < text_time
+    assert records_time < json_time
+
+
+def test_load_without_clue_text_returns_records():
+    data = puzzle_io.encode_puzzles([_puzzle(2, with_records=False)], table=[])
+
+    puzzle = puzzle_io.decode_puzzles(data, clue_text=False)[0]
+
+    assert "clues" not in puzzle
+    assert puzzle["clues_data"] == _puzzle(2)["clues_data"]
+
+
+def test_save_and_load_pick_format_by_extension(tmp_path):
+    puzzles = [_puzzle(1)]
+
+    for name in ("corpus.json", "corpus.zpz"):
+        path = str(tmp_path / name)
+        puzzle_io.save_puzzles(puzzles, path)
+        assert puzzle_io.load_puzzles(path) == puzzles
+
+    assert (tmp_path / "corpus.zpz").read_bytes()[:4] == puzzle_io.ZPZ_MAGIC
+
+
+def test_export_tensors_pads_to_fixed_width(tmp_path):
+    small = _puzzle(1)
+    small["clues"] = small["clues"][:1]
+    small["clues_data"] = small["clues_data"][:1]
+    small["num_clues"] = 1
+    failed = {"puzzle_id": 7, "generation_success": False}
+
+    assert puzzle_io.export_tensors([small, failed, _puzzle(2)], str(tmp_path), table=[]) == 2
+    arrays, meta = puzzle_io.load_tensors(str(tmp_path))
+
+    assert arrays["clues"].shape == (2, 2, 5)
+    assert arrays["clues"][0, 1].tolist() == [puzzle_io.TENSOR_PAD] * 5
+    assert arrays["clues"][1, 1].tolist() == [4, 0, 1, 2, 2]
+    assert arrays["solution"][1].tolist() == [[0, 1, 2], [1, 2, 0], [0, 2, 1]]
+    assert arrays["num_clues"].tolist() == [1, 2]
+    assert meta["skipped_puzzle_ids"] == [7]
+
+    name, values, offset = meta["entity_table"][arrays["dims"][1, 2]]
+    assert name == "Color"
+    assert values[arrays["entity_ids"][1, 2, 2] - offset] == "Sky Blue"
+
+
+def test_compressed_json_and_jsonl_round_trip(tmp_path):
+    puzzles = [_puzzle(1), _puzzle(2, with_records=False)]
+
+    for name in ("corpus.json.gz", "corpus.jsonl.gz", "corpus.zpz.gz"):
+        path = str(tmp_path / name)
+        puzzle_io.save_puzzles(iter(puzzles), path)
+        assert (tmp_path / name).read_bytes()[:2] == b"\x1f\x8b"
+        assert puzzle_io.load_puzzles(path) == puzzles
+        assert list(puzzle_io.iter_puzzles(path)) == puzzles
+
+
+def test_streamed_json_matches_json_dump(tmp_path):
+    path = tmp_path / "corpus.json"
+
+    for puzzles in ([], [_puzzle(1), _puzzle(2)]):
+        puzzle_io.save_puzzles(puzzles, str(path))
+        assert path.read_text(encoding="utf-8") == json.dumps(puzzles, indent=2, ensure_ascii=False)
+
+
+def test_sharded_dataset_round_trip_and_selection(tmp_path):
+    puzzles = [_puzzle(puzzle_id) for puzzle_id in (5, 1, 4, 2, 3)]
+    out_dir = str(tmp_path / "shards")
+
+    manifest = puzzle_io.save_sharded(puzzles, out_dir, 2, config={"clue_mode": "random"})
+
+    assert [shard["seed_range"] for shard in manifest["shards"]] == [[1, 2], [3, 5]]
+    assert [shard["num_records"] for shard in manifest["shards"]] == [2, 3]
+    assert manifest["generator_config"] == {"clue_mode": "random"}
+    assert [p["puzzle_id"] for p in puzzle_io.load_puzzles(out_dir)] == [1, 2, 3, 4, 5]
+    assert [p["puzzle_id"] for p in puzzle_io.iter_puzzles(out_dir)] == [1, 2, 3, 4, 5]
+    selected = puzzle_io.load_sharded(out_dir, shards=[1], workers=1, verify=True)
+    assert [p["puzzle_id"] for p in selected] == [3, 4, 5]
+
+
+def test_load_sharded_rejects_modified_shard(tmp_path):
+    out_dir = str(tmp_path / "shards")
+    manifest = puzzle_io.save_sharded([_puzzle(1)], out_dir, 1)
+    puzzle_io.save_puzzles([_puzzle(2)], str(tmp_path / "shards" / manifest["shards"][0]["file"]))
+
+    with pytest.raises(ValueError):
+        puzzle_io.load_sharded(out_dir, workers=1, verify=True)
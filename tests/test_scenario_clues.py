@@ -0,0 +1,81 @@
+import random
+
+import zebra_abs_pro
+import generate_100_with_gurobi as gen
+from clue_records import POSITIONAL_RELATIONS, clue_holds
+from verify_puzzles import verify_puzzle
+
+MATRIX = [["Person_0", "Person_1", "Person_2"], [2, 0, 1], [1, 2, 0]]
+DIM_NAMES = ["Name", "Position", "Color"]
+VAR_NAME_LST = [["Alice", "Bob", "Carol"], [1, 2, 3], ["Red", "Green", "Blue"]]
+
+# Person 0 holds position 2 and color 1, so the negative clue contradicts the positive one
+ACCEPTED = ("NonPositional", 2, 1, 2, "positive", 1)
+CONTRADICTION = ("NonPositional", 2, 1, 2, "negative", 1)
+# With these, only the positions of Bob and Carol are left open, which FINISHING fixes
+NEARLY_UNIQUE = [ACCEPTED, ("NonPositional", 0, 1, 2, "positive", 2), ("NonPositional", 0, 0, 1, "positive", 2)]
+FINISHING = ("NonPositional", 1, 0, 1, "positive", 0)
+
+
+def _solution_count(constraints):
+    m, var = zebra_abs_pro.build_model(MATRIX)
+    rank_var = zebra_abs_pro.add_rank_variables(m, var, MATRIX, VAR_NAME_LST)
+    for con in constraints:
+        gen.add_constraint_to_model_FIXED(m, var, MATRIX, DIM_NAMES, VAR_NAME_LST, con, rank_var=rank_var)
+    sol_count, _ = zebra_abs_pro.check_solution_count(m)
+    return min(sol_count, 2)
+
+
+def _random_candidates(count):
+    candidates = []
+    for con in zebra_abs_pro.create_random_constraints(3, MATRIX, relations=POSITIONAL_RELATIONS, count=count):
+        con = zebra_abs_pro.resolve_constraint(con, 3)
+        if con not in candidates:
+            candidates.append(con)
+    return candidates
+
+
+def test_candidate_counts_match_check_solution_count():
+    random.seed(0)
+    for accepted in ([ACCEPTED], NEARLY_UNIQUE):
+        candidates = [CONTRADICTION, FINISHING] + _random_candidates(6)
+
+        results = gen.evaluate_candidate_clues(MATRIX, DIM_NAMES, VAR_NAME_LST, accepted, candidates)
+
+        assert [res["constraint"] for res in results] == candidates
+        assert [res["sol_count"] for res in results] == [_solution_count(accepted + [con]) for con in candidates]
+        assert results[0]["sol_count"] == 0 and results[0]["agreement"] is None
+        assert results[1]["sol_count"] == (1 if accepted is NEARLY_UNIQUE else 2)
+
+
+def test_scenario_clues_drop_contradiction_and_end_unique(monkeypatch):
+    random.seed(1)
+    rounds = [[ACCEPTED], [CONTRADICTION] + _random_candidates(7)]
+    real = zebra_abs_pro.create_random_constraints
+    monkeypatch.setattr(zebra_abs_pro, "create_random_constraints",
+                        lambda *args, **kwargs: rounds.pop(0) if rounds else real(*args, **kwargs))
+    m, var = zebra_abs_pro.build_model(MATRIX)
+    rank_var = zebra_abs_pro.add_rank_variables(m, var, MATRIX, VAR_NAME_LST)
+
+    records, num_clues, unique = gen.generate_scenario_clues(
+        m, var, MATRIX, DIM_NAMES, VAR_NAME_LST, max_clues=27, rank_var=rank_var, formulation="ranked"
+    )
+
+    assert unique and num_clues == len(records)
+    assert records[0] == ("NonPositional", 1, 2, 2, 1, "positive")
+    assert ("NonPositional", 1, 2, 2, 1, "negative") not in records
+    assert zebra_abs_pro.check_solution_count(m)[0] == 1
+    # Random clues need not hold in MATRIX; they hold in the unique solution
+    solution = zebra_abs_pro.get_final_solution(MATRIX, var, m)
+    assignment = [[0, 1, 2]] + solution[1:]
+    assert all(clue_holds(record, assignment, VAR_NAME_LST) for record in records)
+
+
+def test_scenario_mode_generates_puzzle_with_unique_solution():
+    puzzle = gen.generate_single_puzzle_FIXED(seed=3000, clue_mode="scenario", formulation="ranked",
+                                              num_persons_choices=(3,))
+
+    assert puzzle["generation_success"]
+    result = verify_puzzle(puzzle)
+    assert result["ok"], result["errors"]
+    assert result["num_solutions"] == 1
@@ -0,0 +1,52 @@
+from verify_puzzles import count_solutions, verify_puzzle
+
+
+def _puzzle(clues_data, solution):
+    return {
+        "puzzle_id": 1,
+        "num_persons": 2,
+        "dimensions": ["Name", "Age", "Pet"],
+        "entities": [["Alice", "Bob"], [30, 20], ["Cat", "Dog"]],
+        "num_clues": len(clues_data),
+        "clues": [],
+        "clues_data": clues_data,
+        "solution": solution,
+    }
+
+
+UNIQUE_CLUES = [
+    ["NonPositional", 0, 0, 1, 1, "positive"],
+    ["PositionalTwo", 2, 1, 0, 1, "immediately_left"],
+]
+
+
+def test_count_solutions_stops_at_limit():
+    count, _ = count_solutions(3, 3, [], [["A", "B", "C"], [1, 2, 3], ["x", "y", "z"]])
+
+    assert count == 2
+
+
+def test_verify_puzzle_accepts_correct_puzzle():
+    # Alice is 20 (the leftmost person); the Dog owner stands directly left of Bob
+    report = verify_puzzle(_puzzle(UNIQUE_CLUES, [["Person_0", "Person_1"], [1, 0], [1, 0]]))
+
+    assert report["ok"], report["errors"]
+    assert report["num_solutions"] == 1
+
+
+def test_verify_puzzle_reports_wrong_solution_and_ambiguity():
+    wrong = verify_puzzle(_puzzle(UNIQUE_CLUES, [["Person_0", "Person_1"], [0, 1], [1, 0]]))
+    ambiguous = verify_puzzle(_puzzle(UNIQUE_CLUES[:1], [["Person_0", "Person_1"], [1, 0], [1, 0]]))
+
+    assert "Clue 1 is false in the stored solution" in wrong["errors"]
+    assert "Clues have more than one solution" in ambiguous["errors"]
+
+
+def test_default_generator_clues_verify():
+    from generate_100_with_gurobi import generate_single_puzzle_FIXED
+
+    puzzles = [generate_single_puzzle_FIXED(seed=seed, clue_type_weights=(0.5, 0.5)) for seed in range(3000, 3005)]
+
+    assert all(p["generation_success"] for p in puzzles)
+    assert any(record[0] == "PositionalTwo" for p in puzzles for record in p["clues_data"])
+    assert [verify_puzzle(p)["errors"] for p in puzzles] == [[]] * len(puzzles)
@@ -0,0 +1,214 @@
+"""
+Verify generated zebra puzzle corpora at scale.
+
+For every stored puzzle this re-checks, without Gurobi, that:
+  - the stored 'solution' is a valid assignment and satisfies every clue, and
+  - the clues admit exactly one solution, which is the stored one.
+
+Clues are taken from 'clues_data' when present and parsed from the clue text
+otherwise. Puzzles are checked in parallel over a process pool with a small
+backtracking solver, since the puzzles are tiny (3-4 persons).
+
+Usage:
+    python verify_puzzles.py data/generated/*.json --workers 8
+"""
+
+import sys
+import json
+import time
+from itertools import permutations
+from multiprocessing import Pool
+
+from clue_records import POSITION_DIMENSION, clue_holds, parse_clue_text
+from puzzle_io import load_puzzles
+
+
+def puzzle_clue_records(puzzle):
+    """
+    Return the puzzle's clue records, parsing the clue text for older puzzles.
+
+    Entries that cannot be parsed are returned as None.
+    """
+    if 'clues_data' in puzzle:
+        return [tuple(record) for record in puzzle['clues_data']]
+    return [parse_clue_text(clue, puzzle['dimensions'], puzzle['entities']) for clue in puzzle['clues']]
+
+
+def _clue_dimensions(record):
+    """Dimensions whose assignment a clue depends on."""
+    dims = {record[1], record[3]}
+    if record[0] == "PositionalTwo":
+        dims.add(POSITION_DIMENSION)
+    return dims
+
+
+def count_solutions(num_persons, num_dimensions, records, var_name_lst, limit=2):
+    """
+    Count the assignments satisfying 'records', stopping at 'limit'.
+
+    Dimension 0 (Name) is fixed to the identity, as in the Gurobi model. The other
+    dimensions are assigned one permutation at a time, most-constrained first, and
+    each clue is checked as soon as all dimensions it mentions are assigned.
+
+    :return: (count, first_solution) where count <= limit and first_solution is an
+             assignment[r][p] of value indices (None if there is no solution).
+    """
+    # Greedy order: next dimension is the one sharing most clues with those already placed
+    placed = {0}
+    order = []
+    while len(order) < num_dimensions - 1:
+        best = max(
+            (r for r in range(1, num_dimensions) if r not in placed),
+            key=lambda r: sum(1 for rec in records if r in _clue_dimensions(rec)
+                              and _clue_dimensions(rec) - {r} <= placed)
+        )
+        order.append(best)
+        placed.add(best)
+
+    depth_of = {0: -1}
+    for depth, r in enumerate(order):
+        depth_of[r] = depth
+    checks = [[] for _ in order]
+    for rec in records:
+        checks[max(depth_of[r] for r in _clue_dimensions(rec))].append(rec)
+
+    perms = [list(perm) for perm in permutations(range(num_persons))]
+    assignment = [list(range(num_persons))] + [None] * (num_dimensions - 1)
+    found = []
+
+    def search(depth):
+        if depth == len(order):
+            found.append([list(row) for row in assignment])
+            return len(found) >= limit
+        r = order[depth]
+        for perm in perms:
+            assignment[r] = perm
+            if all(clue_holds(rec, assignment, var_name_lst) for rec in checks[depth]):
+                if search(depth + 1):
+                    return True
+        assignment[r] = None
+        return False
+
+    search(0)
+    return len(found), (found[0] if found else None)
+
+
+def stored_assignment(puzzle):
+    """
+    Read the stored 'solution' as value indices, the way test_llm_on_puzzles grades it.
+
+    Row 0 (Name) is the identity; every other row lists the entity index per person.
+    """
+    num_persons = puzzle['num_persons']
+    return [list(range(num_persons))] + [[int(v) for v in row] for row in puzzle['solution'][1:]]
+
+
+def verify_puzzle(puzzle):
+    """
+    Verify one puzzle.
+
+    :return: Dict with 'puzzle_id', 'ok', 'num_solutions' (capped at 2) and 'errors'.
+    """
+    errors = []
+    num_persons = puzzle['num_persons']
+    num_dimensions = len(puzzle['dimensions'])
+    entities = puzzle['entities']
+
+    records = puzzle_clue_records(puzzle)
+    for i, record in enumerate(records, 1):
+        if record is None:
+            errors.append(f"Clue {i} could not be parsed unambiguously")
+    records = [record for record in records if record is not None]
+
+    solution = stored_assignment(puzzle)
+    if len(solution) != num_dimensions or any(sorted(row) != list(range(num_persons)) for row in solution):
+        errors.append("Stored solution is not a valid assignment")
+        solution = None
+    else:
+        for i, record in enumerate(records, 1):
+            if not clue_holds(record, solution, entities):
+                errors.append(f"Clue {i} is false in the stored solution")
+
+    num_solutions, unique = count_solutions(num_persons, num_dimensions, records, entities)
+    if num_solutions == 0:
+        errors.append("Clues have no solution")
+    elif num_solutions > 1:
+        errors.append("Clues have more than one solution")
+    elif solution is not None and unique != solution:
+        errors.append("Unique solution differs from the stored solution")
+
+    return {
+        'puzzle_id': puzzle.get('puzzle_id'),
+        'ok': not errors,
+        'num_solutions': num_solutions,
+        'errors': errors
+    }
+
+
+def verify_corpus(puzzles, workers=None, chunksize=64):
+    """
+    Verify many puzzles in parallel.
+
+    :param workers: Number of worker processes (None = os.cpu_count(), 1 = in-process).
+    :return: List of per-puzzle reports in input order.
+    """
+    if workers == 1:
+        return [verify_puzzle(puzzle) for puzzle in puzzles]
+    with Pool(processes=workers) as pool:
+        return pool.map(verify_puzzle, puzzles, chunksize=chunksize)
+
+
+def main():
+    """Verify the given corpus files and report bad puzzle IDs."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Verify uniqueness and clue truth of stored puzzles')
+    parser.add_argument(
+        'inputs',
+        nargs='+',
+        help='Puzzle corpus files'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Worker processes (default: all CPUs, 1 = no pool)'
+    )
+    parser.add_argument(
+        '--report',
+        default=None,
+        help='Optional JSON file for the per-puzzle reports of bad puzzles'
+    )
+
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    bad = []
+    total = 0
+    for input_file in args.inputs:
+        # Clue text is not needed when records are stored
+        puzzles = load_puzzles(input_file, clue_text=False)
+
+        reports = verify_corpus(puzzles, workers=args.workers)
+        file_bad = [report for report in reports if not report['ok']]
+        total += len(reports)
+        bad.extend(dict(report, file=input_file) for report in file_bad)
+        print(f"{input_file}: {len(reports)} puzzles, {len(file_bad)} bad")
+
+    elapsed = time.monotonic() - start
+    print()
+    print(f"Verified {total} puzzles in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} puzzles/s)")
+    print(f"Bad puzzles: {len(bad)}")
+    for report in bad:
+        print(f"  #{report['puzzle_id']} ({report['file']}): {'; '.join(report['errors'])}")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(bad, f, indent=2, ensure_ascii=False)
+        print(f"Report saved to: {args.report}")
+
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,22 @@
 import random
 import json
+import numpy as np
 from gurobipy import Model, GRB, quicksum
 from util.query_gpt import query_4o_db as query_gpt
 from util.query_gpt import query_claude as query_claude
 from util.query_seek import query as query_seek
-from prompt_formatting import build_entities, format_setup_string
+from llm_client import complete, default_client
+from prompt_formatting import assemble_prompt, build_entities, format_setup_string
+from clue_records import format_clue
 
 # -------------------------------------------------------------------------------
 # Constants or configuration can go here
 ATTRIBUTE_ENTITY_FILE = 'data/attribute_entity.json'
 NUMBERED_ENTITY_FILE = 'data/numbered_entity.json'
+
+# Default draw weights of random clues: (PositionalTwo, NonPositional) and (positive, negative)
+CLUE_TYPE_WEIGHTS = (0.05, 0.95)
+SIGN_WEIGHTS = (0.8, 0.2)
 # -------------------------------------------------------------------------------
 
 
@@ -123,6 +130,21 @@ def build_model(matrix):
     m.setParam('PoolSolutions', 1000) # Enough to check if more than 1 solution exists
     m.setParam('PoolGap', 0)
 
+    var = add_assignment_variables(m, matrix)
+
+    m.update()
+    return m, var
+
+
+def add_assignment_variables(m, matrix, prefix="x"):
+    """
+    Add one copy of the assignment variables and the baseline constraints of build_model.
+
+    Models that reason about several solutions at once (e.g. the multi-scenario
+    candidate evaluation) call this once per copy with distinct prefixes.
+
+    :return: var[p][r][att] = 1 if Person p has attribute att in dimension r
+    """
     names = matrix[0]
     num_persons = len(names)
     num_dimensions = len(matrix)
@@ -135,71 +157,140 @@ def build_model(matrix):
             var[p][r] = {}
             for att in range(num_persons):
                 var[p][r][att] = m.addVar(vtype=GRB.BINARY,
-                                          name=f"x_{p}_{r}_{att}")
+                                          name=f"{prefix}_{p}_{r}_{att}")
 
     # Baseline constraints
     # 1) Each person p has exactly one attribute att in dimension r
     for p in range(num_persons):
         for r in range(num_dimensions):
             m.addConstr(quicksum(var[p][r][att] for att in range(num_persons)) == 1,
-                        name=f"Person_{p}_Dim_{r}")
+                        name=f"{prefix}_Person_{p}_Dim_{r}")
 
     # 2) Each attribute att in dimension r is assigned to exactly one person
     for r in range(num_dimensions):
         for att in range(num_persons):
             m.addConstr(quicksum(var[p][r][att] for p in range(num_persons)) == 1,
-                        name=f"Att_{att}_Dim_{r}")
+                        name=f"{prefix}_Att_{att}_Dim_{r}")
 
     # 3) Fix name dimension: Person p => attribute p in dimension 0
     for p in range(num_persons):
-        m.addConstr(var[p][0][p] == 1, name=f"FixName_{p}")
+        m.addConstr(var[p][0][p] == 1, name=f"{prefix}_FixName_{p}")
+
+    return var
+
+
+def add_rank_variables(m, var, matrix, var_name_lst, rPos=1, prefix="y"):
+    """
+    Add person-at-rank indicators for the numbered dimension rPos.
+
+    Ranks order the persons by the values of dimension rPos (rank 0 is the leftmost),
+    so gaps in the values (e.g. 1, 5, 3) do not enter the model. The indicators are
+    channelled to var with linking constraints in both directions, which keeps the
+    LP relaxation tight.
+
+    :return: rank_var[k][r][att] = 1 if the person at rank k has attribute att in dimension r
+    """
+    num_persons = len(matrix[0])
+    num_dimensions = len(matrix)
+
+    # order[k] = attribute index of dimension rPos that sits at rank k
+    order = sorted(range(num_persons), key=lambda att: int(var_name_lst[rPos][att]))
+
+    rank_var = {}
+    for k in range(num_persons):
+        rank_var[k] = {}
+        for r in range(num_dimensions):
+            rank_var[k][r] = {}
+            for att in range(num_persons):
+                rank_var[k][r][att] = m.addVar(vtype=GRB.BINARY,
+                                               name=f"{prefix}_{k}_{r}_{att}")
+
+    # Each rank holds exactly one attribute per dimension, and vice versa
+    for k in range(num_persons):
+        for r in range(num_dimensions):
+            m.addConstr(quicksum(rank_var[k][r][att] for att in range(num_persons)) == 1,
+                        name=f"{prefix}_Rank_{k}_Dim_{r}")
+    for r in range(num_dimensions):
+        for att in range(num_persons):
+            m.addConstr(quicksum(rank_var[k][r][att] for k in range(num_persons)) == 1,
+                        name=f"{prefix}_RankAtt_{att}_Dim_{r}")
+
+    # The rank dimension itself is known: rank k holds attribute order[k]
+    for k in range(num_persons):
+        m.addConstr(rank_var[k][rPos][order[k]] == 1, name=f"{prefix}_FixRank_{k}")
+
+    # Channel: if person p stands at rank k, rank k holds exactly p's attributes
+    for k in range(num_persons):
+        for p in range(num_persons):
+            at_rank = var[p][rPos][order[k]]
+            for r in range(num_dimensions):
+                for att in range(num_persons):
+                    m.addConstr(rank_var[k][r][att] >= at_rank + var[p][r][att] - 1,
+                                name=f"{prefix}_RankLink_{k}_{p}_{r}_{att}")
+                    m.addConstr(rank_var[k][r][att] <= var[p][r][att] + 1 - at_rank,
+                                name=f"{prefix}_RankLinkUb_{k}_{p}_{r}_{att}")
 
     m.update()
-    return m, var
+    return rank_var
 
 
-def check_solution_count(m):
+def add_positional_constraint_ranked(m, rank_var, c1, c2, r1, r2, relation="immediately_left"):
+    """
+    Encode a positional clue between (r1, c1) and (r2, c2) over rank indicators.
+
+    :param relation: "immediately_left" - c1's holder stands directly left of c2's holder
+                     "left"             - c1's holder stands somewhere left of c2's holder
+                     "next_to"          - the two holders stand side by side
+    """
+    num_persons = len(rank_var)
+    at1 = [rank_var[k][r1][c1] for k in range(num_persons)]
+    at2 = [rank_var[k][r2][c2] for k in range(num_persons)]
+
+    if relation == "immediately_left":
+        for k in range(num_persons - 1):
+            m.addConstr(at1[k] == at2[k + 1], name=f"RankLeft1_{r1}_{c1}_{r2}_{c2}_{k}")
+        m.addConstr(at1[num_persons - 1] == 0, name=f"RankLeft1_{r1}_{c1}_{r2}_{c2}_end")
+    elif relation == "left":
+        # By every rank k, c1's holder has appeared strictly before c2's holder can
+        for k in range(num_persons):
+            m.addConstr(quicksum(at2[j] for j in range(k + 1)) <= quicksum(at1[j] for j in range(k)),
+                        name=f"RankLeft_{r1}_{c1}_{r2}_{c2}_{k}")
+    elif relation == "next_to":
+        for k in range(num_persons):
+            neighbours = [at2[j] for j in (k - 1, k + 1) if 0 <= j < num_persons]
+            m.addConstr(at1[k] <= quicksum(neighbours), name=f"RankNext_{r1}_{c1}_{r2}_{c2}_{k}")
+    else:
+        raise ValueError(f"Unsupported positional relation: {relation}")
+
+
+def check_solution_count(m, time_limit=None):
     """
     Solve the model and return:
       - sol_count (int): Number of solutions found (<= PoolSolutions).
-      - status (str): "OPTIMAL" if feasible or "INFEASIBLE" if no solutions.
+      - status (str): "OPTIMAL" if feasible, "INFEASIBLE" if no solutions, or
+                      "TIME_LIMIT" if the solve was cut off (sol_count is then a lower bound).
 
     Note: With PoolSearchMode=2, Gurobi will attempt to find multiple solutions.
+
+    :param time_limit: Optional limit in seconds for this solve (Gurobi TimeLimit).
     """
+    if time_limit is not None:
+        m.setParam('TimeLimit', time_limit)
+
     m.update()
     m.optimize()
 
     if m.status == GRB.INFEASIBLE:
         return 0, 'INFEASIBLE'
+    elif m.status == GRB.TIME_LIMIT:
+        print("Time limit reached. solution count so far is:", m.SolCount)
+        return m.SolCount, 'TIME_LIMIT'
     elif m.status == GRB.OPTIMAL:
         print("Found optimal solution. solution count is:", m.SolCount)
 
     return m.SolCount, 'OPTIMAL'
 
 
-def format_clue(ctype, r_name, c_name, r1_name, c1_name, sign=None):
-    """
-    Render a human-readable clue string.
-
-    :param ctype: "PositionalTwo" or "NonPositional"
-    :param r_name: Name of the first attribute group
-    :param c_name: Attribute value in the first group
-    :param r1_name: Name of the second attribute group
-    :param c1_name: Attribute value in the second group
-    :param sign: "positive" or "negative" for NonPositional
-    """
-    if ctype == "PositionalTwo":
-        return (
-            f"From left to right, the person with {r_name} {c_name} is immediately left "
-            f"of the person with {r1_name} {c1_name}."
-        )
-    if ctype == "NonPositional":
-        if sign == "positive":
-            return f"The person with {r_name} {c_name} also has {r1_name} {c1_name}."
-        return f"The person with {r_name} {c_name} does not have {r1_name} {c1_name}."
-    raise ValueError(f"Unsupported clue type: {ctype}")
-
-
 def add_constraint_to_model(m, var, matrix, dim_names, var_name_lst, constraint):
     """
     Convert a high-level puzzle constraint (e.g., 'PositionalTwo' or 'NonPositional')
@@ -290,44 +381,107 @@ def add_constraint_to_model(m, var, matrix, dim_names, var_name_lst, constraint)
     return descriptions
 
 
-def get_final_solution(matrix, var):
+def get_final_solution(matrix, var, m=None):
     """
     Retrieve the single solution from the model (assuming it is unique).
     For each person p and dimension r, find the attribute 'att' such that var[p][r][att] = 1.
 
-    :return: A 2D list analogous to 'matrix', but with resolved attributes for each dimension.
+    :param m: The solved model. When given, all values are read with one bulk
+              getAttr call instead of one attribute access per variable.
+    :return: A 2D list analogous to 'matrix', but with resolved attributes for each dimension:
+             row 0 holds the person labels, every other row the attribute index (into the
+             puzzle's entities) held by each person.
     """
     names = matrix[0]
     num_persons = len(names)
     num_dimensions = len(matrix)
 
+    if m is not None:
+        values = np.asarray(m.getAttr('X', _flatten_vars(var, matrix)))
+        assignment = _decode_assignment(values, num_persons, num_dimensions)
+    else:
+        assignment = [[next(att for att in range(num_persons) if var[p][r][att].X > 0.5)
+                       for p in range(num_persons)]
+                      for r in range(num_dimensions)]
+
     solution_matrix = []
     for r in range(num_dimensions):
         row = []
         for p in range(num_persons):
-            for att in range(num_persons):
-                if var[p][r][att].X > 0.5:
-                    if r == 0:
-                        # dimension=0 => this is the 'Name' dimension
-                        row.append(names[att])
-                    else:
-                        row.append(matrix[r][att])
-                    break
+            att = int(assignment[r][p])
+            if r == 0:
+                # dimension=0 => this is the 'Name' dimension
+                row.append(names[att])
+            else:
+                row.append(att)
         solution_matrix.append(row)
     return solution_matrix
 
 
-def create_random_constraints(num_persons, matrix):
+def _flatten_vars(var, matrix):
+    """Flatten var[p][r][att] into a list ordered by (p, r, att) for bulk getAttr calls."""
+    num_persons = len(matrix[0])
+    num_dimensions = len(matrix)
+    return [var[p][r][att]
+            for p in range(num_persons)
+            for r in range(num_dimensions)
+            for att in range(num_persons)]
+
+
+def _decode_assignment(values, num_persons, num_dimensions):
+    """
+    Turn flattened (..., p, r, att) variable values into attribute indices.
+
+    :return: Integer array of shape (..., num_dimensions, num_persons)
+    """
+    values = values.reshape(values.shape[:-1] + (num_persons, num_dimensions, num_persons))
+    return np.swapaxes(values.argmax(axis=-1), -1, -2)
+
+
+def get_pool_array(m, var, matrix):
+    """
+    Extract every solution in the model's solution pool in bulk.
+
+    One getAttr('Xn', ...) call is made per SolutionNumber, instead of reading
+    var[p][r][att].Xn one variable at a time.
+
+    :return: Integer array of shape (n_solutions, num_dimensions, num_persons) where
+             entry [k, r, p] is the attribute index person p holds in dimension r
+             in pool solution k.
+    """
+    num_persons = len(matrix[0])
+    num_dimensions = len(matrix)
+    var_list = _flatten_vars(var, matrix)
+
+    values = np.empty((m.SolCount, len(var_list)))
+    for k in range(m.SolCount):
+        m.setParam('SolutionNumber', k)
+        values[k] = m.getAttr('Xn', var_list)
+
+    return _decode_assignment(values, num_persons, num_dimensions).astype(np.int64)
+
+
+def create_random_constraints(num_persons, matrix, relations=None, count=None,
+                              clue_type_weights=CLUE_TYPE_WEIGHTS, sign_weights=SIGN_WEIGHTS):
     """
     Create a list of random constraints to demonstrate usage.
-    For example,  (num_persons ** 3) constraints are generated:
+    By default (num_persons ** 3) constraints are generated, or 'count' if given:
       - 5% chance for "PositionalTwo"
       - 95% chance for "NonPositional"
+
+    :param relations: Optional positional relations to draw from (see
+                      add_positional_constraint_ranked); when given, each PositionalTwo
+                      tuple carries the drawn relation as a 7th element.
+    :param clue_type_weights: (PositionalTwo, NonPositional) draw weights.
+    :param sign_weights: (positive, negative) draw weights of NonPositional clues.
     """
+    if count is None:
+        count = num_persons ** 3
+
     constraints = []
-    for _ in range(num_persons ** 3):
+    for _ in range(count):
         ctype = random.choices(["PositionalTwo", "NonPositional"],
-                               weights=[0.05, 0.95])[0]
+                               weights=clue_type_weights)[0]
         if ctype == "PositionalTwo":
             # (ctype, c1, c2, r1, r2, rPos)
             c1 = random.choice([j for j in range(len(matrix[0]))])
@@ -335,17 +489,119 @@ def create_random_constraints(num_persons, matrix):
             r1 = random.choice([j for j in range(len(matrix)) if j != 1])
             r2 = random.choice([j for j in range(len(matrix)) if j != 1])
             rPos = 1  # dimension=1 is "positional"
-            constraints.append((ctype, c1, c2, r1, r2, rPos))
+            if relations:
+                constraints.append((ctype, c1, c2, r1, r2, rPos, random.choice(relations)))
+            else:
+                constraints.append((ctype, c1, c2, r1, r2, rPos))
         else:
             # (ctype, c, r, r1, sign)
             c = random.choice([j for j in range(len(matrix[0]))])
             r = random.choice([j for j in range(len(matrix))])
             r1 = random.choice([j for j in range(len(matrix)) if j != r])
-            sign = random.choices(["positive", "negative"], weights=[0.8, 0.2])[0]
+            sign = random.choices(["positive", "negative"], weights=sign_weights)[0]
             constraints.append((ctype, c, r, r1, sign))
     return constraints
 
 
+def resolve_constraint(constraint, num_persons):
+    """
+    Return a copy of 'constraint' with its random choices made explicit.
+
+    Negative NonPositional tuples get their c1 drawn here instead of when they are
+    added to a model, so the same tuple encodes identically in every model it is
+    added to.
+    """
+    if constraint[0] == "NonPositional" and len(constraint) == 5:
+        _, c, r, r1, sign = constraint
+        if sign == 'positive':
+            c1 = c
+        else:
+            c1 = random.choice([i for i in range(num_persons) if i != c])
+        return constraint + (c1,)
+    return constraint
+
+
+def get_planted_assignment(matrix):
+    """
+    Return the assignment planted in 'matrix' as attribute indices.
+
+    planted[r][p] is the attribute index that person p holds in dimension r.
+    Dimension 0 (Name) is the identity, matching the FixName constraints in build_model.
+    """
+    num_persons = len(matrix[0])
+    planted = [list(range(num_persons))]
+    for r in range(1, len(matrix)):
+        planted.append(list(matrix[r]))
+    return planted
+
+
+def get_pool_solutions(m, var, matrix):
+    """
+    Read every solution stored in the model's solution pool.
+
+    :return: A list of assignments sol[r][p] = attribute index held by person p in
+             dimension r, one per pool entry (at most PoolSolutions).
+    """
+    return get_pool_array(m, var, matrix).tolist()
+
+
+def create_counterexample_constraint(matrix, witnesses, sign_weights=SIGN_WEIGHTS):
+    """
+    Synthesize a clue that is true in the planted assignment but false in at least
+    one competing witness solution.
+
+    Every candidate ("NonPositional", c, r, r1, sign, c1) that holds in the planted
+    assignment is scored by the number of witnesses it eliminates; the best-scoring
+    candidate of a sign drawn with 'sign_weights' (positive, negative) is returned.
+
+    :param witnesses: Pool solutions as returned by get_pool_array (or get_pool_solutions).
+    :return: A constraint tuple, or None if no witness differs from the planted assignment.
+    """
+    planted = get_planted_assignment(matrix)
+    num_persons = len(matrix[0])
+    num_dimensions = len(matrix)
+
+    witnesses = np.asarray(witnesses, dtype=np.int64).reshape(-1, num_dimensions, num_persons)
+    competing = witnesses[(witnesses != np.asarray(planted)).any(axis=(1, 2))]
+    if len(competing) == 0:
+        return None
+
+    # holders[w, r, att] = person holding attribute att of dimension r in witness w
+    holders = np.argsort(competing, axis=2)
+    witness_idx = np.arange(len(competing))
+
+    best = {"positive": (0, []), "negative": (0, [])}
+    for r in range(num_dimensions):
+        for r1 in range(num_dimensions):
+            if r1 == r:
+                continue
+            for p in range(num_persons):
+                c = planted[r][p]
+                # counts[c1] = witnesses in which c's holder (dimension r) has c1 in r1
+                counts = np.bincount(competing[witness_idx, r1, holders[:, r, c]],
+                                     minlength=num_persons)
+                for c1 in range(num_persons):
+                    if c1 == planted[r1][p]:
+                        sign = "positive"
+                        eliminated = len(competing) - int(counts[c1])
+                    else:
+                        sign = "negative"
+                        eliminated = int(counts[c1])
+
+                    score, options = best[sign]
+                    if eliminated == 0 or eliminated < score:
+                        continue
+                    if eliminated > score:
+                        options = []
+                    options.append(("NonPositional", c, r, r1, sign, c1))
+                    best[sign] = (eliminated, options)
+
+    signs = [s for s in ("positive", "negative") if best[s][1]]
+    weights = [sign_weights[0] if s == "positive" else sign_weights[1] for s in signs]
+    sign = random.choices(signs, weights=weights)[0]
+    return random.choice(best[sign][1])
+
+
 def main():
     # 1. Generate the puzzle matrix
     num_persons = random.choice([3, 4])
@@ -393,7 +649,7 @@ def main():
 
     # 5. If a unique solution was found, retrieve and print it
     if unique_solution_found:
-        solution_matrix = get_final_solution(matrix, var)
+        solution_matrix = get_final_solution(matrix, var, m)
         print("\nUnique solution assignment (each row is a dimension):")
         for row in solution_matrix:
             print(row)
@@ -402,13 +658,21 @@ def main():
         for desc in descriptions:
             print(desc)
 
-        zebra_puzzle = ask_gpt_to_generate_a_zebra_puzzle(dim_names, var_name_lst, descriptions)
+        zebra_puzzle = ask_gpt_to_generate_a_zebra_puzzle(dim_names, var_name_lst, descriptions,
+                                                          client=default_client())
 
         print("Zebra Puzzle generated by GPT:", zebra_puzzle)
     else:
         print("No unique solution found with the given constraints.")
 
-def ask_gpt_to_generate_a_zebra_puzzle(dim_names, var_name_lst, cons_descriptions):
+def ask_gpt_to_generate_a_zebra_puzzle(dim_names, var_name_lst, cons_descriptions, client='query_seek'):
+    """
+    Ask the LLM to rewrite the clues of a puzzle in natural language.
+
+    :param client: 'query_seek' or 'http' to send the request through
+                   llm_client's pooled keep-alive connections.
+    :return: The LLM's response.
+    """
     previous_examples = """
 example 1: 
     Puzzle Setup
@@ -535,22 +799,21 @@ example 5:
     entities = build_entities(dim_names, var_name_lst)
     setup_text = format_setup_string(entities)
 
-    # input
-    input_text = f"""
-You are given a puzzle setup and a set of clues. Your task is to rewrite the clues in clear, natural‐sounding language, matching the style and structure shown in the example clues.
-Puzzle Setup:
-    {setup_text},
-Clues:
-    {cons_descriptions}
-Examples:
-{previous_examples}
-
-Now, you need to generate the clues for the puzzle setup, clues and objective.
-"""
+    # input: instructions and examples first, so every request shares the same
+    # prefix for prompt caching; the puzzle-specific setup and clues go last
+    input_text, _ = assemble_prompt(
+        [
+            "\nYou are given a puzzle setup and a set of clues. Your task is to rewrite the clues in clear, "
+            "natural‐sounding language, matching the style and structure shown in the example clues.\n",
+            f"Examples:\n{previous_examples}\n",
+            "\nNow, you need to generate the clues for the puzzle setup, clues and objective below.\n",
+        ],
+        [f"Puzzle Setup:\n    {setup_text},\nClues:\n    {cons_descriptions}\n"],
+    )
 
     # ask gpt
     # response = query_claude(input_text)
-    response = query_seek(input_text)
+    response = complete(input_text) if client == 'http' else query_seek(input_text)
 
     return response
 